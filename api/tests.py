@@ -1,3 +1,169 @@
-from django.test import TestCase
+import subprocess
+import sys
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from corpus.models import Annotation, Author, Document, User
+from rlc_new import nlp
+
+# the document, the corpus generation, the sentences, their annotations and their
+# tokens with the spelling verdicts
+WORKSPACE_QUERIES = 5
+# the document and the corpus generation
+NOT_MODIFIED_QUERIES = 2
+# the document, its user and author and the sentences with their cached corrections,
+# for an anonymous user
+ANNOTATE_PAGE_QUERIES = 4
+
+# packages that must only be imported by the requests processing texts
+LAZY_PACKAGES = ["natasha", "slovnet", "navec", "pymorphy2", "nltk", "enchant"]
+
+
+class DocumentWorkspaceQueriesTest(TestCase):
+    """
+    Checks that the annotate page and its workspace endpoint read a document with a number of queries that does not
+    depend on its sentences and annotations.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username="annotator", password="password")
+        author = Author.objects.create(name="Author")
+        cls.short_document = Document.objects.create(
+            title="Short", user=user, author=author, body="Я читал книгу."
+        )
+        cls.long_document = Document.objects.create(
+            title="Long",
+            user=user,
+            author=author,
+            body="Я читал книгу. Мы гулали в парке вчера. Она пишет письма друзям. "
+            "Дети играют во дворе.",
+        )
+        for sentence in cls.long_document.sentence_set.all():
+            for alt in [False, True]:
+                guid = f"#{sentence.pk}-{alt}"
+                Annotation.objects.create(
+                    sentence=sentence,
+                    document=cls.long_document,
+                    user=user,
+                    guid=guid,
+                    alt=alt,
+                    json={
+                        "id": guid,
+                        "body": [
+                            {
+                                "type": "TextualBody",
+                                "value": "Ortho",
+                                "purpose": "tagging",
+                            },
+                            {
+                                "type": "TextualBody",
+                                "value": "Я",
+                                "purpose": "commenting",
+                            },
+                        ],
+                        "target": {
+                            "selector": [
+                                {
+                                    "type": "TextQuoteSelector",
+                                    "exact": sentence.text[:1],
+                                },
+                                {"type": "TextPositionSelector", "start": 0, "end": 1},
+                            ]
+                        },
+                    },
+                )
+
+    def setUp(self):
+        # fill the cached corrections and spelling verdicts, and load the dictionary
+        for document in [self.short_document, self.long_document]:
+            self.client.get(f"/api/documents/{document.pk}/workspace/")
+
+    def test_workspace_queries(self):
+        for document in [self.short_document, self.long_document]:
+            with self.subTest(document=document.title):
+                url = f"/api/documents/{document.pk}/workspace/"
+                with self.assertNumQueries(WORKSPACE_QUERIES):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.json()["sentences"]), document.sentence_set.count()
+                )
+
+                with self.assertNumQueries(NOT_MODIFIED_QUERIES):
+                    response = self.client.get(
+                        url, headers={"if-none-match": response.headers["ETag"]}
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_not_modified_does_not_load_dictionary(self):
+        url = f"/api/documents/{self.short_document.pk}/workspace/"
+        etag = self.client.get(url).headers["ETag"]
+        with mock.patch.object(nlp, "get_spelling_dictionary") as get_dictionary:
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        get_dictionary.assert_not_called()
+
+    def test_annotate_page_queries(self):
+        for document in [self.short_document, self.long_document]:
+            with self.subTest(document=document.title):
+                with self.assertNumQueries(ANNOTATE_PAGE_QUERIES):
+                    response = self.client.get(reverse("annotate", args=[document.pk]))
+                self.assertEqual(response.status_code, 200)
+
+
+class ImportTimeTest(SimpleTestCase):
+    """
+    Checks that management commands do not import the NLP libraries, which are imported on first use (see
+    ``rlc_new.nlp``). ``manage.py check`` imports the URL configuration and so all the views.
+    """
+
+    def test_check_does_not_import_nlp_libraries(self):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "manage.py", "check"],
+            cwd=Path(__file__).resolve().parent.parent,
+            check=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        # lines look like "import time:  self [us] | cumulative | imported package"
+        imported = {
+            line.rpartition("|")[2].strip()
+            for line in result.stderr.splitlines()
+            if line.startswith("import time:")
+        }
+        self.assertFalse(imported & set(LAZY_PACKAGES))
+
+
+class BatchAnnotateTest(TestCase):
+    """
+    Checks the validation of the batch auto-annotation requests.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username="admin", password="password")
+        cls.document = Document.objects.create(
+            title="Document",
+            user=cls.user,
+            author=Author.objects.create(name="Author"),
+            body="Я читал книгу.",
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_document_without_corrected_sentences(self):
+        for data in [
+            {"document_id": self.document.pk},
+            {"document_id": self.document.pk, "corrected_sentences": {}},
+        ]:
+            with self.subTest(data=data):
+                response = self.client.post(
+                    "/api/auto_annotate/batch/", data, content_type="application/json"
+                )
+                self.assertEqual(response.status_code, 400)
@@ -1,25 +1,49 @@
+import hashlib
+import json
 from datetime import datetime
 from typing import List, Dict
 from uuid import uuid4
 
-from django.shortcuts import redirect, get_object_or_404
-from enchant import Dict as EnchantDict
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, aget_object_or_404
+from django.utils.http import parse_etags, quote_etag
 from ninja.errors import HttpError
 
-from auto_annotator.annotator import Annotator
-
-_ANNOTATOR = Annotator()
-_DICTIONARY = EnchantDict("ru_RU")
-
 from ninja import Schema, NinjaAPI
-from ninja.security import django_auth
+from ninja.security import SessionAuth
 
-from corpus.models import Annotation, Sentence, Document, User, Token
+from corpus.models import Annotation, Sentence, Document, User
+from corpus.utils import spelling_utils
+from corpus.utils.async_utils import aiterate
+from corpus.utils.correction_utils import fill_corrections
+from corpus.utils.stats_utils import get_corpus_stats
 from corpus.views import user_profile
+from rlc_new import nlp
 
 api = NinjaAPI(csrf=True)
 
 
+class AsyncSessionAuth(SessionAuth):
+    """Django session authentication for async operations.
+
+    ``django_auth`` reads ``request.user``, which loads the user synchronously and
+    fails in an async view, so the user is loaded with ``request.auser()`` instead.
+    """
+
+    is_async = True
+
+    async def authenticate(self, request, key):
+        user = await request.auser()
+        if user.is_authenticated:
+            return user
+
+        return None
+
+
+session_auth = AsyncSessionAuth()
+
+
 class AnnotationSchema(Schema):
     sentence: int
     document: int
@@ -47,6 +71,29 @@ class SentenceErrorSchema(Schema):
     errors: List[str]
 
 
+class DocumentErrorSchema(Schema):
+    # misspelled tokens by sentence id
+    errors: Dict[int, List[str]]
+
+
+class WorkspaceSentenceSchema(Schema):
+    id: int
+    number: int
+    text: str
+    annotations: List[Dict]
+    alt_annotations: List[Dict]
+    correction: str
+    alt_correction: str
+    errors: List[str]
+
+
+class WorkspaceSchema(Schema):
+    document_id: int
+    # the sentences are empty while the document is processed
+    is_processing: bool
+    sentences: List[WorkspaceSentenceSchema]
+
+
 class SentenceContextIn(Schema):
     sentence_id: int
 
@@ -68,13 +115,21 @@ class AnnotationResponse(Schema):
     body: dict
 
 
+class BatchAnnotateRequest(Schema):
+    # either a document with the corrected texts of its sentences by sentence id,
+    # or a list of sentence pairs
+    document_id: int = None
+    corrected_sentences: Dict[int, str] = None
+    sentences: List[AnnotateRequest] = None
+
+
 @api.post(
     "/auto_annotate/",
     response={200: List[AnnotationResponse], 403: None},
-    auth=django_auth,
+    auth=session_auth,
 )
-def auto_annotate(request, annotate_data: AnnotateRequest):
-    perm = request.auth.has_perm("corpus.add_annotation")
+async def auto_annotate(request, annotate_data: AnnotateRequest):
+    perm = await sync_to_async(request.auth.has_perm)("corpus.add_annotation")
 
     if not perm:
         raise HttpError(403, "Permission denied")
@@ -82,7 +137,78 @@ def auto_annotate(request, annotate_data: AnnotateRequest):
     original = annotate_data.original_sentence
     corrected = annotate_data.corrected_sentence
 
-    edits, orig_tokenized, cor_tokenized = _ANNOTATOR.annotate(original, corrected)
+    # the models run in the NLP executor, outside of the event loop
+    edits, orig_tokenized, cor_tokenized = await nlp.run_in_executor(
+        lambda: nlp.get_annotator().annotate(original, corrected)
+    )
+    return _make_annotations(edits, orig_tokenized)
+
+
+@api.post(
+    "/auto_annotate/batch/",
+    response={400: None, 403: None, 404: None},
+    auth=session_auth,
+)
+async def auto_annotate_batch(request, annotate_data: BatchAnnotateRequest):
+    """Annotates the sentences of a document or a list of sentence pairs.
+
+    The sentences are preprocessed in one pass and annotated in the annotation pool
+    (see ``rlc_new.nlp.get_annotation_pool`` and the AUTO_ANNOTATION_WORKERS setting). The results are streamed as
+    JSON lines with the index of the pair, the sentence id in the document mode and the
+    annotations, in the order of completion. The results are computed in the NLP
+    executor while the previous ones are sent.
+    """
+    perm = await sync_to_async(request.auth.has_perm)("corpus.add_annotation")
+
+    if not perm:
+        raise HttpError(403, "Permission denied")
+
+    if annotate_data.document_id is not None:
+        document = await aget_object_or_404(Document, pk=annotate_data.document_id)
+        corrected_sentences = annotate_data.corrected_sentences
+        if not corrected_sentences:
+            raise HttpError(400, "corrected_sentences is required with document_id")
+        sentences = [
+            sentence
+            async for sentence in Sentence.objects.filter(
+                document=document, id__in=corrected_sentences
+            ).order_by("number")
+        ]
+        sentence_ids = [sentence.id for sentence in sentences]
+        pairs = [
+            (sentence.text, corrected_sentences[sentence.id]) for sentence in sentences
+        ]
+    elif annotate_data.sentences is not None:
+        sentence_ids = [None] * len(annotate_data.sentences)
+        pairs = [
+            (pair.original_sentence, pair.corrected_sentence)
+            for pair in annotate_data.sentences
+        ]
+    else:
+        raise HttpError(422, "Either document_id or sentences is required")
+
+    def stream():
+        annotator = nlp.get_annotator()
+        pool = nlp.get_annotation_pool()
+        results = annotator.annotate_many(
+            pairs, submit=nlp.submit_annotation if pool else None
+        )
+        for index, edits, orig_tokenized, _ in results:
+            result = {
+                "index": index,
+                "sentence_id": sentence_ids[index],
+                "annotations": _make_annotations(edits, orig_tokenized),
+            }
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return StreamingHttpResponse(
+        aiterate(stream(), executor=nlp.get_executor()),
+        content_type="application/x-ndjson",
+    )
+
+
+def _make_annotations(edits, orig_tokenized):
+    """Converts the edits of the auto-annotator to annotations of Recogito."""
     annotations = []
     for index, edit in enumerate(edits):
         original_tokens = edit.o_toks
@@ -137,9 +263,9 @@ def auto_annotate(request, annotate_data: AnnotateRequest):
 
 
 @api.get("/annotations/get/{sentence_id}/", response=List[Dict])
-def get_sentence_annotations(request, sentence_id: int):
+async def get_sentence_annotations(request, sentence_id: int):
     sentence_annotations = Annotation.objects.filter(sentence=sentence_id, alt=False)
-    data = [annotation.json for annotation in sentence_annotations]
+    data = [annotation.json async for annotation in sentence_annotations]
     return data
 
 
@@ -147,23 +273,23 @@ def get_sentence_annotations(request, sentence_id: int):
     "/annotations/get/alt/{sentence_id}/",
     response=List[Dict],
 )
-def get_alt_sentence_annotations(request, sentence_id: int):
+async def get_alt_sentence_annotations(request, sentence_id: int):
     sentence_annotations = Annotation.objects.filter(sentence=sentence_id, alt=True)
-    data = [annotation.json for annotation in sentence_annotations]
+    data = [annotation.json async for annotation in sentence_annotations]
     return data
 
 
-@api.post("/annotations/create/", response={200: Dict, 403: None}, auth=django_auth)
-def create_annotation(request, annotation_data: AnnotationSchema):
-    perm = request.auth.has_perm("corpus.add_annotation")
+@api.post("/annotations/create/", response={200: Dict, 403: None}, auth=session_auth)
+async def create_annotation(request, annotation_data: AnnotationSchema):
+    perm = await sync_to_async(request.auth.has_perm)("corpus.add_annotation")
 
     if not perm:
         raise HttpError(403, "Permission denied")
 
-    annotation = Annotation.objects.create(
-        sentence=Sentence.objects.get(id=annotation_data.sentence),
-        document=Document.objects.get(id=annotation_data.document),
-        user=User.objects.get(id=annotation_data.user),
+    annotation = await Annotation.objects.acreate(
+        sentence=await Sentence.objects.aget(id=annotation_data.sentence),
+        document=await Document.objects.aget(id=annotation_data.document),
+        user=await User.objects.aget(id=annotation_data.user),
         guid=annotation_data.guid,
         alt=True if annotation_data.alt == "true" else False,
         json=annotation_data.body,
@@ -172,28 +298,28 @@ def create_annotation(request, annotation_data: AnnotationSchema):
     return {"id": annotation.guid}
 
 
-@api.put("/annotations/update/", response={200: Dict, 403: None}, auth=django_auth)
-def update_annotation(request, annotation_data: AnnotationSchema):
-    perm = request.auth.has_perm("corpus.change_annotation")
+@api.put("/annotations/update/", response={200: Dict, 403: None}, auth=session_auth)
+async def update_annotation(request, annotation_data: AnnotationSchema):
+    perm = await sync_to_async(request.auth.has_perm)("corpus.change_annotation")
 
     if not perm:
         raise HttpError(403, "Permission denied")
 
-    annotation = get_object_or_404(Annotation, guid=annotation_data.guid)
+    annotation = await aget_object_or_404(Annotation, guid=annotation_data.guid)
     annotation.json = annotation_data.body
-    annotation.save()
+    await annotation.asave()
     return {"id": annotation.guid}
 
 
-@api.delete("/annotations/delete/", response={200: Dict, 403: None}, auth=django_auth)
-def delete_annotation(request, annotation_data: AnnotationDeleteSchema):
-    perm = request.auth.has_perm("corpus.delete_annotation")
+@api.delete("/annotations/delete/", response={200: Dict, 403: None}, auth=session_auth)
+async def delete_annotation(request, annotation_data: AnnotationDeleteSchema):
+    perm = await sync_to_async(request.auth.has_perm)("corpus.delete_annotation")
 
     if not perm:
         raise HttpError(403, "Permission denied")
 
-    annotation = Annotation.objects.get(guid=annotation_data.guid)
-    annotation.delete()
+    annotation = await Annotation.objects.aget(guid=annotation_data.guid)
+    await annotation.adelete()
     return {"id": annotation.guid}
 
 
@@ -201,8 +327,10 @@ def delete_annotation(request, annotation_data: AnnotationDeleteSchema):
     "/get_corrections/{sentence_id}/",
     response=CorrectionsSchema,
 )
-def get_sentence_corrections(request, sentence_id: int):
-    sentence = Sentence.objects.get(id=sentence_id)
+async def get_sentence_corrections(request, sentence_id: int):
+    sentence = await Sentence.objects.aget(id=sentence_id)
+    # the corrections missing from the cache are computed in the request thread
+    await sync_to_async(fill_corrections)([sentence])
     data = {
         "correction": sentence.correction,
         "alt_correction": sentence.alt_correction,
@@ -210,9 +338,9 @@ def get_sentence_corrections(request, sentence_id: int):
     return data
 
 
-@api.get("/get_user_info/", response=UserSchema, auth=django_auth)
-def get_user_info(request):
-    user = User.objects.get(id=request.user.id)
+@api.get("/get_user_info/", response=UserSchema, auth=session_auth)
+async def get_user_info(request):
+    user = await User.objects.aget(id=request.auth.id)
     data = {
         "id": redirect(user_profile).url,
         "displayName": user.username,
@@ -224,23 +352,113 @@ def get_user_info(request):
     "/get_sentence_errors/{sentence_id}/",
     response=SentenceErrorSchema,
 )
-def get_sentence_errors(request, sentence_id: int):
-    sentence = Sentence.objects.get(id=sentence_id)
-    words = Token.objects.filter(sentence=sentence).values_list("token", flat=True)
-    errors = [word for word in words if not _DICTIONARY.check(word)]
+async def get_sentence_errors(request, sentence_id: int):
+    sentence = await Sentence.objects.aget(id=sentence_id)
+    errors = await sync_to_async(spelling_utils.get_sentence_errors)([sentence.id])
+    return {"errors": errors[sentence.id]}
+
+
+@api.get(
+    "/get_document_errors/{document_id}/",
+    response=DocumentErrorSchema,
+)
+async def get_document_errors(request, document_id: int):
+    document = await aget_object_or_404(Document, id=document_id)
+    sentence_ids = [
+        sentence_id
+        async for sentence_id in Sentence.objects.filter(document=document)
+        .order_by("number")
+        .values_list("id", flat=True)
+    ]
+    errors = await sync_to_async(spelling_utils.get_sentence_errors)(sentence_ids)
     return {"errors": errors}
 
 
+@api.get(
+    "/documents/{document_id}/workspace/",
+    response={200: WorkspaceSchema, 304: None},
+)
+async def get_document_workspace(request, response: HttpResponse, document_id: int):
+    """Returns the data of the annotate page of a document: the sentences with their
+    annotations, corrections and spelling errors.
+
+    The data is read with three queries after the document (the sentences with their
+    cached corrections, their annotations and their tokens with the spelling
+    verdicts). The ETag changes with the
+    corpus generation, which is incremented whenever annotations or documents change,
+    and with the version of the spelling dictionary.
+    """
+    document = await aget_object_or_404(
+        Document.objects.only("processing_status"), id=document_id
+    )
+    corpus_stats = await sync_to_async(get_corpus_stats)()
+    dictionary_version = await sync_to_async(spelling_utils.get_dictionary_version)()
+    version = (
+        f"{document.id}:{document.processing_status}:"
+        f"{corpus_stats.generation}:{dictionary_version}"
+    )
+    etag = quote_etag(hashlib.sha1(version.encode()).hexdigest())
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return 304, None
+    response["ETag"] = etag
+    response["Cache-Control"] = "no-cache"
+
+    is_processing = document.processing_status != Document.ProcessingStatusChoices.DONE
+    return {
+        "document_id": document.id,
+        "is_processing": is_processing,
+        "sentences": (
+            []
+            if is_processing
+            else await sync_to_async(_get_workspace_sentences)(document)
+        ),
+    }
+
+
+def _get_workspace_sentences(document):
+    """Returns the sentences of a document with their annotations, corrections and
+    spelling errors, see ``get_document_workspace``."""
+    sentences = list(
+        Sentence.objects.filter(document=document)
+        .only("number", "text", "cached_correction", "cached_alt_correction")
+        .order_by("number")
+        .prefetch_related("annotation_set")
+    )
+    fill_corrections(sentences)
+    errors = spelling_utils.get_sentence_errors([sentence.id for sentence in sentences])
+    return [
+        {
+            "id": sentence.id,
+            "number": sentence.number,
+            "text": sentence.text,
+            "annotations": [
+                annotation.json
+                for annotation in sentence.annotation_set.all()
+                if not annotation.alt
+            ],
+            "alt_annotations": [
+                annotation.json
+                for annotation in sentence.annotation_set.all()
+                if annotation.alt
+            ],
+            "correction": sentence.correction,
+            "alt_correction": sentence.alt_correction,
+            "errors": errors[sentence.id],
+        }
+        for sentence in sentences
+    ]
+
+
 @api.get("/get_sentence_context", response=SentenceContextOut)
-def get_sentence_context(request, sentence_id: int):
-    sentence = Sentence.objects.get(pk=sentence_id)
+async def get_sentence_context(request, sentence_id: int):
+    sentence = await Sentence.objects.select_related("document").aget(pk=sentence_id)
 
-    prev_sentence = Sentence.objects.filter(
+    prev_sentence = await Sentence.objects.filter(
         document=sentence.document, number=sentence.number - 1
-    ).first()
-    next_sentence = Sentence.objects.filter(
+    ).afirst()
+    next_sentence = await Sentence.objects.filter(
         document=sentence.document, number=sentence.number + 1
-    ).first()
+    ).afirst()
 
     context = {
         "current": sentence.text,
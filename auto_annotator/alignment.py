@@ -1,80 +1,281 @@
 """ Main class for aligning single tokens between original and corrected versions of the text """
 
 import Levenshtein
+from functools import cached_property
 from itertools import groupby
 
+import numpy as np
+from rapidfuzz.distance import Indel
+from rapidfuzz.process import cdist
+
 from .edit import Edit
 
+# Codes of the operations in the operation matrix
+_OPS = ["O", "M", "S", "I", "D", "T"]
+_MATCH, _SUB, _INS, _DEL, _TRANS = 1, 2, 3, 4, 5
+
 
 class Alignment:
-    def __init__(self, orig, cor):
+    """Alignment of the tokens of the original and corrected texts
+
+    If a band is given, the alignment is first computed in a band around the
+    diagonals (see align), and the full alignment is computed only if the banded one
+    may differ from it (see is_exact).
+    """
+
+    def __init__(self, orig, cor, band=None):
         self.orig = orig.tokens
         self.cor = cor.tokens
-        self.cost_matrix, self.op_matrix = self.align()
-        self.align_seq = self.get_cheapest_align_seq()
+        self.band = band
+        if band is not None:
+            self.cost_matrix, self.op_matrix, self.trans_matrix = self.align(band)
+            if self.cost_matrix is not None:
+                self.align_seq = self.get_cheapest_align_seq()
+            if self.cost_matrix is None or not self.is_exact():
+                # an alignment path leaving the band may be cheaper
+                self.band = None
+        if self.band is None:
+            self.cost_matrix, self.op_matrix, self.trans_matrix = self.align()
+            self.align_seq = self.get_cheapest_align_seq()
 
-    def align(self):
-        """Builds a cost and operation matrices to be used later in the alignment algorithm"""
+    def align(self, band=None):
+        """Builds a cost and operation matrices to be used later in the alignment algorithm
 
+        Every cell only depends on the cells of the previous anti-diagonals, so the
+        matrices are filled by anti-diagonals with array operations. The anti-diagonals
+        are strided slices of the flattened matrices, and the substitution costs are
+        computed in advance for all pairs of distinct tokens.
+
+        If a band is given, only the cells at most band cells away from the diagonals
+        of the corners are filled, the others have an infinite cost. The computation is
+        stopped if the cost of the alignment is known to exceed band, see is_exact.
+
+        Returns:
+            Tuple of the cost matrix, the operation matrix with the codes of the
+            operations and the transposition matrix with the lengths of the
+            transpositions, or a tuple of None if the banded computation was stopped.
+        """
         o_len = len(self.orig)
         c_len = len(self.cor)
-        o_low = [o.text.lower() for o in self.orig]
-        c_low = [c.text.lower() for c in self.cor]
+        width = c_len + 1
 
         # Cost matrix contains the costs of operations between tokens in the original and corrected texts
-        cost_matrix = [[0.0 for j in range(c_len + 1)] for i in range(o_len + 1)]
+        cost_matrix = np.full((o_len + 1, width), 0.0 if band is None else np.inf)
         # Operation matrix contains the selected operations between pairs of token in the original and corrected texts
-        op_matrix = [["O" for j in range(c_len + 1)] for i in range(o_len + 1)]
+        op_matrix = np.zeros((o_len + 1, width), dtype=np.int8)
+        trans_matrix = np.zeros((o_len + 1, width), dtype=np.int32)
+        # Lengths of the runs of cost changes along the diagonals, ending in a cell
+        run_matrix = np.zeros((o_len + 1, width), dtype=np.int32)
 
         # Initialize the matrices by setting the 0th row and 0th column
-        for i in range(1, o_len + 1):
-            cost_matrix[i][0] = cost_matrix[i - 1][0] + 1
-            op_matrix[i][0] = "D"
-        for j in range(1, c_len + 1):
-            cost_matrix[0][j] = cost_matrix[0][j - 1] + 1
-            op_matrix[0][j] = "I"
-
-        # Loop through the matrix, selecting optimal operations between every pair of tokens
-        for i in range(o_len):
-            for j in range(c_len):
-                if self.orig[i].text == self.cor[j].text:
-                    cost_matrix[i + 1][j + 1] = cost_matrix[i][j]
-                    op_matrix[i + 1][j + 1] = "M"
-                else:
-                    # Calculate costs of every operation
-                    del_cost = cost_matrix[i][j + 1] + 1
-                    ins_cost = cost_matrix[i + 1][j] + 1
-                    trans_cost = float("inf")
-                    sub_cost = cost_matrix[i][j] + self.get_sub_cost(
-                        self.orig[i], self.cor[j]
+        cost_matrix[:, 0] = np.arange(o_len + 1)
+        cost_matrix[0, :] = np.arange(width)
+        op_matrix[1:, 0] = _DEL
+        op_matrix[0, 1:] = _INS
+
+        if o_len == 0 or c_len == 0:
+            return cost_matrix, op_matrix, trans_matrix
+
+        o_types, c_types, type_matches, type_sub_costs = self.sub_costs
+        o_low, c_low, o_low_ids, c_low_ids, o_hashes, c_hashes, o_last, c_last = (
+            self.trans_data
+        )
+        costs, ops, runs = cost_matrix.ravel(), op_matrix.ravel(), run_matrix.ravel()
+
+        # Diagonals of the band, as differences between the column and the row
+        if band is None:
+            min_diff, max_diff = -o_len, c_len
+        else:
+            min_diff = min(0, c_len - o_len) - band
+            max_diff = max(0, c_len - o_len) + band
+            limit = band + 1
+            cheap_diagonal = limit - 1
+
+        # Loop through the anti-diagonals, selecting optimal operations between every pair of tokens
+        for diagonal in range(2, o_len + c_len + 1):
+            first = max(1, diagonal - c_len, -((max_diff - diagonal) // 2))
+            last = min(o_len, diagonal - 1, (diagonal - min_diff) // 2)
+            if first > last:
+                continue
+            # The anti-diagonal and the neighbouring cells in the flattened matrices
+            start = first * width + diagonal - first
+            cells = slice(start, start + (last - first) * c_len + 1, c_len)
+            diag_cells = slice(cells.start - width - 1, cells.stop - width - 1, c_len)
+            up_cells = slice(cells.start - width, cells.stop - width, c_len)
+            left_cells = slice(cells.start - 1, cells.stop - 1, c_len)
+            # The pairs of tokens of the anti-diagonal
+            c_stop = diagonal - last - 2
+            pair_types = (
+                o_types[first - 1 : last],
+                c_types[diagonal - first - 1 : c_stop if c_stop >= 0 else None : -1],
+            )
+
+            # Calculate costs of every operation
+            prev_costs = costs[diag_cells]
+            sub_costs = prev_costs + type_sub_costs[pair_types]
+            ins_costs = costs[left_cells] + 1
+            del_costs = costs[up_cells] + 1
+
+            # Select the operation with the cheapest cost, preferring the first one of
+            # transposition, substitution, insertion and deletion
+            best_costs = np.minimum(np.minimum(sub_costs, ins_costs), del_costs)
+            best_ops = np.where(
+                sub_costs == best_costs,
+                _SUB,
+                np.where(ins_costs == best_costs, _INS, _DEL),
+            )
+
+            # Transposition cost calculation: the first k such that the last k + 1
+            # tokens are the same up to order, while the costs keep changing along the
+            # diagonal. The k tokens before a token of one text must include the token
+            # of the other text, and the token multisets are compared by their hashes.
+            matches = type_matches[pair_types]
+            prev_runs = runs[diag_cells]
+            candidates = np.flatnonzero((prev_runs > 0) & ~matches)
+            if len(candidates):
+                i = first - 1 + candidates
+                j = diagonal - first - 1 - candidates
+                min_lengths = np.maximum(
+                    np.maximum(
+                        j - c_last[o_low_ids[i], j], i - o_last[c_low_ids[j], i]
+                    ),
+                    1,
+                )
+                max_lengths = prev_runs[candidates]
+                found = min_lengths > max_lengths
+                for k in range(min_lengths.min(), max_lengths.max() + 1):
+                    active = np.flatnonzero(
+                        ~found & (min_lengths <= k) & (k <= max_lengths)
+                    )
+                    equal = (o_hashes[i[active] + 1] - o_hashes[i[active] - k]) == (
+                        c_hashes[j[active] + 1] - c_hashes[j[active] - k]
                     )
+                    for index in active[equal]:
+                        o_end, c_end = i[index] + 1, j[index] + 1
+                        # the hashes may collide
+                        if sorted(o_low[o_end - k - 1 : o_end]) != sorted(
+                            c_low[c_end - k - 1 : c_end]
+                        ):
+                            continue
+                        found[index] = True
+                        trans_cost = cost_matrix[o_end - k - 1, c_end - k - 1] + k
+                        if trans_cost <= best_costs[candidates[index]]:
+                            best_costs[candidates[index]] = trans_cost
+                            best_ops[candidates[index]] = _TRANS
+                            trans_matrix[o_end, c_end] = k + 1
 
-                    # Transposition cost calculation
-                    k = 1
-                    while (
-                        i - k >= 0
-                        and j - k >= 0
-                        and cost_matrix[i - k + 1][j - k + 1]
-                        != cost_matrix[i - k][j - k]
-                    ):
-                        if sorted(o_low[i - k : i + 1]) == sorted(c_low[j - k : j + 1]):
-                            trans_cost = cost_matrix[i - k][j - k] + k
-                            break
-                        k += 1
-
-                    # Select the operation with the cheapest cost
-                    costs = [trans_cost, sub_cost, ins_cost, del_cost]
-                    l = costs.index(min(costs))
-                    cost_matrix[i + 1][j + 1] = costs[l]
-                    if l == 0:
-                        op_matrix[i + 1][j + 1] = "T" + str(k + 1)
-                    elif l == 1:
-                        op_matrix[i + 1][j + 1] = "S"
-                    elif l == 2:
-                        op_matrix[i + 1][j + 1] = "I"
-                    else:
-                        op_matrix[i + 1][j + 1] = "D"
-        return cost_matrix, op_matrix
+            best_costs = np.where(matches, prev_costs, best_costs)
+            costs[cells] = best_costs
+            ops[cells] = np.where(matches, _MATCH, best_ops)
+            runs[cells] = np.where(best_costs != prev_costs, prev_runs + 1, 0)
+
+            if band is not None:
+                if best_costs.min() < limit:
+                    cheap_diagonal = diagonal
+                elif diagonal - cheap_diagonal >= 2 * limit:
+                    # a path of a cost less than limit cannot skip as many
+                    # anti-diagonals, see is_exact
+                    return None, None, None
+
+        return cost_matrix, op_matrix, trans_matrix
+
+    @cached_property
+    def sub_costs(self):
+        """Calculates the substitution costs of all pairs of distinct tokens, see get_sub_cost
+
+        Returns:
+            Tuple of the ids of the distinct original and corrected tokens, the matrix
+            of exact matches and the matrix of substitution costs, indexed by the ids.
+        """
+        o_types, o_keys = self.get_ids(self.orig, lambda t: (t.text, t.lemma, t.pos))
+        c_types, c_keys = self.get_ids(self.cor, lambda t: (t.text, t.lemma, t.pos))
+        o_texts, o_lemmas, o_pos = map(list, zip(*o_keys))
+        c_texts, c_lemmas, c_pos = map(list, zip(*c_keys))
+
+        ratios = cdist(
+            o_texts, c_texts, scorer=Indel.normalized_similarity, dtype=np.float64
+        )
+        lemma_costs = np.where(np.equal.outer(o_lemmas, c_lemmas), 0, 0.499)
+        pos_costs = np.where(np.equal.outer(o_pos, c_pos), 0, 0.5)
+        sub_costs = lemma_costs + pos_costs + (1 - ratios)
+        sub_costs[
+            np.equal.outer(
+                [text.lower() for text in o_texts], [text.lower() for text in c_texts]
+            )
+        ] = 0
+        return o_types, c_types, np.equal.outer(o_texts, c_texts), sub_costs
+
+    @cached_property
+    def trans_data(self):
+        """Prepares the data for finding transpositions
+
+        Returns:
+            Tuple of the lists and the arrays of the ids of the lowercase original and
+            corrected tokens, the prefix sums of the hashes of the ids, and the last
+            positions of the ids up to every position (see get_last_positions).
+        """
+        ids = {}
+        o_low, _ = self.get_ids(self.orig, lambda t: t.text.lower(), ids)
+        c_low, _ = self.get_ids(self.cor, lambda t: t.text.lower(), ids)
+        hashes = np.array([hash(text) for text in ids], dtype=np.int64).view(np.uint64)
+        return (
+            o_low.tolist(),
+            c_low.tolist(),
+            o_low,
+            c_low,
+            np.concatenate([np.zeros(1, np.uint64), np.cumsum(hashes[o_low])]),
+            np.concatenate([np.zeros(1, np.uint64), np.cumsum(hashes[c_low])]),
+            self.get_last_positions(o_low, len(ids)),
+            self.get_last_positions(c_low, len(ids)),
+        )
+
+    @staticmethod
+    def get_ids(tokens, key, ids=None):
+        """Maps the keys of tokens to integer ids
+
+        Returns:
+            Tuple of the array of the ids of the tokens and the list of the keys.
+        """
+        ids = {} if ids is None else ids
+        token_ids = np.array([ids.setdefault(key(t), len(ids)) for t in tokens])
+        return token_ids, list(ids)
+
+    @staticmethod
+    def get_last_positions(ids, id_count):
+        """Finds the last position of every id up to every position of a text
+
+        Returns:
+            Matrix of the positions indexed by id and position, with a large negative
+            number if the id does not occur up to the position.
+        """
+        positions = np.where(
+            ids == np.arange(id_count)[:, None], np.arange(len(ids)), -(2**30)
+        ).astype(np.int32)
+        return np.maximum.accumulate(positions, axis=1)
+
+    def is_exact(self):
+        """Checks that a banded alignment is the same as the full one
+
+        An alignment path leaving the band contains more than band insertions and
+        deletions, so the costs less than band + 1 are exact, and so is an operation
+        selected from them. The cells of the cheapest path and the cells compared by
+        the transposition checks on it must have exact costs.
+        """
+        costs = self.cost_matrix
+        limit = self.band + 1
+        for op, _, i, _, j in self.align_seq:
+            if costs[i, j] >= limit:
+                return False
+            if op == "M" or not (i and j):
+                continue
+            i, j = i - 1, j - 1
+            while i and j:
+                if costs[i, j] >= limit or costs[i - 1, j - 1] >= limit:
+                    return False
+                if costs[i, j] == costs[i - 1, j - 1]:
+                    break
+                i, j = i - 1, j - 1
+        return True
 
     def get_sub_cost(self, o, c):
         """Calculate the cost of a substitution operation using the Levenshtein distance with additional penalties"""
@@ -93,11 +294,11 @@ class Alignment:
 
     def get_cheapest_align_seq(self):
         """Align the tokens by selecting the optimal operation in the cost matrix"""
-        i = len(self.op_matrix) - 1
-        j = len(self.op_matrix[0]) - 1
+        i = len(self.orig)
+        j = len(self.cor)
         align_seq = []
         while i + j != 0:
-            op = self.op_matrix[i][j]
+            op = self.get_op(i, j)
             if op in {"M", "S"}:
                 align_seq.append((op, i - 1, i, j - 1, j))
                 i -= 1
@@ -116,6 +317,13 @@ class Alignment:
         align_seq.reverse()
         return align_seq
 
+    def get_op(self, i, j):
+        """Returns the name of the operation selected for a cell of the operation matrix"""
+        op = _OPS[self.op_matrix[i, j]]
+        if op == "T":
+            op += str(self.trans_matrix[i, j])
+        return op
+
     def get_all_split_edits(self):
         """all-split merge algorithm. i.e. don't merge any edits"""
         edits = []
@@ -154,10 +362,14 @@ class Alignment:
         orig = " ".join(["Orig:"] + [tok.text for tok in self.orig])
         cor = " ".join(["Cor:"] + [tok.text for tok in self.cor])
         cost_matrix = "\n".join(
-            ["Cost Matrix:"] + [str(row) for row in self.cost_matrix]
+            ["Cost Matrix:"] + [str(row) for row in self.cost_matrix.tolist()]
         )
         op_matrix = "\n".join(
-            ["Operation Matrix:"] + [str(row) for row in self.op_matrix]
+            ["Operation Matrix:"]
+            + [
+                str([self.get_op(i, j) for j in range(len(self.cor) + 1)])
+                for i in range(len(self.orig) + 1)
+            ]
         )
         seq = "Best alignment: " + str([a[0] for a in self.align_seq])
         return "\n".join([orig, cor, cost_matrix, op_matrix, seq])
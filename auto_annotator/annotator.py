@@ -1,24 +1,40 @@
+from concurrent.futures import as_completed
+
 from .alignment import Alignment
-from .text_processor import TextProcessor
+from .text_processor import LEMMA, MORPH, SYNTAX, TextProcessor
 from .merger import get_rule_edits
-from .classifier import classify
+from .classifier import SyntaxNeeded, classify
 
 
 class Annotator:
     """Main class for the tool. Combines other classes into easy-to-use pipelines"""
 
-    def __init__(self):
+    # Annotation layers read by the alignment, the merger and the classifier. Few
+    # classifier rules read the syntax, they raise SyntaxNeeded for texts without it
+    # and the texts are parsed in annotate_processed.
+    layers = (MORPH, LEMMA)
+
+    def __init__(self, alignment_band=None, syntax=False):
+        """alignment_band limits the alignment to a band around the diagonal, see Alignment.
+        syntax parses every text, e.g. for rules reading the dependencies of all edits
+        """
         self.processor = TextProcessor()
+        self.alignment_band = alignment_band
+        self.syntax = syntax
+
+    def get_layers(self):
+        """Returns the annotation layers computed when preprocessing texts"""
+        return self.layers + (SYNTAX,) if self.syntax else self.layers
 
     def process(self, text):
         """Preprocesses text and adds additional metadata to it"""
-        return self.processor.process(text)
+        return self.processor.process(text, self.get_layers())
 
     def align(self, orig, corr):
         """Aligns single-token edits"""
         orig = self.process(orig)
         corr = self.process(corr)
-        return Alignment(orig, corr), orig, corr
+        return Alignment(orig, corr, self.alignment_band), orig, corr
 
     def merge(self, alignment, algorithm="rules"):
         """Merges extracted single-token edits based on an algorithm specified.
@@ -51,8 +67,53 @@ class Annotator:
         Main pipeline for annotation. Accepts two versions of the text: original and corrected.
         Returns a list of edit objects with information about each extracted edit.
         """
-        alignment, orig_tokenized, cor_tokenized = self.align(orig, cor)
-        edits = self.merge(alignment, merging)
-        for edit in edits:
-            edit = self.classify(edit)
+        orig_tokenized = self.process(orig)
+        cor_tokenized = self.process(cor)
+        edits = self.annotate_processed(orig_tokenized, cor_tokenized, merging)
         return edits, orig_tokenized, cor_tokenized
+
+    def annotate_processed(self, orig, cor, merging="rules"):
+        """Aligns, merges and classifies the edits of two preprocessed texts"""
+        edits = self.merge(Alignment(orig, cor, self.alignment_band), merging)
+        for edit in edits:
+            try:
+                edit = self.classify(edit)
+            except SyntaxNeeded:
+                # the texts are parsed on demand, see layers
+                self.processor.add_layers([orig, cor], [SYNTAX])
+                edit = self.classify(edit)
+        return edits
+
+    def annotate_many(self, pairs, merging="rules", submit=None):
+        """
+        Pipeline for annotating several pairs of original and corrected texts.
+        All texts are preprocessed in one pass, and the edits are extracted by the
+        submit function, e.g. in a pool of worker processes, if it is given.
+        submit takes the preprocessed original and corrected texts and the merging
+        algorithm, and returns a future of the edits (see rlc_new.nlp.submit_annotation).
+        Yields tuples of the index of a pair, the list of its edit objects and the
+        preprocessed original and corrected texts, in the order of completion.
+        """
+        docs = self.process_many([text for pair in pairs for text in pair])
+        processed = list(zip(docs[::2], docs[1::2]))
+
+        if submit is None or len(processed) <= 1:
+            for index, (orig, cor) in enumerate(processed):
+                yield index, self.annotate_processed(orig, cor, merging), orig, cor
+            return
+
+        futures = {
+            submit(orig, cor, merging): index
+            for index, (orig, cor) in enumerate(processed)
+        }
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                yield index, future.result(), *processed[index]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def process_many(self, texts):
+        """Preprocesses several texts in one pass"""
+        return self.processor.process_many(texts, self.get_layers())
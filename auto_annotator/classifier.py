@@ -1,17 +1,18 @@
 """ Main collection of functions for classifying edits """
-import pymorphy2
 import re
 
 from Levenshtein import ratio as lev
-from nltk.stem.snowball import SnowballStemmer
+
+from . import morphology
 
 ML = False  # True
 
 if ML:
     from morph_ortho import is_morph
 
-pymorphy_parser = pymorphy2.MorphAnalyzer()
-stemmer = SnowballStemmer("russian")
+
+class SyntaxNeeded(Exception):
+    """Raised by the rules reading the dependencies of tokens without a syntax parse"""
 
 
 def classify(edit):
@@ -112,8 +113,7 @@ def one_sided_prep(toks):
 
 
 def one_sided_lex(toks):
-    # pymorphy_parser = pymorphy2.MorphAnalyzer()
-    if len(toks) == 1 and pymorphy_parser.word_is_known(toks[0].text):
+    if len(toks) == 1 and morphology.word_is_known(toks[0].text):
         return True
     return False
 
@@ -251,13 +251,10 @@ def hyphen_del(o_toks, c_toks):
 
 def infl(o_toks, c_toks):
     if (len(o_toks) == len(c_toks) == 1) and (
-        (stemmer.stem(o_toks[0].text) == stemmer.stem(c_toks[0].text))
+        (morphology.stem(o_toks[0].text) == morphology.stem(c_toks[0].text))
         or (o_toks[0].lemma == c_toks[0].lemma)
     ):
-        parses = pymorphy_parser.parse(c_toks[0].lemma)
-        if o_toks[0].text.lower() not in [
-            form.word for p in parses for form in p.lexeme
-        ]:
+        if o_toks[0].text.lower() not in morphology.lexeme_words(c_toks[0].lemma):
             return True
     return False
 
@@ -291,9 +288,9 @@ def gender(o_toks, c_toks):
         return False
 
     # o_genders = [o_tok.feats.get('Gender', None) for o_tok in o_toks]
-    o_genders = [pymorphy_parser.parse(o_tok.text)[0].tag.gender for o_tok in o_toks]
+    o_genders = [morphology.parse(o_tok.text)[0].tag.gender for o_tok in o_toks]
     # c_genders = [c_tok.feats.get('Gender', None) for c_tok in c_toks]
-    c_genders = [pymorphy_parser.parse(c_tok.text)[0].tag.gender for c_tok in c_toks]
+    c_genders = [morphology.parse(c_tok.text)[0].tag.gender for c_tok in c_toks]
     if (
         o_genders == c_genders
         or len(set(o_genders)) > 1
@@ -303,10 +300,9 @@ def gender(o_toks, c_toks):
     ):
         return False
 
-    stemmer = SnowballStemmer("russian")
     if not all(
         [
-            (stemmer.stem(o_toks[i].lemma) == stemmer.stem(c_toks[i].lemma))
+            (morphology.stem(o_toks[i].lemma) == morphology.stem(c_toks[i].lemma))
             for i in range(len(o_toks))
         ]
     ):
@@ -351,7 +347,7 @@ def brev_natasha(o_toks, c_toks):
         for c_tok in c_toks:
             if (
                 o_tok.lemma == c_tok.lemma
-                or stemmer.stem(o_tok.text) == stemmer.stem(c_tok.text)
+                or morphology.stem(o_tok.text) == morphology.stem(c_tok.text)
             ) and o_tok.feats.get("Variant") != c_tok.feats.get("Variant"):
                 return True
     return False
@@ -361,7 +357,7 @@ def get_adjectives(toks):
     return [
         p
         for t in toks
-        for p in pymorphy_parser.parse(t.text)
+        for p in morphology.parse(t.text)
         if p.tag.POS in ["ADJF", "ADJS", "PRTS", "PRTF"]
     ]
 
@@ -373,7 +369,7 @@ def brev(o_toks, c_toks):
         for c in c_adjs:
             if o.tag.POS != c.tag.POS and (
                 o.normal_form == c.normal_form
-                or stemmer.stem(o.word) == stemmer.stem(c.word)
+                or morphology.stem(o.word) == morphology.stem(c.word)
             ):
                 return True
     return False
@@ -431,8 +427,8 @@ def remove_refl_postfix(text):
 
 
 def related_stems(first, second):
-    first_stem = stemmer.stem(first)
-    second_stem = stemmer.stem(second)
+    first_stem = morphology.stem(first)
+    second_stem = morphology.stem(second)
     return (first_stem in second_stem) or (second_stem in first_stem)
 
 
@@ -607,12 +603,15 @@ def com(o_toks, c_toks):
 
 
 def impers(o_toks, c_toks):
+    if not ((len(o_toks) > 1) and (len(c_toks) > 1)):
+        return False
+    if any(tok.rel is None for tok in o_toks + c_toks):
+        raise SyntaxNeeded
     o_rel = {tok.rel for tok in o_toks}
     c_rel = {tok.rel for tok in c_toks}
-    if (
-        ("nsubj" in o_rel and "nsubj" not in c_rel)
-        or ("nsubj" in c_rel and "nsubj" not in o_rel)
-    ) and ((len(o_toks) > 1) and (len(c_toks) > 1)):
+    if ("nsubj" in o_rel and "nsubj" not in c_rel) or (
+        "nsubj" in c_rel and "nsubj" not in o_rel
+    ):
         return True
     return False
 
@@ -627,7 +626,7 @@ def cs(o_toks, c_toks):
 def lex(o_toks, c_toks):
     if (
         len(o_toks) == len(c_toks) == 1
-        and pymorphy_parser.word_is_known(o_toks[0].text)
+        and morphology.word_is_known(o_toks[0].text)
         and o_toks[0].lemma != c_toks[0].lemma
     ):
         return True
@@ -0,0 +1,50 @@
+""" Cached morphology lookups used for classifying edits """
+
+from functools import lru_cache
+
+import pymorphy2
+from nltk.stem.snowball import SnowballStemmer
+
+# Maximum number of word forms cached by every lookup
+CACHE_SIZE = 2**16
+
+pymorphy_parser = pymorphy2.MorphAnalyzer()
+stemmer = SnowballStemmer("russian")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse(word):
+    """Returns the tuple of the pymorphy2 parses of a word"""
+    return tuple(pymorphy_parser.parse(word))
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def stem(word):
+    """Returns the Snowball stem of a word"""
+    return stemmer.stem(word)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def lexeme_words(word):
+    """Returns the set of the forms of all lexemes a word can belong to"""
+    return frozenset(form.word for p in parse(word) for form in p.lexeme)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def word_is_known(word):
+    """Returns whether a word is in the pymorphy2 dictionary"""
+    return pymorphy_parser.word_is_known(word)
+
+
+_CACHED_LOOKUPS = [parse, stem, lexeme_words, word_is_known]
+
+
+def cache_info():
+    """Returns the hits, misses and sizes of the caches by lookup name"""
+    return {lookup.__name__: lookup.cache_info() for lookup in _CACHED_LOOKUPS}
+
+
+def cache_clear():
+    """Clears the caches, e.g. before measuring"""
+    for lookup in _CACHED_LOOKUPS:
+        lookup.cache_clear()
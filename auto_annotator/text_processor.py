@@ -1,34 +1,66 @@
 """ Main class for processing text fed to the annotator using external libraries """
 
+from natasha import Doc
+from natasha.doc import inject_morph, inject_syntax, offset_syntax, sent_words
 
-from natasha import (
-    Segmenter,
-    MorphVocab,
-    NewsEmbedding,
-    NewsMorphTagger,
-    NewsSyntaxParser,
-    Doc,
-)
+from rlc_new import nlp
+
+
+# Annotation layers added to the segmented texts, the lemmas require the morphology
+MORPH = "morph"
+LEMMA = "lemma"
+SYNTAX = "syntax"
+LAYERS = (MORPH, LEMMA, SYNTAX)
 
 
 class TextProcessor:
-    def __init__(self):
-        self.emb = NewsEmbedding()
-        self.segmenter = Segmenter()
-        self.morph_vocab = MorphVocab()
-        self.morph_tagger = NewsMorphTagger(self.emb)
-        self.syntax_parser = NewsSyntaxParser(self.emb)
-
-    def process(self, text):
-        doc = Doc(text)
-        # Sentence is split into tokens
-        doc.segment(self.segmenter)
-        if len(doc.tokens) > 0:
-            # Every token is parsed by a morphology and syntax parser
-            doc.tag_morph(self.morph_tagger)
-            doc.parse_syntax(self.syntax_parser)
+    # the Natasha models are shared with the document processing, see rlc_new.nlp
+
+    def process(self, text, layers=LAYERS):
+        """Segments a text and adds the given annotation layers to it"""
+        return self.process_many([text], layers)[0]
+
+    def process_many(self, texts, layers=LAYERS):
+        """Processes several texts, tagging and parsing all their sentences in one pass.
+
+        The models process the sentences in batches independently of each other, so
+        the documents are the same as the ones of texts processed one by one.
+        """
+        docs = []
+        for text in texts:
+            doc = Doc(text)
+            # Sentence is split into tokens
+            doc.segment(nlp.get_segmenter())
+            docs.append(doc)
+        self.add_layers(docs, layers)
+        return docs
+
+    def add_layers(self, docs, layers):
+        """Adds annotation layers to segmented documents, e.g. the syntax on demand.
 
+        Args:
+            docs: Natasha documents, segmented and with the layers the given ones
+                require.
+            layers: Layers to add, from MORPH, LEMMA and SYNTAX.
+        """
+        sents = [sent for doc in docs for sent in doc.sents if doc.tokens]
+        chunk = [sent_words(sent) for sent in sents]
+        if MORPH in layers:
+            # Every token is parsed by a morphology parser
+            markups = nlp.get_morph_tagger().map(chunk)
+            for sent, markup in zip(sents, markups):
+                inject_morph(sent.tokens, markup.tokens)
+        if SYNTAX in layers:
+            markups = nlp.get_syntax_parser().map(chunk)
+            for sent, markup in zip(sents, markups):
+                inject_syntax(sent.tokens, markup.tokens)
+            for doc in docs:
+                # the token ids are numbered by the sentences of each document
+                for sent_id, sent in enumerate(doc.sents if doc.tokens else [], 1):
+                    offset_syntax(sent_id, sent.tokens)
+        if LEMMA in layers:
             # Additionally, lemmas of each token are extracted
-            for token in doc.tokens:
-                token.lemmatize(self.morph_vocab)
-        return doc
+            morph_vocab = nlp.get_morph_vocab()
+            for doc in docs:
+                for token in doc.tokens:
+                    token.lemmatize(morph_vocab)
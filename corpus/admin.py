@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from corpus.models import Author, Document
+from corpus.models import Author, Document, DocumentProcessingJob
 
 
 class AuthorAdmin(admin.ModelAdmin):
@@ -32,6 +32,7 @@ class DocumentAdmin(admin.ModelAdmin):
         "time_limit",
         "oral",
         "language_level",
+        "processing_status",
     )
     list_filter = ("genre", "subcorpus", "time_limit", "oral", "language_level")
     search_fields = ("title", "body")
@@ -43,5 +44,29 @@ class DocumentAdmin(admin.ModelAdmin):
     )
 
 
+class DocumentProcessingJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "document",
+        "status",
+        "created_on",
+        "started_on",
+        "finished_on",
+        "latency",
+        "retagged_sentences",
+        "attempts",
+    )
+    list_filter = ("status",)
+    readonly_fields = (
+        "document",
+        "created_on",
+        "started_on",
+        "finished_on",
+        "error",
+        "retagged_sentences",
+        "attempts",
+    )
+
+
 admin.site.register(Author, AuthorAdmin)
 admin.site.register(Document, DocumentAdmin)
+admin.site.register(DocumentProcessingJob, DocumentProcessingJobAdmin)
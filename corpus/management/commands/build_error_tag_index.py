@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from corpus.utils.error_tag_utils import rebuild_error_tag_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds the index of the error tags of the annotated tokens, used by the "
+        "error filters of lexico-grammatical searches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="The number of annotations indexed by one statement",
+        )
+
+    def handle(self, *args, **options):
+        rows = rebuild_error_tag_index(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Error tag index rebuilt: {rows} rows"))
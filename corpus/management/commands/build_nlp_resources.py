@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from rlc_new.nlp_resources import build_resources
+
+
+class Command(BaseCommand):
+    help = (
+        "Converts the Natasha embedding to memory-mapped files loaded by the NLP "
+        "model registry (see rlc_new.nlp_resources)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="Directory to write the resources to (defaults to NLP_RESOURCES_DIR)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or settings.NLP_RESOURCES_DIR
+
+        started = time.perf_counter()
+        try:
+            build_resources(path)
+        except ValueError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(f"NLP resources written to {path} in {elapsed:.1f}s")
+        )
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from corpus.utils.token_index import TokenIndex, get_token_index_path
+
+
+class Command(BaseCommand):
+    help = "Builds the in-memory token index snapshot used by lexico-grammatical search"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            help="Path to write the snapshot to (defaults to TOKEN_INDEX_PATH)",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"] or get_token_index_path()
+
+        started = time.perf_counter()
+        index = TokenIndex.build()
+        index.save(path)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Indexed {len(index)} tokens ({len(index.lemmas)} lemmas) "
+                f"in {elapsed:.1f}s, snapshot written to {path}"
+            )
+        )
@@ -0,0 +1,185 @@
+import itertools
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from corpus.models import Author, ImportCheckpoint
+from rlc_new import nlp
+from corpus.utils.import_utils import (
+    analyze_document_record,
+    iter_json_records,
+    make_document,
+    save_analyzed_documents,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports documents from a JSON (array or JSON Lines) backup, analyzing them "
+        "in a pool of worker processes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to the backup file")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of NLP worker processes (defaults to the number of CPUs)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Number of documents written to the database in one transaction",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Name of the checkpoint used to resume an interrupted import "
+            "(defaults to the absolute path of the backup file)",
+        )
+        parser.add_argument(
+            "--writer",
+            choices=["orm", "copy"],
+            help="Sentence and token writer (defaults to the CORPUS_BULK_WRITER "
+            "setting)",
+        )
+        parser.add_argument(
+            "--user",
+            help="Username of the user set for documents without a user",
+        )
+        parser.add_argument(
+            "--author",
+            type=int,
+            help="Primary key of the author set for documents without an author",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        source = options["checkpoint"] or str(path.resolve())
+        batch_size = options["batch_size"]
+
+        defaults = {}
+        if options["user"]:
+            try:
+                defaults["user"] = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+        if options["author"]:
+            try:
+                defaults["author"] = Author.objects.get(pk=options["author"])
+            except Author.DoesNotExist:
+                raise CommandError(f"Author {options['author']} does not exist")
+
+        checkpoint, _ = ImportCheckpoint.objects.get_or_create(source=source)
+        imported_records = checkpoint.records
+        if imported_records:
+            self.stdout.write(f"Resuming after {imported_records} records")
+
+        records = itertools.islice(iter_json_records(path), imported_records, None)
+        batches = self._iter_document_batches(records, defaults, batch_size)
+
+        # worker processes are forked, so they must not inherit database connections,
+        # and share the NLP models loaded in this process
+        connections.close_all()
+        nlp.preload_analysis()
+        pool = (
+            multiprocessing.get_context("fork").Pool(options["workers"])
+            if options["workers"] > 1
+            else None
+        )
+
+        started = time.perf_counter()
+        document_count = token_count = 0
+        try:
+            # the next batch is analyzed while the previous one is written
+            pending = self._analyze(pool, next(batches, None))
+            while pending is not None:
+                records_count, analyzed = pending[0], pending[1].get()
+                pending = self._analyze(pool, next(batches, None))
+
+                # the checkpoint is saved with the batch, so a batch is never
+                # imported twice
+                with transaction.atomic():
+                    if analyzed:
+                        token_count += save_analyzed_documents(
+                            analyzed, options["writer"]
+                        )
+                    checkpoint.records = imported_records + records_count
+                    checkpoint.save(update_fields=["records", "updated_on"])
+                document_count += len(analyzed)
+                imported_records += records_count
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"{imported_records} records, {document_count} documents, "
+                    f"{token_count} tokens: {document_count / elapsed:.1f} docs/s, "
+                    f"{token_count / elapsed:.0f} tokens/s"
+                )
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        checkpoint.delete()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {document_count} documents and {token_count} tokens in "
+                f"{elapsed:.1f}s ({document_count / max(elapsed, 1e-9):.1f} docs/s, "
+                f"{token_count / max(elapsed, 1e-9):.0f} tokens/s). Run "
+                f"build_token_index to refresh the token index snapshot."
+            )
+        )
+
+    @staticmethod
+    def _iter_document_batches(records, defaults, batch_size):
+        """Yields tuples of the number of consumed records and a batch of documents.
+
+        Records without a body are skipped but still counted for the checkpoint, and
+        records with an unknown user, author or status stop the import.
+        """
+        while True:
+            batch_records = list(itertools.islice(records, batch_size))
+            if not batch_records:
+                return
+            try:
+                documents = [
+                    make_document(record, defaults)
+                    for record in batch_records
+                    if record.get("body", "").strip()
+                ]
+            except ValueError as error:
+                raise CommandError(f"Invalid record: {error}") from error
+            yield len(batch_records), documents
+
+    @staticmethod
+    def _analyze(pool, batch):
+        """Starts the analysis of a batch of documents.
+
+        Returns a tuple of the number of consumed records and an object with a
+        ``get()`` method returning the analyzed documents, or None if there are no
+        more batches.
+        """
+        if batch is None:
+            return None
+        records_count, documents = batch
+        if pool is None:
+            return records_count, _Result(
+                [analyze_document_record(document) for document in documents]
+            )
+        return records_count, pool.map_async(analyze_document_record, documents)
+
+
+class _Result:
+    """The result of an analysis run in the main process."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from corpus.utils.document_utils import process_next_job, reclaim_stale_jobs
+from corpus.utils.stats_utils import refresh_stale_statistics_snapshot
+
+
+class Command(BaseCommand):
+    help = "Processes queued document body changes (see ASYNC_DOCUMENT_PROCESSING)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of waiting for new jobs",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before checking an empty queue again",
+        )
+
+    def handle(self, *args, **options):
+        reclaimed = reclaim_stale_jobs()
+        if reclaimed:
+            self.stdout.write(f"Reclaimed {reclaimed} jobs left by crashed workers")
+
+        while True:
+            job = process_next_job()
+            if job is None:
+                if options["once"]:
+                    return
+                # the queue is drained, refresh the statistics page while idle
+                refresh_stale_statistics_snapshot()
+                time.sleep(options["poll_interval"])
+                continue
+
+            message = (
+                f"Document {job.document_id}: {job.status} in "
+                f"{job.processing_time.total_seconds():.2f}s "
+                f"(latency {job.latency.total_seconds():.2f}s)"
+            )
+            if job.retagged_sentences is not None:
+                message += f", {job.retagged_sentences} sentences re-tagged"
+            if job.error:
+                self.stderr.write(self.style.ERROR(f"{message}: {job.error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(message))
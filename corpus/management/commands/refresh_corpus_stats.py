@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from corpus.utils.stats_utils import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = "Recomputes the precomputed document and corpus statistics"
+
+    def handle(self, *args, **options):
+        corpus_stats = rebuild_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Corpus statistics refreshed: {corpus_stats.documents} documents, "
+                f"{corpus_stats.sentences} sentences, {corpus_stats.tokens} tokens"
+            )
+        )
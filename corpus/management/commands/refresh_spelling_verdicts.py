@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from corpus.utils.spelling_utils import refresh_spelling_verdicts
+
+
+class Command(BaseCommand):
+    help = (
+        "Checks the token forms of the corpus without a verdict of the current "
+        "spelling dictionary and deletes the verdicts of other dictionary versions"
+    )
+
+    def handle(self, *args, **options):
+        checked, deleted = refresh_spelling_verdicts()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Spelling verdicts refreshed: {checked} forms checked, "
+                f"{deleted} outdated verdicts deleted"
+            )
+        )
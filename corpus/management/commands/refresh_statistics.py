@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from corpus.utils.stats_utils import (
+    refresh_stale_statistics_snapshot,
+    refresh_statistics_snapshot,
+)
+
+
+class Command(BaseCommand):
+    help = "Recomputes the snapshot the statistics page is rendered from"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--if-stale",
+            action="store_true",
+            help="Only recompute the snapshot if the corpus changed and "
+            "STATISTICS_REFRESH_INTERVAL seconds passed since it was computed",
+        )
+
+    def handle(self, *args, **options):
+        if options["if_stale"]:
+            snapshot = refresh_stale_statistics_snapshot()
+            if snapshot is None:
+                self.stdout.write("Statistics snapshot is up to date")
+                return
+        else:
+            snapshot = refresh_statistics_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Statistics snapshot refreshed: {snapshot.data['documents']} documents, "
+                f"{snapshot.data['sentences']} sentences, {snapshot.data['tokens']} tokens"
+            )
+        )
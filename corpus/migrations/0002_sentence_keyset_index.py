@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sentence",
+            index=models.Index(
+                fields=["-document", "number"], name="corpus_sent_documen_f88a01_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0002_sentence_keyset_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CorpusStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("documents", models.IntegerField(default=0)),
+                ("sentences", models.IntegerField(default=0)),
+                ("tokens", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DocumentStats",
+            fields=[
+                (
+                    "document",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to="corpus.document",
+                        verbose_name="Document",
+                    ),
+                ),
+                ("sentence_count", models.IntegerField(default=0)),
+                ("token_count", models.IntegerField(default=0)),
+                ("date", models.IntegerField(blank=True, null=True)),
+                ("oral", models.BooleanField(default=False)),
+                (
+                    "language_level",
+                    models.CharField(blank=True, max_length=10, null=True),
+                ),
+                ("gender", models.CharField(blank=True, max_length=10, null=True)),
+                (
+                    "language_background",
+                    models.CharField(blank=True, max_length=10, null=True),
+                ),
+                (
+                    "dominant_language",
+                    models.CharField(blank=True, max_length=10, null=True),
+                ),
+            ],
+        ),
+    ]
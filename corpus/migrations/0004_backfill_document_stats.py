@@ -0,0 +1,49 @@
+from django.db import migrations
+
+BACKFILL_DOCUMENT_STATS = """
+INSERT INTO corpus_documentstats (
+    document_id,
+    sentence_count,
+    token_count,
+    date,
+    oral,
+    language_level,
+    gender,
+    language_background,
+    dominant_language
+)
+SELECT
+    d.id,
+    (SELECT COUNT(*) FROM corpus_sentence s WHERE s.document_id = d.id),
+    (SELECT COUNT(*) FROM corpus_token t WHERE t.document_id = d.id),
+    d.date,
+    d.oral,
+    d.language_level,
+    a.gender,
+    a.language_background,
+    a.dominant_language
+FROM corpus_document d
+LEFT JOIN corpus_author a ON a.id = d.author_id;
+"""
+
+BACKFILL_CORPUS_STATS = """
+INSERT INTO corpus_corpusstats (id, documents, sentences, tokens)
+SELECT
+    1,
+    COUNT(*),
+    COALESCE(SUM(sentence_count), 0),
+    COALESCE(SUM(token_count), 0)
+FROM corpus_documentstats;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0003_document_stats"),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_DOCUMENT_STATS, migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_CORPUS_STATS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0004_backfill_document_stats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="corpusstats",
+            name="generation",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0005_corpus_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="processing_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("processing", "Processing"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="done",
+                max_length=10,
+                verbose_name="Processing status",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DocumentProcessingJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        db_index=True,
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "created_on",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Created on"),
+                ),
+                (
+                    "started_on",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Started on"
+                    ),
+                ),
+                (
+                    "finished_on",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Finished on"
+                    ),
+                ),
+                ("error", models.TextField(blank=True, verbose_name="Error")),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="processing_jobs",
+                        to="corpus.document",
+                        verbose_name="Document",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["created_on"],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0006_document_processing_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentprocessingjob",
+            name="retagged_sentences",
+            field=models.PositiveIntegerField(
+                blank=True, null=True, verbose_name="Re-tagged sentences"
+            ),
+        ),
+    ]
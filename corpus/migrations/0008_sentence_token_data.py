@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0007_document_processing_job_retagged_sentences"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sentence",
+            name="token_data",
+            field=models.JSONField(blank=True, null=True, verbose_name="Token data"),
+        ),
+    ]
@@ -0,0 +1,69 @@
+from django.db import migrations
+
+# the same data as document_utils._get_token_data, with the POS and feature values
+# of document_utils.get_token_data_legend at the time of the migration
+BACKFILL_SENTENCE_TOKEN_DATA = """
+UPDATE corpus_sentence s
+SET token_data = d.token_data
+FROM (
+    SELECT
+        t.sentence_id,
+        jsonb_agg(
+            jsonb_build_array(
+                t.start - s.start,
+                t."end" - s.start,
+                t.lemma,
+                COALESCE(
+                    to_jsonb(
+                        array_position(
+                            ARRAY['ADJ', 'ADP', 'ADV', 'AUX', 'CCONJ', 'DET', 'INTJ', 'NOUN', 'NUM', 'PART', 'PRON', 'PROPN', 'PUNCT', 'SCONJ', 'SYM', 'VERB', 'X'],
+                            t.pos::text
+                        ) - 1
+                    ),
+                    to_jsonb(t.pos)
+                ),
+                rtrim(
+                    substr(c.digits, COALESCE(array_position(ARRAY['Anim', 'Inan'], t.animacy), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Imp', 'Perf'], t.aspect), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Acc', 'Dat', 'Gen', 'Ins', 'Loc', 'Nom', 'Par', 'Voc'], t.case), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Cmp', 'Pos', 'Sup'], t.degree), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Yes'], t.foreign), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Fem', 'Masc', 'Neut'], t.gender), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Yes'], t.hyph), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Cnd', 'Imp', 'Ind'], t.mood), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Plur', 'Sing'], t.number), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['1', '2', '3'], t.person), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Neg'], t.polarity), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Fut', 'Past', 'Pres'], t.tense), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Short'], t.variant), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Conv', 'Fin', 'Inf', 'Part'], t.verbform), 0) + 1, 1) ||
+                    substr(c.digits, COALESCE(array_position(ARRAY['Act', 'Mid', 'Pass'], t.voice), 0) + 1, 1),
+                    '0'
+                )
+            )
+            ORDER BY t.token_num
+        ) AS token_data
+    FROM corpus_token t
+    JOIN corpus_sentence s ON s.id = t.sentence_id
+    CROSS JOIN (SELECT '0123456789abcdefghijklmnopqrstuvwxyz' AS digits) c
+    GROUP BY t.sentence_id
+) d
+WHERE d.sentence_id = s.id;
+"""
+
+# sentences without tokens
+BACKFILL_EMPTY_TOKEN_DATA = """
+UPDATE corpus_sentence SET token_data = '[]'::jsonb WHERE token_data IS NULL;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0008_sentence_token_data"),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_SENTENCE_TOKEN_DATA, migrations.RunSQL.noop),
+        migrations.RunSQL(BACKFILL_EMPTY_TOKEN_DATA, migrations.RunSQL.noop),
+    ]
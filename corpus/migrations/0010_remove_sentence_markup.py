@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0009_backfill_sentence_token_data"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="sentence",
+            name="markup",
+        ),
+    ]
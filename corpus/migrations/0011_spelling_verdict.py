@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0010_remove_sentence_markup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpellingVerdict",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("form", models.CharField(max_length=200, unique=True)),
+                ("version", models.CharField(max_length=200)),
+                ("correct", models.BooleanField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0011_spelling_verdict"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="annotation",
+            name="replacement",
+            field=models.TextField(blank=True, null=True, verbose_name="Replacement"),
+        ),
+        migrations.AddField(
+            model_name="sentence",
+            name="cached_alt_correction",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="sentence",
+            name="cached_correction",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# the same value as models.get_replacement: None if the first highlighting body has a
+# truthy value, otherwise the value of the first commenting body or an empty string
+BACKFILL_ANNOTATION_REPLACEMENT = """
+UPDATE corpus_annotation a
+SET replacement = CASE
+    WHEN (
+        SELECT b.body -> 'value'
+        FROM jsonb_array_elements(a.json -> 'body') WITH ORDINALITY AS b(body, n)
+        WHERE b.body ->> 'purpose' = 'highlighting'
+        ORDER BY b.n
+        LIMIT 1
+    ) NOT IN ('false', 'null', '0', '""', '[]', '{}')
+    THEN NULL
+    ELSE COALESCE(
+        (
+            SELECT b.body ->> 'value'
+            FROM jsonb_array_elements(a.json -> 'body') WITH ORDINALITY AS b(body, n)
+            WHERE b.body ->> 'purpose' = 'commenting'
+            ORDER BY b.n
+            LIMIT 1
+        ),
+        ''
+    )
+END;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0012_sentence_correction_cache"),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_ANNOTATION_REPLACEMENT, migrations.RunSQL.noop),
+    ]
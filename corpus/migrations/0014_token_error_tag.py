@@ -0,0 +1,67 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:47
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0013_backfill_annotation_replacement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenErrorTag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("error_tag", models.CharField(max_length=64)),
+                ("alt", models.BooleanField(default=False)),
+                (
+                    "annotation",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="corpus.annotation",
+                    ),
+                ),
+                (
+                    "sentence",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="corpus.sentence",
+                    ),
+                ),
+                (
+                    "token",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="error_tag_entries",
+                        to="corpus.token",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["error_tag", "sentence"],
+                        name="corpus_toke_error_t_48e04b_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="tokenerrortag",
+            constraint=models.UniqueConstraint(
+                fields=("annotation", "token", "error_tag"),
+                name="unique_annotation_token_error_tag",
+            ),
+        ),
+    ]
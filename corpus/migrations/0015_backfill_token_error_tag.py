@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# the same rows as error_tag_utils.index_error_tags for all annotations
+BACKFILL_TOKEN_ERROR_TAGS = """
+INSERT INTO corpus_tokenerrortag (annotation_id, token_id, sentence_id, error_tag, alt)
+SELECT DISTINCT a.id, at.token_id, a.sentence_id, tag.error_tag, a.alt
+FROM corpus_annotation a
+JOIN corpus_annotation_tokens at ON at.annotation_id = a.id
+CROSS JOIN LATERAL unnest(a.error_tags) AS tag(error_tag)
+WHERE tag.error_tag <> '';
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0014_token_error_tag"),
+    ]
+
+    operations = [
+        migrations.RunSQL(BACKFILL_TOKEN_ERROR_TAGS, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0015_backfill_token_error_tag"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatisticsSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.JSONField(default=dict)),
+                ("generation", models.BigIntegerField(default=0)),
+                ("computed_on", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0016_statistics_snapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="corpusstats",
+            name="token_generation",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
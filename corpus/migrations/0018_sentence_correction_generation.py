@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0017_corpusstats_token_generation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="sentence",
+            name="correction_generation",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+    ]
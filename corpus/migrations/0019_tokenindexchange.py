@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0018_sentence_correction_generation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TokenIndexChange",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("document_id", models.BigIntegerField()),
+                ("xact_id", models.BigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.RemoveField(
+            model_name="corpusstats",
+            name="token_generation",
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0019_tokenindexchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentprocessingjob",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0, verbose_name="Attempts"),
+        ),
+    ]
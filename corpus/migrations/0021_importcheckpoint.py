@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0020_documentprocessingjob_attempts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImportCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source", models.CharField(max_length=255, unique=True)),
+                ("records", models.PositiveBigIntegerField(default=0)),
+                ("updated_on", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -1,4 +1,7 @@
+import json
+
 from django.apps import apps
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.indexes import GinIndex
@@ -7,11 +10,24 @@ from django.contrib.postgres.search import (
 )
 from django.db import models
 from django.db import transaction
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.utils.translation import gettext_lazy as _
 
-from .utils.document_utils import send_post_save_signal, process_body_changes
+from .utils.correction_utils import fill_corrections, invalidate_corrections
+from .utils.error_tag_utils import index_error_tags
+from .utils.document_utils import (
+    send_post_save_signal,
+    process_body_changes,
+    enqueue_body_changes,
+)
+from .utils.stats_utils import (
+    bump_corpus_generation,
+    update_author_stats,
+    update_document_stats,
+    remove_document_stats,
+)
+from .utils.token_index import log_token_changes
 
 
 class Author(models.Model):
@@ -114,6 +130,10 @@ class Author(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_author_stats(self)
+
     def serialize(self):
         return {
             "name": self.name,
@@ -253,6 +273,20 @@ class Document(models.Model):
         verbose_name=_("Annotators"),
     )
 
+    class ProcessingStatusChoices(models.TextChoices):
+        PENDING = "pending", _("Pending")
+        PROCESSING = "processing", _("Processing")
+        DONE = "done", _("Done")
+        FAILED = "failed", _("Failed")
+
+    # The state of the NLP processing of the document body
+    processing_status = models.CharField(
+        max_length=10,
+        choices=ProcessingStatusChoices.choices,
+        default=ProcessingStatusChoices.DONE,
+        verbose_name=_("Processing status"),
+    )
+
     def serialize(self):
         return {
             "id": self.id,
@@ -268,7 +302,7 @@ class Document(models.Model):
             "time_limit": self.time_limit,
             "oral": self.oral,
             "language_level": self.language_level,
-            "annotators": list(self.annotators.values_list("username", flat=True)),
+            "annotators": [annotator.username for annotator in self.annotators.all()],
             "sentences": self.serialize_sentences(),
         }
 
@@ -284,16 +318,35 @@ class Document(models.Model):
         if created and sender == Annotation:
             instance.document.annotators.add(instance.user)
 
+    # noinspection PyMethodParameters
+    @receiver(pre_delete, sender="corpus.Document")
+    def remove_document_from_corpus_stats(sender, instance, **kwargs):
+        remove_document_stats(instance)
+
+    # noinspection PyMethodParameters
+    @receiver(post_delete, sender="corpus.Document")
+    def remove_document_from_token_index(sender, instance, **kwargs):
+        log_token_changes([instance.pk])
+
     @transaction.atomic
     def save(self, *args, **kwargs):
         body_changed = (
             not self.pk
             or Document.objects.only("body").get(pk=self.pk).body != self.body
         )
+        if body_changed and settings.ASYNC_DOCUMENT_PROCESSING:
+            self.processing_status = Document.ProcessingStatusChoices.PENDING
         super().save(*args, **kwargs)
         send_post_save_signal(self)
-        if body_changed:
-            process_body_changes(self)
+        # the number of sentences re-analyzed by this save, None if not processed
+        self.retagged_sentences = None
+        if body_changed and settings.ASYNC_DOCUMENT_PROCESSING:
+            update_document_stats(self)
+            enqueue_body_changes(self)
+        elif body_changed:
+            self.retagged_sentences = process_body_changes(self)
+        else:
+            update_document_stats(self)
 
     class Meta:
         ordering = ["-created_on"]
@@ -302,6 +355,224 @@ class Document(models.Model):
         return self.title
 
 
+class DocumentProcessingJob(models.Model):
+    """
+    A queued NLP processing of a document body, executed by the ``process_documents`` management command.
+
+    Attributes:
+
+    - document (ForeignKey): The document to process.
+    - status (CharField): The state of the job (pending, processing, done or failed).
+    - created_on (DateTimeField): When the job was queued.
+    - started_on (DateTimeField): When a worker started processing the document.
+    - finished_on (DateTimeField): When the processing finished.
+    - error (TextField): The error message if the processing failed.
+    - retagged_sentences (PositiveIntegerField): The number of sentences re-analyzed by the job.
+    - attempts (PositiveIntegerField): The number of times a worker started the job, more than one if a worker
+        crashed while processing it.
+    """
+
+    document = models.ForeignKey(
+        Document,
+        on_delete=models.CASCADE,
+        related_name="processing_jobs",
+        verbose_name=_("Document"),
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Document.ProcessingStatusChoices.choices,
+        default=Document.ProcessingStatusChoices.PENDING,
+        db_index=True,
+        verbose_name=_("Status"),
+    )
+    created_on = models.DateTimeField(auto_now_add=True, verbose_name=_("Created on"))
+    started_on = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Started on")
+    )
+    finished_on = models.DateTimeField(
+        null=True, blank=True, verbose_name=_("Finished on")
+    )
+    error = models.TextField(blank=True, verbose_name=_("Error"))
+    retagged_sentences = models.PositiveIntegerField(
+        null=True, blank=True, verbose_name=_("Re-tagged sentences")
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name=_("Attempts"))
+
+    class Meta:
+        ordering = ["created_on"]
+
+    def __str__(self):
+        return f"{self.document_id}: {self.status}"
+
+    @property
+    def latency(self):
+        """The time from queueing the job to the end of the processing."""
+        if self.finished_on is None:
+            return None
+        return self.finished_on - self.created_on
+
+    @property
+    def processing_time(self):
+        """The time spent processing the document."""
+        if self.finished_on is None or self.started_on is None:
+            return None
+        return self.finished_on - self.started_on
+
+
+class DocumentStats(models.Model):
+    """
+    Precomputed statistics of a document used to evaluate subcorpus statistics.
+
+    The author, language level, oral and date facets of the document are denormalized, so that the statistics of a
+    user subcorpus are evaluated with a single aggregate query over this table. The statistics are updated when a
+    document or its author is saved.
+
+    Attributes:
+
+    - document (OneToOneField): The document.
+    - sentence_count (IntegerField): The number of sentences in the document.
+    - token_count (IntegerField): The number of tokens in the document, including punctuation marks and symbols.
+    - date (IntegerField): The year the document was written in.
+    - oral (BooleanField): Whether the document is oral or written.
+    - language_level (CharField): The language level of the document.
+    - gender (CharField): The gender of the author.
+    - language_background (CharField): The language background of the author.
+    - dominant_language (CharField): The dominant language of the author.
+    """
+
+    document = models.OneToOneField(
+        Document,
+        primary_key=True,
+        on_delete=models.CASCADE,
+        related_name="stats",
+        verbose_name=_("Document"),
+    )
+    sentence_count = models.IntegerField(default=0)
+    token_count = models.IntegerField(default=0)
+    date = models.IntegerField(null=True, blank=True)
+    oral = models.BooleanField(default=False)
+    language_level = models.CharField(max_length=10, null=True, blank=True)
+    gender = models.CharField(max_length=10, null=True, blank=True)
+    language_background = models.CharField(max_length=10, null=True, blank=True)
+    dominant_language = models.CharField(max_length=10, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.document_id}: {self.sentence_count} / {self.token_count}"
+
+
+class CorpusStats(models.Model):
+    """
+    The number of documents, sentences and tokens in the whole corpus.
+
+    The table holds a single row that is updated together with the document statistics.
+
+    Attributes:
+
+    - documents (IntegerField): The number of documents.
+    - sentences (IntegerField): The number of sentences.
+    - tokens (IntegerField): The number of tokens, including punctuation marks and symbols.
+    - generation (BigIntegerField): A counter incremented whenever documents, authors or annotations change, used to
+        invalidate cached search results.
+    """
+
+    documents = models.IntegerField(default=0)
+    sentences = models.IntegerField(default=0)
+    tokens = models.IntegerField(default=0)
+    generation = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.documents} / {self.sentences} / {self.tokens}"
+
+
+class TokenIndexChange(models.Model):
+    """
+    A change of the tokens of a document, the log the processes update their token indexes from.
+
+    A row is appended in the transaction changing the tokens, so the writers do not contend for a row. The processes
+    reload the tokens of the changed documents into their indexes (see ``corpus.utils.token_index``).
+
+    Attributes:
+
+    - document_id (BigIntegerField): The primary key of the document, not a foreign key as the document may be
+        deleted.
+    - xact_id (BigIntegerField): The id of the transaction that made the change (``txid_current()``).
+    """
+
+    document_id = models.BigIntegerField()
+    xact_id = models.BigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.document_id}: {self.xact_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    The progress of an interrupted ``import_corpus`` run.
+
+    The row is updated in the transaction saving a batch of imported documents, so a resumed import neither skips nor
+    duplicates a batch.
+
+    Attributes:
+
+    - source (CharField): The name of the import, by default the path of the backup file.
+    - records (PositiveBigIntegerField): The number of records of the backup imported so far.
+    - updated_on (DateTimeField): When the last batch was saved.
+    """
+
+    source = models.CharField(max_length=255, unique=True)
+    records = models.PositiveBigIntegerField(default=0)
+    updated_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source}: {self.records}"
+
+
+class StatisticsSnapshot(models.Model):
+    """
+    The precomputed figures of the statistics page.
+
+    The table holds a single row with the distributions of documents, sentences, authors and tokens over their facets,
+    so that the page is rendered with a single read. Once the corpus generation has changed, the snapshot is recomputed
+    when the page is read, by the refresh_statistics command and by the document processing worker, at most once per
+    STATISTICS_REFRESH_INTERVAL seconds (see ``corpus.utils.stats_utils``).
+
+    Attributes:
+
+    - data (JSONField): The distributions, each a list of ``[code, count]`` pairs by facet name.
+    - generation (BigIntegerField): The corpus generation the snapshot was computed at.
+    - computed_on (DateTimeField): When the snapshot was computed.
+    """
+
+    data = models.JSONField(default=dict)
+    generation = models.BigIntegerField(default=0)
+    computed_on = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.computed_on} (generation {self.generation})"
+
+
+class SpellingVerdict(models.Model):
+    """
+    The verdict of the spelling dictionary on a token form, shared by all documents.
+
+    The verdicts are computed when the errors of sentences are first requested and kept until the version of the
+    dictionary changes (see ``corpus.utils.spelling_utils``).
+
+    Attributes:
+
+    - form (CharField): The token form, case-sensitive.
+    - version (CharField): The version of the dictionary that checked the form.
+    - correct (BooleanField): Whether the form is in the dictionary.
+    """
+
+    form = models.CharField(max_length=200, unique=True)
+    version = models.CharField(max_length=200)
+    correct = models.BooleanField()
+
+    def __str__(self):
+        return f"{self.form}: {self.correct}"
+
+
 def get_selectors(annotation_json):
     selectors = annotation_json["target"]["selector"]
     text_position_selector = [
@@ -325,80 +596,48 @@ class Sentence(models.Model):
 
     - document (ForeignKey): A reference to the associated `Document` object.
     - text (TextField): The actual text content of the sentence.
-    - markup (TextField): HTML markup of the sentence, containing Bootstrap 5 tooltips with token information.
+    - token_data (JSONField): Compact token information used for the tooltips, a ``[start, end, lemma, pos, feats]``
+        array for each token with offsets relative to the sentence and CoNLL-U features.
     - number (IntegerField): Indicates the position of the sentence within the document, starting from 0.
     - words (ArrayField): A list of the tokens in the sentence, excluding punctuation marks (PUNCT) and symbols (SYM).
     - lemmas (ArrayField): A list of lemmatized forms of the tokens in the sentence, excluding punctuation marks (PUNCT)
         and symbols (SYM).
     - start (IntegerField): The start position of the sentence within the full document text.
     - end (IntegerField): The end position of the sentence within the full document text.
+    - cached_correction (TextField): The corrected text of the sentence, None until it is computed or after its
+        annotations change.
+    - cached_alt_correction (TextField): The alternative corrected text of the sentence, cached in the same way.
+    - correction_generation (IntegerField): Incremented whenever the cached corrections are reset.
     """
 
     document = models.ForeignKey(
         Document, on_delete=models.CASCADE, verbose_name=_("Document")
     )
     text = models.TextField(verbose_name=_("Text"))
-    markup = models.TextField(null=True, blank=True, verbose_name=_("Markup"))
+    token_data = models.JSONField(null=True, blank=True, verbose_name=_("Token data"))
     number = models.IntegerField(verbose_name=_("Position in text"))
     words = ArrayField(models.CharField(max_length=200), default=list)
     lemmas = ArrayField(models.CharField(max_length=200), default=list)
     start = models.IntegerField(null=True, blank=True)
     end = models.IntegerField(null=True, blank=True)
     search_vector = SearchVectorField(null=True)
+    cached_correction = models.TextField(null=True, blank=True, editable=False)
+    cached_alt_correction = models.TextField(null=True, blank=True, editable=False)
+    correction_generation = models.IntegerField(default=0, editable=False)
 
     def get_correction(self, alt=False):
         """
         This method returns the corrected text of the sentence.
+        The corrected texts are cached in the sentence until its annotations change, see ``correction_utils``.
         """
-        annotations = Annotation.objects.filter(sentence=self, alt=alt)
-        if not annotations:
-            return self.text
-
-        corrections = []
-        for annotation in annotations:
-            highliters = [
-                body
-                for body in annotation.json["body"]
-                if body["purpose"] == "highlighting"
-            ]
-            if highliters and highliters[0]["value"]:
-                continue
-            replacement = [
-                correction
-                for correction in annotation.json["body"]
-                if correction["purpose"] == "commenting"
-            ]
-            if not replacement:
-                replacement = ""
-            else:
-                replacement = replacement[0]["value"]
-
-            start, end, exact = get_selectors(annotation.json)
-            corrections.append(
-                {
-                    "start": start,
-                    "end": end,
-                    "exact": exact,
-                    "replacement": replacement,
-                }
-            )
-
-        corrections = sorted(corrections, key=lambda x: x["start"], reverse=True)
-        corrected_text = self.text
-
-        for correction in corrections:
-            corrected_text = (
-                corrected_text[: correction["start"]]
-                + correction["replacement"]
-                + corrected_text[correction["end"] :]
-            )
-
-        return corrected_text
+        if self.cached_correction is None or self.cached_alt_correction is None:
+            fill_corrections([self])
+        return self.cached_alt_correction if alt else self.cached_correction
 
     def serialize(self):
         return {
             "text": self.text,
-            "markup": self.markup,
+            "token_data": self.token_data,
             "number": self.number,
             "annotations": self.serialize_annotations(),
         }
@@ -415,6 +654,13 @@ class Sentence(models.Model):
     def alt_correction(self):
         return self.get_correction(alt=True)
 
+    @property
+    def token_data_json(self):
+        """The token data serialized for the ``data-tokens`` attribute of the sentence."""
+        return json.dumps(
+            self.token_data or [], ensure_ascii=False, separators=(",", ":")
+        )
+
     def __str__(self):
         return self.text
 
@@ -422,6 +668,8 @@ class Sentence(models.Model):
         indexes = [
             GinIndex(fields=["search_vector"]),
             GinIndex(fields=["lemmas"]),
+            # keyset pagination of search results
+            models.Index(fields=["-document", "number"]),
         ]
 
 
@@ -430,6 +678,21 @@ def get_orig_text(annotation_json):
     return exact
 
 
+def get_replacement(annotation_json):
+    """Returns the text replacing the annotated span, or None if the annotation is only a highlighting"""
+    highliters = [
+        body for body in annotation_json["body"] if body["purpose"] == "highlighting"
+    ]
+    if highliters and highliters[0]["value"]:
+        return None
+    replacement = [
+        correction
+        for correction in annotation_json["body"]
+        if correction["purpose"] == "commenting"
+    ]
+    return replacement[0]["value"] if replacement else ""
+
+
 def get_error_tags(annotation_json):
     body = annotation_json.get("body", [])
     error_tags = []
@@ -475,18 +738,57 @@ class Annotation(models.Model):
         null=True,
         verbose_name=_("Error tags"),
     )
+    # the text replacing the annotated span, None if the annotation is only a highlighting
+    replacement = models.TextField(null=True, blank=True, verbose_name=_("Replacement"))
 
-    # save and set orig_text and error_tags
+    # save and set orig_text, error_tags and replacement, and index the error tags
     def save(self, *args, **kwargs):
         self.start, self.end, self.orig_text = get_selectors(self.json)
         self.error_tags = get_error_tags(self.json)
-        toks = Token.objects.filter(
-            sentence=self.sentence,
-            start__gte=self.start + self.sentence.start,
-            end__lte=self.end + self.sentence.start,
+        self.replacement = get_replacement(self.json)
+        token_ids = set(
+            Token.objects.filter(
+                sentence=self.sentence,
+                start__gte=self.start + self.sentence.start,
+                end__lte=self.end + self.sentence.start,
+            ).values_list("pk", flat=True)
         )
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        self.tokens.set(toks)
+        old_token_ids = (
+            set() if adding else set(self.tokens.values_list("pk", flat=True))
+        )
+        # the error tags are re-indexed by index_changed_tokens if the tokens change
+        self.tokens.remove(*(old_token_ids - token_ids))
+        self.tokens.add(*(token_ids - old_token_ids))
+        if token_ids == old_token_ids:
+            index_error_tags([self.pk])
+        invalidate_corrections([self.sentence_id])
+        bump_corpus_generation()
+
+    # noinspection PyMethodParameters
+    @receiver(m2m_changed)
+    def index_changed_tokens(sender, instance, action, reverse, pk_set, **kwargs):
+        # noinspection PyPep8Naming,PyShadowingNames
+        Annotation = apps.get_model("corpus", "Annotation")
+        if sender != Annotation.tokens.through or not action.startswith("post_"):
+            return
+        if not reverse:
+            index_error_tags([instance.pk])
+        elif action == "post_clear":
+            TokenErrorTag.objects.filter(token=instance).delete()
+        else:
+            index_error_tags(pk_set)
+
+    # invalidate the cached corrections and search results; the annotations deleted with
+    # their documents or sentences are not deleted one by one, the corpus generation is
+    # incremented once by the update of the document statistics
+    @transaction.atomic
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        invalidate_corrections([self.sentence_id])
+        bump_corpus_generation()
+        return result
 
     def serialize(self):
         result = self.json
@@ -724,3 +1026,44 @@ class Token(models.Model):
     class Meta:
         verbose_name = _("token")
         verbose_name_plural = _("tokens")
+
+
+class TokenErrorTag(models.Model):
+    """
+    An error tag of a token, the index of the error tags of the annotations by token.
+
+    There is one row per annotation, annotated token and error tag. The rows of an annotation are rewritten when it is
+    saved or its tokens change, and deleted together with it (see ``corpus.utils.error_tag_utils``). Error filters of
+    lexico-grammatical searches are answered with lookups of this table.
+
+    Attributes:
+
+    - annotation (ForeignKey): The annotation with the error tag.
+    - token (ForeignKey): The annotated token.
+    - sentence (ForeignKey): The sentence of the token.
+    - error_tag (CharField): The RLC error tag.
+    - alt (BooleanField): Whether the annotation is alternative.
+    """
+
+    annotation = models.ForeignKey(Annotation, on_delete=models.CASCADE)
+    token = models.ForeignKey(
+        Token, on_delete=models.CASCADE, related_name="error_tag_entries"
+    )
+    sentence = models.ForeignKey(Sentence, on_delete=models.CASCADE)
+    error_tag = models.CharField(max_length=64)
+    alt = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.token_id}: {self.error_tag}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["annotation", "token", "error_tag"],
+                name="unique_annotation_token_error_tag",
+            )
+        ]
+        indexes = [
+            # sentences and tokens with specific error tags
+            models.Index(fields=["error_tag", "sentence"]),
+        ]
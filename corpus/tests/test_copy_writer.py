@@ -0,0 +1,78 @@
+from django.test import TestCase
+
+from corpus.models import Author, Document, Sentence, Token, User
+from corpus.utils.copy_writer import copy_sentences_and_tokens
+from corpus.utils.import_utils import (
+    analyze_document_record,
+    make_document,
+    save_analyzed_documents,
+)
+from .utils import CORPUS_TEXTS
+
+
+def get_rows(model, document, excluded):
+    """Returns the values of the rows of a document, without the primary and foreign
+    keys."""
+    fields = [
+        field.attname
+        for field in model._meta.concrete_fields
+        if field.attname not in excluded
+    ]
+    return list(
+        model.objects.filter(document=document).order_by("pk").values_list(*fields)
+    )
+
+
+class CopyWriterTest(TestCase):
+    """
+    Checks that the COPY writer saves the same sentences and tokens as the bulk_create one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="annotator", password="password")
+        cls.author = Author.objects.create(name="Author")
+
+    def import_document(self, writer):
+        # the sentences and the tokens reference the document before it is saved
+        document = make_document(
+            {
+                "title": writer,
+                "user": self.user.pk,
+                "author": self.author.pk,
+                "body": " ".join(CORPUS_TEXTS),
+            }
+        )
+        save_analyzed_documents([analyze_document_record(document)], writer)
+        return document
+
+    def test_same_rows_as_bulk_create(self):
+        documents = [self.import_document(writer) for writer in ["orm", "copy"]]
+        sentences, copied_sentences = [
+            get_rows(Sentence, document, ["id", "document_id"])
+            for document in documents
+        ]
+        self.assertEqual(len(sentences), 12)
+        self.assertEqual(copied_sentences, sentences)
+        tokens, copied_tokens = [
+            get_rows(Token, document, ["id", "document_id", "sentence_id"])
+            for document in documents
+        ]
+        self.assertEqual(copied_tokens, tokens)
+        for document in documents:
+            with self.subTest(document=document.title):
+                self.assertFalse(
+                    Token.objects.filter(document=document)
+                    .exclude(sentence__document=document)
+                    .exists()
+                )
+
+    def test_unsaved_related_object(self):
+        sentence = Sentence(
+            document=Document(title="Unsaved", user=self.user, author=self.author),
+            text="Я читал книгу.",
+            number=0,
+        )
+        with self.assertRaises(ValueError):
+            copy_sentences_and_tokens([sentence], [])
+        self.assertFalse(Sentence.objects.filter(text=sentence.text).exists())
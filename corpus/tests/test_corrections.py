@@ -0,0 +1,100 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from corpus.models import Annotation, CorpusStats, Sentence
+from corpus.utils.correction_utils import fill_corrections
+from .utils import annotate, create_corpus
+
+
+def count_updates(queries, table):
+    return sum(
+        query["sql"].startswith(f'UPDATE "{table}"')
+        for query in queries.captured_queries
+    )
+
+
+class CorrectionCacheTest(TestCase):
+    """
+    Checks that the cached corrections of the sentences are invalidated when their annotations change, and that
+    deleting a document or its sentences invalidates the cached search results once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, documents = create_corpus()
+        cls.document = documents[0]
+        cls.sentences = list(cls.document.sentence_set.order_by("number"))
+        # "интересную" -> "интересная" in the first sentence, "большом" -> "большой" in
+        # the second one, and highlightings in all the sentences
+        annotate(cls.sentences[0], cls.user, 12, 22, replacement="интересная")
+        annotate(cls.sentences[1], cls.user, 15, 22, replacement="большой")
+        for sentence in cls.sentences:
+            annotate(sentence, cls.user, 0, 4, tag="Gram")
+
+    def get_generation(self):
+        return CorpusStats.objects.values_list("generation", flat=True).get()
+
+    def fill(self):
+        sentences = list(self.document.sentence_set.order_by("number"))
+        fill_corrections(sentences)
+        return [sentence.cached_correction for sentence in sentences]
+
+    def test_corrections_are_cached(self):
+        corrections = self.fill()
+        self.assertEqual(
+            corrections[:2],
+            ["Мама читает интересная книгу.", "Книга лежит на большой столе."],
+        )
+        self.assertEqual(
+            list(
+                self.document.sentence_set.order_by("number").values_list(
+                    "cached_correction", flat=True
+                )
+            ),
+            corrections,
+        )
+
+    def test_changed_annotation_invalidates_correction(self):
+        self.fill()
+        annotation = Annotation.objects.get(sentence=self.sentences[0], start=12)
+        annotation.json["body"][1]["value"] = "интересной"
+        annotation.save()
+        self.assertIsNone(
+            Sentence.objects.get(pk=self.sentences[0].pk).cached_correction
+        )
+        self.assertIsNotNone(
+            Sentence.objects.get(pk=self.sentences[1].pk).cached_correction
+        )
+        self.assertEqual(self.fill()[0], "Мама читает интересной книгу.")
+
+    def test_deleted_annotation_invalidates_correction(self):
+        self.fill()
+        generation = self.get_generation()
+        Annotation.objects.get(sentence=self.sentences[1], start=15).delete()
+        self.assertIsNone(
+            Sentence.objects.get(pk=self.sentences[1].pk).cached_correction
+        )
+        self.assertEqual(self.get_generation(), generation + 1)
+        self.assertEqual(self.fill()[1], self.sentences[1].text)
+
+    def test_deleted_sentences_invalidate_searches_once(self):
+        generation = self.get_generation()
+        document = self.document
+        document.body = document.body.replace("большом", "новом").replace(
+            "новые", "старые"
+        )
+        with CaptureQueriesContext(connection) as queries:
+            document.save()
+        self.assertEqual(document.annotation_set.count(), 2)
+        self.assertEqual(self.get_generation(), generation + 1)
+        self.assertEqual(count_updates(queries, "corpus_corpusstats"), 1)
+
+    def test_deleted_document_invalidates_searches_once(self):
+        generation = self.get_generation()
+        with CaptureQueriesContext(connection) as queries:
+            self.document.delete()
+        self.assertFalse(Annotation.objects.filter(document_id=self.document.pk))
+        self.assertEqual(self.get_generation(), generation + 1)
+        self.assertEqual(count_updates(queries, "corpus_corpusstats"), 1)
+        self.assertEqual(count_updates(queries, "corpus_sentence"), 0)
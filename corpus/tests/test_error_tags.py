@@ -0,0 +1,60 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from corpus import models
+from corpus.models import TokenErrorTag
+from .utils import CORPUS_TEXTS, annotate, create_corpus
+
+
+class AnnotationErrorTagsTest(TestCase):
+    """
+    Checks that saving an annotation indexes its error tags once, whether its tokens change or not.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, documents = create_corpus(CORPUS_TEXTS[:1])
+        cls.sentence = documents[0].sentence_set.get(number=0)
+
+    def indexed(self, annotation):
+        return sorted(
+            TokenErrorTag.objects.filter(annotation=annotation).values_list(
+                "token__token", "error_tag"
+            )
+        )
+
+    def count_indexing(self):
+        # the receiver of the token changes and Annotation.save share the module global
+        return mock.patch.object(
+            models, "index_error_tags", wraps=models.index_error_tags
+        )
+
+    def test_error_tags_are_indexed_once(self):
+        with self.count_indexing() as index_error_tags:
+            # "интересную книгу"
+            annotation = annotate(self.sentence, self.user, 12, 28, tag="Ortho")
+        self.assertEqual(index_error_tags.call_count, 1)
+        self.assertEqual(
+            self.indexed(annotation), [("интересную", "Ortho"), ("книгу", "Ortho")]
+        )
+
+        for tag, start, end, expected in [
+            # the tag changes, the tokens stay the same
+            ("Gram", 12, 28, [("интересную", "Gram"), ("книгу", "Gram")]),
+            # the tokens change, "книгу"
+            ("Gram", 23, 28, [("книгу", "Gram")]),
+        ]:
+            with self.subTest(tag=tag, start=start, end=end):
+                annotation.json["body"][0]["value"] = tag
+                annotation.json["target"]["selector"] = [
+                    {
+                        "type": "TextQuoteSelector",
+                        "exact": self.sentence.text[start:end],
+                    },
+                    {"type": "TextPositionSelector", "start": start, "end": end},
+                ]
+                with self.count_indexing() as index_error_tags:
+                    annotation.save()
+                self.assertEqual(index_error_tags.call_count, 1)
+                self.assertEqual(self.indexed(annotation), expected)
@@ -0,0 +1,107 @@
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from corpus.models import Document, User
+from corpus.utils.export_utils import iter_export_documents, stream_documents_json
+from .utils import CORPUS_TEXTS, annotate, create_corpus
+
+
+class DocumentsExportTest(TestCase):
+    """
+    Checks that the documents export streams the documents selected by the document filter, read in keyset-ordered
+    batches.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author, cls.documents = create_corpus()
+        annotate(cls.documents[1].sentence_set.get(number=0), cls.user, 0, 1)
+        cls.other_user = User.objects.create_user(username="other", password="other")
+        cls.other_document = Document.objects.create(
+            title="Document 1 of the other user",
+            user=cls.other_user,
+            author=cls.author,
+            date=2023,
+            body=CORPUS_TEXTS[0],
+        )
+        # documents created at the same time are ordered by their primary keys
+        Document.objects.filter(pk__in=[d.pk for d in cls.documents[1:3]]).update(
+            created_on=cls.documents[1].created_on
+        )
+
+    def get_ordered_documents(self):
+        return list(Document.objects.order_by("-created_on", "-pk"))
+
+    def test_requires_login(self):
+        response = self.client.get(reverse("export_documents"))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("login", response["Location"])
+
+    def test_filtered_export(self):
+        self.client.force_login(self.user)
+        for params, expected in [
+            ({}, self.get_ordered_documents()),
+            ({"title": "Document 1"}, [self.other_document, self.documents[1]]),
+            (
+                {"title": "Document 1", "user__username": "annotator"},
+                [self.documents[1]],
+            ),
+            ({"user": self.other_user.pk}, [self.other_document]),
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(reverse("export_documents"), params)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.streaming)
+                exported = json.loads(b"".join(response.streaming_content))
+                self.assertEqual(
+                    [document["id"] for document in exported],
+                    [document.pk for document in expected],
+                )
+                self.assertEqual(
+                    exported,
+                    json.loads(
+                        "".join(
+                            stream_documents_json(
+                                Document.objects.filter(
+                                    pk__in=[document.pk for document in expected]
+                                )
+                            )
+                        )
+                    ),
+                )
+
+    async def test_export_streams_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse("export_documents"), {"title": "Document 1"}
+        )
+        self.assertEqual(response.status_code, 200)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(
+            [document["title"] for document in json.loads(b"".join(chunks))],
+            ["Document 1 of the other user", "Document 1"],
+        )
+
+    def test_keyset_batches(self):
+        expected = self.get_ordered_documents()
+        for batch_size in [1, 2, 3, len(expected), len(expected) + 1]:
+            with self.subTest(batch_size=batch_size):
+                with CaptureQueriesContext(connection) as queries:
+                    exported = list(
+                        iter_export_documents(Document.objects.all(), batch_size)
+                    )
+                self.assertEqual(exported, expected)
+                # a batch is read after every full batch
+                batches = len(expected) // batch_size + 1
+                document_queries = [
+                    query["sql"]
+                    for query in queries.captured_queries
+                    if 'FROM "corpus_document" ' in query["sql"]
+                ]
+                self.assertEqual(len(document_queries), batches)
+                self.assertNotIn("OFFSET", " ".join(document_queries))
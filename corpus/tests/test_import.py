@@ -0,0 +1,165 @@
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import translation
+
+from corpus.management.commands import import_corpus
+from corpus.models import Author, Document, ImportCheckpoint, User
+from corpus.utils.export_utils import stream_documents_json
+from corpus.utils.import_utils import (
+    analyze_document_record,
+    make_document,
+    save_analyzed_documents,
+)
+from rlc_new import nlp
+
+# Document fields that must survive an export and an import
+ROUND_TRIP_FIELDS = [
+    "title",
+    "body",
+    "date",
+    "genre",
+    "subcorpus",
+    "status",
+    "time_limit",
+    "oral",
+    "language_level",
+    "author_id",
+    "user_id",
+]
+
+
+class DocumentExportImportTest(TestCase):
+    """
+    Checks that the records of the documents export can be imported by ``import_corpus``.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="annotator", password="password")
+        cls.author = Author.objects.create(
+            name="Author",
+            gender=Author.GenderChoices.F,
+            program="Program",
+            source="Source",
+        )
+        cls.document = Document.objects.create(
+            title="Title",
+            user=cls.user,
+            author=cls.author,
+            date=2023,
+            status=Document.StatusChoices.CHECKED,
+            oral=True,
+            body="Я читал книгу. Мы гуляли в парке.",
+        )
+
+    def export_records(self):
+        return json.loads(
+            "".join(stream_documents_json(Document.objects.filter(pk=self.document.pk)))
+        )
+
+    def test_round_trip(self):
+        for language in ["ru", "en"]:
+            with self.subTest(language=language), translation.override(language):
+                (record,) = self.export_records()
+                document = make_document(record)
+                for field in ROUND_TRIP_FIELDS:
+                    self.assertEqual(
+                        getattr(document, field), getattr(self.document, field), field
+                    )
+
+    def test_imported_document_is_analyzed(self):
+        (record,) = self.export_records()
+        save_analyzed_documents([analyze_document_record(make_document(record))])
+        imported = Document.objects.exclude(pk=self.document.pk).get()
+        self.assertEqual(
+            list(imported.sentence_set.order_by("number").values_list("text")),
+            list(self.document.sentence_set.order_by("number").values_list("text")),
+        )
+        self.assertEqual(Author.objects.count(), 1)
+
+    def test_unknown_values(self):
+        (record,) = self.export_records()
+        for field, value in [
+            ("user", "unknown"),
+            ("status", "Unknown"),
+            ("author", {"name": "Author", "age": 20}),
+        ]:
+            with self.subTest(field=field), self.assertRaises(ValueError):
+                make_document({**record, field: value})
+
+
+class ImportCorpusCommandTest(TransactionTestCase):
+    """
+    Checks that an interrupted ``import_corpus`` run is resumed after the last saved batch, and that the import loads
+    only the models of the document analysis.
+    """
+
+    def setUp(self):
+        user = User.objects.create_user(username="annotator", password="password")
+        author = Author.objects.create(name="Author")
+        self.records = [
+            {
+                "title": f"Document {number}",
+                "user": user.username,
+                "author": {"name": author.name},
+                "body": f"Я прочитал {number + 1} книги. Мы гуляли в парке.",
+            }
+            for number in range(3)
+        ]
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.path = Path(tmp_dir.name) / "backup.jsonl"
+        self.path.write_text(
+            "\n".join(json.dumps(record) for record in self.records), encoding="utf-8"
+        )
+
+    def import_corpus(self):
+        call_command(
+            "import_corpus",
+            str(self.path),
+            workers=1,
+            batch_size=1,
+            stdout=io.StringIO(),
+        )
+
+    def test_resume_after_failed_batch(self):
+        def fail_second_batch(analyzed, writer=None):
+            if save.call_count == 2:
+                raise RuntimeError("Interrupted")
+            return save_analyzed_documents(analyzed, writer)
+
+        with mock.patch.object(
+            import_corpus, "save_analyzed_documents", side_effect=fail_second_batch
+        ) as save, self.assertRaises(RuntimeError):
+            self.import_corpus()
+        self.assertEqual(
+            list(Document.objects.values_list("title", flat=True)), ["Document 0"]
+        )
+        self.assertEqual(ImportCheckpoint.objects.get().records, 1)
+
+        self.import_corpus()
+        self.assertEqual(
+            sorted(Document.objects.values_list("title", flat=True)),
+            [record["title"] for record in self.records],
+        )
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_only_analysis_models_are_loaded(self):
+        with mock.patch.object(
+            nlp, "get_syntax_parser"
+        ) as get_syntax_parser, mock.patch.object(
+            nlp, "get_annotator"
+        ) as get_annotator, mock.patch.object(
+            nlp, "get_spelling_dictionary"
+        ) as get_spelling_dictionary:
+            self.import_corpus()
+        self.assertEqual(Document.objects.count(), len(self.records))
+        get_syntax_parser.assert_not_called()
+        get_annotator.assert_not_called()
+        get_spelling_dictionary.assert_not_called()
@@ -0,0 +1,133 @@
+from django.test import TestCase
+
+from corpus.models import Sentence
+from corpus.utils.lexgram_sql import lexgram_query_sentences
+from corpus.utils.lexgram_utils import lexgram_find_sentences
+from corpus.utils.search_helper_classes import ANY_ERROR, TokenSearchSequence
+from corpus.utils.search_utils import _filter_after_cursor
+from corpus.utils.token_index import TokenIndex
+from .utils import annotate, create_corpus
+
+PAGE_SIZE = 2
+
+
+def make_sequence(tokens, distances=()):
+    """Returns a TokenSearchSequence from a list of (lemma, lexes, grammars, errors)
+    tuples and a list of (from, to) distances between them."""
+    return TokenSearchSequence(
+        wordforms=[token[0] for token in tokens],
+        froms=[distance[0] for distance in distances],
+        tos=[distance[1] for distance in distances],
+        lexes=[token[1] for token in tokens],
+        grammars=[token[2] for token in tokens],
+        errors=[token[3] for token in tokens],
+    )
+
+
+# the search sequences by name
+SEARCHES = {
+    "lemma": make_sequence([("книга", [], [], [])]),
+    "pos": make_sequence([("", ["ADJ"], [], [])]),
+    "grammar": make_sequence([("", ["NOUN"], [("case", "Acc")], [])]),
+    "pos union and grammar union": make_sequence(
+        [("", ["NOUN", "PRON"], [("number", "Plur"), ("case", "Gen")], [])]
+    ),
+    "adjacent": make_sequence(
+        [("читать", [], [], []), ("", ["NOUN"], [], [])], [(1, 1)]
+    ),
+    "distance range": make_sequence(
+        [("", ["VERB"], [], []), ("", ["NOUN"], [], [])], [(1, 3)]
+    ),
+    "negative distance": make_sequence(
+        [("", ["NOUN"], [], []), ("", ["ADJ"], [], [])], [(-1, -1)]
+    ),
+    "three tokens": make_sequence(
+        [("", ["ADJ"], [], []), ("", ["NOUN"], [], []), ("", ["VERB"], [], [])],
+        [(1, 1), (1, 2)],
+    ),
+    "error tag": make_sequence([("", [], [], ["Ortho"])]),
+    "any error": make_sequence(
+        [("", ["NOUN"], [], [ANY_ERROR]), ("", [], [], [])], [(-2, 2)]
+    ),
+}
+
+
+class LexgramEnginesTest(TestCase):
+    """
+    Checks that the SQL engine and the token index find the same pages of sentences as the reference matcher.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user, _, documents = create_corpus()
+        # "книгу" of the first sentence and "письмо" of the second one of the third document
+        annotate(documents[0].sentence_set.get(number=0), user, 23, 28, tag="Ortho")
+        annotate(documents[2].sentence_set.get(number=1), user, 17, 23, tag="Gram")
+
+    def search_pages(self, find_page):
+        """Returns the pages of the sentence ids found by a search function taking a
+        cursor and returning the sentence ids and the cursor of the next page."""
+        pages = []
+        cursor = None
+        while True:
+            sentence_ids, cursor = find_page(cursor)
+            if sentence_ids:
+                pages.append(sentence_ids)
+            if len(sentence_ids) < PAGE_SIZE:
+                return pages
+
+    def reference_pages(self, search_seq):
+        def find_page(cursor):
+            sentence_ids, _, next_cursor = lexgram_find_sentences(
+                Sentence.objects.all(), search_seq, PAGE_SIZE, cursor
+            )
+            return sentence_ids, next_cursor
+
+        return self.search_pages(find_page)
+
+    def engine_pages(self, find_matches):
+        def find_page(cursor):
+            matches = find_matches(cursor)
+            next_cursor = (
+                (matches[-1].document_id, matches[-1].number) if matches else None
+            )
+            return [match.sentence_id for match in matches], next_cursor
+
+        return self.search_pages(find_page)
+
+    def test_engines_match_reference(self):
+        index = TokenIndex.build()
+        for name, search_seq in SEARCHES.items():
+            with self.subTest(search=name):
+                expected = self.reference_pages(search_seq)
+                self.assertTrue(expected, "the reference matcher finds no sentences")
+
+                sql_pages = self.engine_pages(
+                    lambda cursor: lexgram_query_sentences(
+                        _filter_after_cursor(Sentence.objects.all(), cursor),
+                        search_seq,
+                        0,
+                        PAGE_SIZE,
+                    )
+                )
+                self.assertEqual(sql_pages, expected, "SQL engine")
+
+                index_pages = self.engine_pages(
+                    lambda cursor: index.search(
+                        search_seq, None, 0, PAGE_SIZE, after=cursor
+                    )
+                )
+                self.assertEqual(index_pages, expected, "token index")
+
+    def test_reference_pages_follow_search_order(self):
+        pages = self.reference_pages(SEARCHES["lemma"])
+        self.assertGreater(len(pages), 1)
+        sentence_ids = [sentence_id for page in pages for sentence_id in page]
+        self.assertEqual(
+            sentence_ids,
+            list(
+                Sentence.objects.filter(pk__in=sentence_ids)
+                .order_by("-document_id", "number")
+                .values_list("pk", flat=True)
+            ),
+        )
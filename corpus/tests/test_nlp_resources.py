@@ -0,0 +1,69 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from django.test import SimpleTestCase
+from natasha import Doc, NewsEmbedding, NewsMorphTagger, NewsSyntaxParser, Segmenter
+
+from rlc_new import nlp_resources
+
+SAMPLE_TEXT = "Мама читает интересную книгу, а дети играют во дворе."
+
+
+class NLPResourcesTest(SimpleTestCase):
+    """
+    Checks that the models loaded from the memory-mapped resources tag and parse a text as the stock Natasha models do.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.path = Path(cls.tmp_dir.name) / "nlp"
+        nlp_resources.build_resources(cls.path)
+        cls.words_vocab = nlp_resources.load_words_vocab(cls.path)
+        cls.embedding = nlp_resources.load_embedding(cls.path, cls.words_vocab)
+        cls.stock_embedding = NewsEmbedding()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+        super().tearDownClass()
+
+    def process(self, *taggers):
+        doc = Doc(SAMPLE_TEXT)
+        doc.segment(Segmenter())
+        for tagger in taggers:
+            tagger(doc)
+        return [
+            (token.text, token.pos, token.feats, token.id, token.head_id, token.rel)
+            for token in doc.tokens
+        ]
+
+    def test_resources_exist(self):
+        self.assertTrue(nlp_resources.resources_exist(self.path))
+        self.assertFalse(nlp_resources.resources_exist(self.path / "missing"))
+
+    def test_embedding(self):
+        self.assertIsInstance(self.embedding.pq.codes, np.memmap)
+        for word in ["мама", "книгу", "<unk>"]:
+            with self.subTest(word=word):
+                np.testing.assert_array_equal(
+                    self.embedding.get(word), self.stock_embedding.get(word)
+                )
+
+    def test_morph_tagger(self):
+        tagger = nlp_resources.load_morph_tagger(self.embedding, self.words_vocab)
+        stock_tagger = NewsMorphTagger(self.stock_embedding)
+        tokens = self.process(lambda doc: doc.tag_morph(tagger))
+        self.assertEqual(tokens[0][:2], ("Мама", "NOUN"))
+        self.assertEqual(tokens, self.process(lambda doc: doc.tag_morph(stock_tagger)))
+
+    def test_syntax_parser(self):
+        parser = nlp_resources.load_syntax_parser(self.embedding, self.words_vocab)
+        stock_parser = NewsSyntaxParser(self.stock_embedding)
+        tokens = self.process(lambda doc: doc.parse_syntax(parser))
+        self.assertEqual(tokens[0][-1], "nsubj")
+        self.assertEqual(
+            tokens, self.process(lambda doc: doc.parse_syntax(stock_parser))
+        )
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from corpus.models import Document, DocumentProcessingJob
+from corpus.utils.document_utils import process_next_job, reclaim_stale_jobs
+from .utils import CORPUS_TEXTS, create_corpus
+
+statuses = Document.ProcessingStatusChoices
+
+
+@override_settings(DOCUMENT_PROCESSING_TIMEOUT=60, DOCUMENT_PROCESSING_MAX_ATTEMPTS=3)
+class StaleJobsTest(TestCase):
+    """
+    Checks that the jobs left processing by crashed workers are processed again, and failed after the maximal number of
+    attempts.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        _, _, documents = create_corpus(CORPUS_TEXTS[:2])
+        cls.document, cls.other_document = documents
+
+    def create_job(self, document, started_ago, attempts):
+        return DocumentProcessingJob.objects.create(
+            document=document,
+            status=statuses.PROCESSING,
+            started_on=timezone.now() - timedelta(seconds=started_ago),
+            attempts=attempts,
+        )
+
+    def test_stale_job_is_processed_again(self):
+        job = self.create_job(self.document, started_ago=120, attempts=1)
+        processed = process_next_job()
+        self.assertEqual(processed.pk, job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, statuses.DONE)
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(process_next_job())
+
+    def test_recent_job_is_not_reclaimed(self):
+        self.create_job(self.document, started_ago=10, attempts=1)
+        self.assertIsNone(process_next_job())
+        self.assertEqual(reclaim_stale_jobs(), 0)
+
+    def test_job_fails_after_max_attempts(self):
+        job = self.create_job(self.document, started_ago=120, attempts=3)
+        process_next_job()
+        job.refresh_from_db()
+        self.assertEqual(job.status, statuses.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("3 attempts", job.error)
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.processing_status, statuses.FAILED)
+
+    def test_reclaim_stale_jobs(self):
+        stale_job = self.create_job(self.document, started_ago=120, attempts=1)
+        failed_job = self.create_job(self.other_document, started_ago=120, attempts=3)
+        recent_job = self.create_job(self.other_document, started_ago=10, attempts=1)
+        self.assertEqual(reclaim_stale_jobs(), 2)
+        for job, status in [
+            (stale_job, statuses.PENDING),
+            (failed_job, statuses.FAILED),
+            (recent_job, statuses.PROCESSING),
+        ]:
+            job.refresh_from_db()
+            self.assertEqual(job.status, status)
+        self.assertEqual(process_next_job().pk, stale_job.pk)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from corpus.utils import token_index
+from corpus.utils.search_export import get_export_semaphore
+from corpus.utils.search_utils import (
+    decode_search_cursor,
+    encode_search_cursor,
+    get_search_semaphore,
+    perform_exact_search,
+    perform_lexgram_search,
+    preprocess_exact_search,
+    preprocess_lexgram_search,
+)
+from .utils import create_corpus
+
+PAGE_SIZE = 2
+
+EXACT_SEARCH = {"query": "книги", "settings": {}}
+LEXGRAM_SEARCH = {
+    "tokens": {
+        "wordform[]": ["", ""],
+        "from[]": ["1"],
+        "to[]": ["1"],
+        "lex[]": ["ADJ", "NOUN"],
+        "grammar[]": ["", ""],
+        "errors[]": ["", ""],
+    },
+    "settings": {},
+}
+
+
+class SearchSemaphoreTest(SimpleTestCase):
+    """
+    Checks that the search and export semaphores are shared by the requests of an event loop only, as under WSGI
+    every request runs in a new one.
+    """
+
+    def test_semaphore_per_event_loop(self):
+        for get_semaphore in [get_search_semaphore, get_export_semaphore]:
+            with self.subTest(get_semaphore=get_semaphore.__name__):
+
+                async def acquire_twice():
+                    async with get_semaphore():
+                        pass
+                    return get_semaphore(), get_semaphore()
+
+                first, same = asyncio.run(acquire_twice())
+                second, _ = asyncio.run(acquire_twice())
+                self.assertIs(first, same)
+                self.assertIsNot(first, second)
+
+
+class SearchPaginationTest(TestCase):
+    """
+    Checks that the keyset pagination of the searches returns every matching sentence once, in the order of the
+    search results, across the boundaries of the documents, and that malformed requests are rejected.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        create_corpus()
+
+    def setUp(self):
+        # the token index of the process may hold the documents of other tests
+        for name, value in [("_INDEX", None), ("_CHECKED_ON", None)]:
+            patcher = mock.patch.object(token_index, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def search_pages(self, perform_search, preprocess, data):
+        """Returns the pages of the sentences found by a search function, as lists of
+        (document_id, number) pairs."""
+        pages = []
+        cursor = None
+        while True:
+            search_query, subcorpus_settings, _, _ = preprocess(json.dumps(data))
+            sentences, _, _, next_cursor = perform_search(
+                search_query, subcorpus_settings, PAGE_SIZE, cursor
+            )
+            page = list(
+                sentences.order_by("-document_id", "number").values_list(
+                    "document_id", "number"
+                )
+            )
+            if page:
+                pages.append(page)
+                self.assertEqual(decode_search_cursor(next_cursor), page[-1])
+            if len(page) < PAGE_SIZE:
+                return pages
+            cursor = decode_search_cursor(next_cursor)
+
+    def assert_pages_cross_documents(self, pages, expected):
+        self.assertEqual([sentence for page in pages for sentence in page], expected)
+        self.assertTrue(
+            any(page[0][0] != page[-1][0] for page in pages),
+            "no page spans several documents",
+        )
+
+    def all_results(self, perform_search, preprocess, data):
+        search_query, subcorpus_settings, _, _ = preprocess(json.dumps(data))
+        sentences, _, _, _ = perform_search(search_query, subcorpus_settings, 100)
+        return list(
+            sentences.order_by("-document_id", "number").values_list(
+                "document_id", "number"
+            )
+        )
+
+    def test_exact_search_pages(self):
+        expected = self.all_results(
+            perform_exact_search, preprocess_exact_search, EXACT_SEARCH
+        )
+        self.assertGreater(len(expected), PAGE_SIZE)
+        pages = self.search_pages(
+            perform_exact_search, preprocess_exact_search, EXACT_SEARCH
+        )
+        self.assert_pages_cross_documents(pages, expected)
+
+    def test_lexgram_search_pages(self):
+        for engine in ["sql", "index"]:
+            with self.subTest(engine=engine), override_settings(
+                LEXGRAM_SEARCH_ENGINE=engine
+            ):
+                expected = self.all_results(
+                    perform_lexgram_search, preprocess_lexgram_search, LEXGRAM_SEARCH
+                )
+                self.assertGreater(len(expected), PAGE_SIZE)
+                pages = self.search_pages(
+                    perform_lexgram_search, preprocess_lexgram_search, LEXGRAM_SEARCH
+                )
+                self.assert_pages_cross_documents(pages, expected)
+
+    def test_next_page_view(self):
+        expected = self.all_results(
+            perform_exact_search, preprocess_exact_search, EXACT_SEARCH
+        )
+        response = self.client.post(
+            reverse("exact_search_results"),
+            {
+                **EXACT_SEARCH,
+                "page_size": PAGE_SIZE,
+                "chunk_start": encode_search_cursor(*expected[PAGE_SIZE - 1]),
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(
+            response, "partials/search/search_results_sentences.html"
+        )
+        self.assertEqual(
+            [
+                (sentence.document_id, sentence.number)
+                for sentence in response.context["sentences"]
+            ],
+            expected[PAGE_SIZE : 2 * PAGE_SIZE],
+        )
+
+    def test_malformed_request(self):
+        for url_name, data in [
+            ("exact_search_results", EXACT_SEARCH),
+            ("lexgram_search_results", LEXGRAM_SEARCH),
+        ]:
+            for body in [
+                json.dumps({**data, "chunk_start": "not a cursor"}),
+                json.dumps({**data, "chunk_start": encode_search_cursor(1, 2)[:-2]}),
+                "{not json",
+            ]:
+                with self.subTest(url_name=url_name, body=body):
+                    response = self.client.post(
+                        reverse(url_name), body, content_type="application/json"
+                    )
+                    self.assertEqual(response.status_code, 400)
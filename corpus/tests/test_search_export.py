@@ -0,0 +1,219 @@
+import csv
+import io
+import json
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from corpus.models import Sentence, Token
+from corpus.utils.search_export import CSV_COLUMNS, _find_exact_match
+from corpus.utils.search_utils import encode_search_cursor
+from .utils import annotate, create_corpus
+
+EXACT_SEARCH = {"query": "интересную книгу", "settings": {}}
+LEXGRAM_SEARCH = {
+    "tokens": {
+        "wordform[]": ["", "книга"],
+        "from[]": ["1"],
+        "to[]": ["1"],
+        "lex[]": ["ADJ", ""],
+        "grammar[]": ["", ""],
+        "errors[]": ["", ""],
+    },
+    "settings": {},
+}
+
+
+def get_token_nums(sentence, *words):
+    """Returns the token numbers of the given words of a sentence."""
+    token_nums = dict(
+        Token.objects.filter(sentence=sentence).values_list("token", "token_num")
+    )
+    return [token_nums[word] for word in words]
+
+
+class SearchExportTest(TestCase):
+    """
+    Checks the CSV, JSON Lines and CoNLL-U exports of exact and lexico-grammatical search results.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, documents = create_corpus()
+        cls.first_sentence = documents[0].sentence_set.get(number=0)
+        cls.second_sentence = documents[1].sentence_set.get(number=0)
+        # "интересную" -> "интересная"
+        annotate(cls.first_sentence, cls.user, 12, 22, "Gram", "интересная")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, url_name, data, export_format):
+        response = self.client.post(
+            reverse(url_name),
+            {**data, "format": export_format},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content).decode()
+
+    def export_jsonl(self, url_name, data):
+        content = self.export(url_name, data, "jsonl")
+        return [json.loads(line) for line in content.splitlines()]
+
+    def test_exact_search_jsonl(self):
+        rows = self.export_jsonl("exact_search_export", EXACT_SEARCH)
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row["sentence_id"], self.first_sentence.pk)
+        self.assertEqual(
+            row["matched_token_nums"],
+            get_token_nums(self.first_sentence, "интересную", "книгу"),
+        )
+        self.assertEqual(row["matched_words"], ["интересную", "книгу"])
+        self.assertEqual(row["correction"], "Мама читает интересная книгу.")
+        self.assertEqual(
+            [(a["orig_text"], a["error_tags"]) for a in row["annotations"]],
+            [("интересную", ["Gram"])],
+        )
+
+    def test_lexgram_search_jsonl(self):
+        rows = self.export_jsonl("lexgram_search_export", LEXGRAM_SEARCH)
+        # "интересную книгу", "новые книги", "красивую книгу", "Старая книга"
+        self.assertEqual(len(rows), 4)
+        for row in rows:
+            sentence = Sentence.objects.get(pk=row["sentence_id"])
+            with self.subTest(text=sentence.text):
+                tokens = Token.objects.filter(
+                    sentence=sentence, token_num__in=row["matched_token_nums"]
+                ).order_by("token_num")
+                self.assertEqual(
+                    [(token.pos, token.lemma) for token in tokens],
+                    [("ADJ", tokens[0].lemma), ("NOUN", "книга")],
+                )
+                self.assertEqual(
+                    row["matched_words"], [token.token for token in tokens]
+                )
+        self.assertEqual(
+            [row["document_id"] for row in rows],
+            sorted((row["document_id"] for row in rows), reverse=True),
+        )
+
+    def test_csv(self):
+        content = self.export("exact_search_export", EXACT_SEARCH, "csv")
+        header, *rows = csv.reader(io.StringIO(content))
+        self.assertEqual(header, CSV_COLUMNS)
+        self.assertEqual(len(rows), 1)
+        row = dict(zip(header, rows[0]))
+        self.assertEqual(
+            row["matched_token_nums"],
+            " ".join(
+                map(str, get_token_nums(self.first_sentence, "интересную", "книгу"))
+            ),
+        )
+        self.assertEqual(row["matched_words"], "интересную книгу")
+        self.assertEqual(json.loads(row["annotations"])[0]["replacement"], "интересная")
+
+    def test_conllu(self):
+        content = self.export("lexgram_search_export", LEXGRAM_SEARCH, "conllu")
+        blocks = content.strip("\n").split("\n\n")
+        self.assertEqual(len(blocks), 4)
+        block = next(
+            block
+            for block in blocks
+            if f"# sent_id = {self.first_sentence.pk}" in block.splitlines()
+        )
+        lines = block.splitlines()
+        self.assertIn("# correction = Мама читает интересная книгу.", lines)
+        token_lines = [line.split("\t") for line in lines if not line.startswith("#")]
+        self.assertEqual(
+            [columns[1] for columns in token_lines],
+            ["Мама", "читает", "интересную", "книгу", "."],
+        )
+        self.assertTrue(all(len(columns) == 10 for columns in token_lines))
+        misc = {columns[1]: columns[9] for columns in token_lines}
+        self.assertEqual(misc["интересную"], "Match=Yes|ErrorTags=Gram")
+        self.assertEqual(misc["книгу"], "Match=Yes|SpaceAfter=No")
+        self.assertEqual(misc["Мама"], "_")
+        matched_nums = get_token_nums(self.first_sentence, "интересную", "книгу")
+        self.assertIn(
+            f"# matched_token_nums = {' '.join(map(str, matched_nums))}", lines
+        )
+
+    def test_form_submission(self):
+        response = self.client.post(
+            reverse("exact_search_export"),
+            {"query": json.dumps({**EXACT_SEARCH, "format": "jsonl"})},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response["Content-Type"], "application/x-ndjson; charset=utf-8"
+        )
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+    def test_malformed_request(self):
+        for body in [
+            "{not json",
+            "[]",
+            json.dumps({**EXACT_SEARCH, "chunk_start": "not a cursor"}),
+            json.dumps({**EXACT_SEARCH, "page_size": "many"}),
+            json.dumps({**EXACT_SEARCH, "format": "xml"}),
+        ]:
+            with self.subTest(body=body):
+                response = self.client.post(
+                    reverse("exact_search_export"),
+                    body,
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse("lexgram_search_export"),
+            {"tokens": {}, "format": "csv"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_is_ignored(self):
+        rows = self.export_jsonl(
+            "exact_search_export",
+            {
+                **EXACT_SEARCH,
+                "chunk_start": encode_search_cursor(self.first_sentence.document_id, 0),
+            },
+        )
+        self.assertEqual(len(rows), 1)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.post(
+            reverse("exact_search_export"),
+            {**EXACT_SEARCH, "format": "csv"},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class FindExactMatchTest(SimpleTestCase):
+    """
+    Checks the matched tokens of the exact search results, which are not returned by the full-text search.
+    """
+
+    def make_tokens(self, *words):
+        return [
+            Token(token=word, token_num=num, pos="PUNCT" if word in ",." else "NOUN")
+            for num, word in enumerate(words)
+        ]
+
+    def test_find_exact_match(self):
+        tokens = self.make_tokens("Мама", ",", "мыла", "раму", "мама", "мыла", ".")
+        for forms, expected in [
+            (["мама"], [0]),
+            (["Мыла", "РАМУ"], [2, 3]),
+            # punctuation between the words is skipped
+            (["мама", "мыла"], [0, 2]),
+            (["раму", "мама", "мыла"], [3, 4, 5]),
+            (["рама"], []),
+            (["мыла", "мама"], []),
+        ]:
+            with self.subTest(forms=forms):
+                self.assertEqual(_find_exact_match(tokens, forms), expected)
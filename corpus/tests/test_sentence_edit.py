@@ -0,0 +1,164 @@
+from unittest import mock
+
+from django.test import TestCase, override_settings
+
+from corpus.models import (
+    Annotation,
+    CorpusStats,
+    Sentence,
+    Token,
+    TokenErrorTag,
+    TokenIndexChange,
+)
+from corpus.utils import token_index
+from corpus.utils.correction_utils import fill_corrections
+from .utils import CORPUS_TEXTS, annotate, create_corpus
+
+
+@override_settings(
+    ASYNC_DOCUMENT_PROCESSING=False, INCREMENTAL_DOCUMENT_PROCESSING=True
+)
+class SentenceEditTest(TestCase):
+    """
+    Checks that editing one sentence of a document re-analyzes only that sentence: the other sentences keep their
+    tokens, annotations, error tags and cached corrections, and the token index reloads the document once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, _, (cls.document,) = create_corpus(CORPUS_TEXTS[:1])
+        sentences = list(cls.document.sentence_set.order_by("number"))
+        # "интересную" -> "интересная", "большом" -> "большой", "новые" -> "новых"
+        for sentence, start, end, replacement in [
+            (sentences[0], 12, 22, "интересная"),
+            (sentences[1], 15, 22, "большой"),
+            (sentences[2], 12, 17, "новых"),
+        ]:
+            annotate(sentence, cls.user, start, end, "Gram", replacement)
+        fill_corrections(sentences)
+
+    def setUp(self):
+        # the token index of the process may hold the documents of other tests
+        for name, value in [("_INDEX", None), ("_CHECKED_ON", None)]:
+            patcher = mock.patch.object(token_index, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_state(self):
+        """Returns the sentences of the document by number, with their tokens,
+        annotations and error tags."""
+        return {
+            sentence.number: {
+                "sentence": sentence,
+                "tokens": list(
+                    Token.objects.filter(sentence=sentence)
+                    .order_by("token_num")
+                    .values_list("pk", "token", "start", "end")
+                ),
+                "annotations": list(
+                    Annotation.objects.filter(sentence=sentence).values_list(
+                        "pk", flat=True
+                    )
+                ),
+                "error_tags": sorted(
+                    TokenErrorTag.objects.filter(sentence=sentence).values_list(
+                        "token_id", "error_tag"
+                    )
+                ),
+            }
+            for sentence in Sentence.objects.filter(document=self.document)
+        }
+
+    def get_generation(self):
+        return CorpusStats.objects.values_list("generation", flat=True).get()
+
+    def get_index_token_ids(self, index):
+        return set(index.token_ids[index.document_ids == self.document.pk].tolist())
+
+    def edit(self):
+        # the middle sentence becomes one character shorter
+        self.document.body = self.document.body.replace("большом", "старом")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.document.save()
+
+    def test_unchanged_sentences_are_kept(self):
+        before = self.get_state()
+        generation = self.get_generation()
+        self.edit()
+        after = self.get_state()
+
+        self.assertEqual(self.document.retagged_sentences, 1)
+        self.assertEqual(
+            [after[number]["sentence"].text for number in range(3)],
+            [
+                "Мама читает интересную книгу.",
+                "Книга лежит на старом столе.",
+                "Дети читали новые книги.",
+            ],
+        )
+        # the first sentence is unchanged, the last one is shifted by one character
+        for number, shift in [(0, 0), (2, -1)]:
+            with self.subTest(number=number):
+                old, new = before[number], after[number]
+                self.assertEqual(new["sentence"].pk, old["sentence"].pk)
+                self.assertEqual(new["sentence"].start, old["sentence"].start + shift)
+                self.assertEqual(
+                    new["tokens"],
+                    [
+                        (pk, token, start + shift, end + shift)
+                        for pk, token, start, end in old["tokens"]
+                    ],
+                )
+                self.assertEqual(new["annotations"], old["annotations"])
+                self.assertEqual(new["error_tags"], old["error_tags"])
+                self.assertTrue(new["error_tags"])
+                self.assertEqual(
+                    new["sentence"].cached_correction,
+                    old["sentence"].cached_correction,
+                )
+
+        old, new = before[1], after[1]
+        self.assertNotEqual(new["sentence"].pk, old["sentence"].pk)
+        self.assertFalse(
+            {pk for pk, *_ in new["tokens"]} & {pk for pk, *_ in old["tokens"]}
+        )
+        self.assertEqual(
+            [token for _, token, _, _ in new["tokens"]],
+            ["Книга", "лежит", "на", "старом", "столе", "."],
+        )
+        self.assertEqual(new["annotations"], [])
+        self.assertEqual(new["error_tags"], [])
+        self.assertFalse(Annotation.objects.filter(pk__in=old["annotations"]).exists())
+        self.assertIsNone(new["sentence"].cached_correction)
+        self.assertEqual(
+            new["sentence"].get_correction(), "Книга лежит на старом столе."
+        )
+        # the cached search results are invalidated once
+        self.assertEqual(self.get_generation(), generation + 1)
+
+    def test_token_index_reloads_document(self):
+        index = token_index.get_token_index()
+        self.assertEqual(len(index.lemma_postings("большой")), 1)
+        changes = TokenIndexChange.objects.filter(document_id=self.document.pk).count()
+
+        self.edit()
+        # the document is logged once, for the deleted and the new tokens
+        self.assertEqual(
+            TokenIndexChange.objects.filter(document_id=self.document.pk).count(),
+            changes + 1,
+        )
+        new_index = token_index.get_token_index()
+        self.assertIsNot(new_index, index)
+        self.assertGreaterEqual(new_index.watermark, index.watermark)
+        self.assertEqual(len(new_index.lemma_postings("большой")), 0)
+        self.assertEqual(len(new_index.lemma_postings("старый")), 1)
+        self.assertEqual(
+            self.get_index_token_ids(new_index),
+            set(
+                Token.objects.filter(document=self.document)
+                .exclude(pos__in=["PUNCT", "SYM"])
+                .values_list("pk", flat=True)
+            ),
+        )
+        # the published index is not modified
+        self.assertEqual(len(index.lemma_postings("большой")), 1)
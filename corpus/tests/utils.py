@@ -0,0 +1,87 @@
+"""Fixtures shared by the tests of the corpus app.
+
+The documents are created with ``Document.objects.create``, so their bodies are analyzed
+by the NLP pipeline like the documents added on the site.
+"""
+
+from corpus.models import Annotation, Author, Document, User
+
+# sentences of the test corpus, one document per string
+CORPUS_TEXTS = [
+    "Мама читает интересную книгу. Книга лежит на большом столе. "
+    "Дети читали новые книги.",
+    "Я купил красивую книгу вчера. Брат не читает книги. "
+    "Старая книга стоит на полке.",
+    "Вчера мы гуляли в большом парке. Он пишет длинное письмо. "
+    "Письма лежат на столе.",
+    "Она читала письмо брата. Красивый стол стоит у окна. "
+    "Мы читаем книги каждый день.",
+]
+
+
+def create_corpus(texts=None):
+    """Creates a user, an author and a document for each text.
+
+    Args:
+        texts: List of document bodies, defaults to CORPUS_TEXTS.
+
+    Returns:
+        Tuple of the User object, the Author object and the list of Document objects.
+    """
+    user = User.objects.create_user(username="annotator", password="password")
+    author = Author.objects.create(
+        name="Author", gender=Author.GenderChoices.F, program="Program"
+    )
+    documents = [
+        Document.objects.create(
+            title=f"Document {number}",
+            user=user,
+            author=author,
+            date=2023,
+            body=text,
+        )
+        for number, text in enumerate(texts or CORPUS_TEXTS)
+    ]
+    return user, author, documents
+
+
+def annotate(sentence, user, start, end, tag="Ortho", replacement=None, alt=False):
+    """Creates an annotation of a span of a sentence.
+
+    Args:
+        sentence: Sentence object.
+        user: User object.
+        start: Start offset of the span in the sentence.
+        end: End offset of the span in the sentence.
+        tag: The error tag.
+        replacement: The text replacing the span, or None for a highlighting.
+        alt: Whether the annotation is an alternative one.
+
+    Returns:
+        Annotation object.
+    """
+    guid = f"#{sentence.pk}-{start}-{end}-{alt}"
+    body = [{"type": "TextualBody", "value": tag, "purpose": "tagging"}]
+    if replacement is None:
+        body.append({"type": "TextualBody", "value": "1", "purpose": "highlighting"})
+    else:
+        body.append(
+            {"type": "TextualBody", "value": replacement, "purpose": "commenting"}
+        )
+    return Annotation.objects.create(
+        sentence=sentence,
+        document=sentence.document,
+        user=user,
+        guid=guid,
+        alt=alt,
+        json={
+            "id": guid,
+            "body": body,
+            "target": {
+                "selector": [
+                    {"type": "TextQuoteSelector", "exact": sentence.text[start:end]},
+                    {"type": "TextPositionSelector", "start": start, "end": end},
+                ]
+            },
+        },
+    )
@@ -44,5 +44,15 @@ urlpatterns = [
         views.exact_search_results,
         name="exact_search_results",
     ),
+    path(
+        "lexgram_search_export/",
+        views.lexgram_search_export,
+        name="lexgram_search_export",
+    ),
+    path(
+        "exact_search_export/",
+        views.exact_search_export,
+        name="exact_search_export",
+    ),
     path("subcorpus_form/", views.subcorpus_form, name="subcorpus_form"),
 ]
@@ -0,0 +1,121 @@
+"""Utility functions for serving the synchronous code of the views under ASGI.
+
+The async views wait for the semaphores limiting the searches and exports in the event
+loop, and run the searches themselves as synchronous code in the thread of the request
+with ``sync_to_async``. The searches are not written with the async ORM: they run raw
+SQL (``lexgram_sql``, the server-side cursors of the exports), for which Django has no
+async API, and the NumPy token index, and every async ORM call of Django 5.0 is run with
+``sync_to_async`` in the same thread anyway. Running a whole search in one call keeps its
+queries on one connection without a thread switch per query, and the event loop stays
+free to serve the annotation requests meanwhile.
+
+Under ASGI Django reads a synchronous iterator of a ``StreamingHttpResponse`` to the
+end before sending anything, so the streaming views wrap their iterators in
+``aiterate``, which computes the items one by one in a thread while the event loop
+sends the previous ones. Under WSGI it is the other way round, so the views pass their
+iterators through ``streaming_iterator``, which only wraps them under ASGI.
+"""
+
+import asyncio
+import weakref
+from collections.abc import AsyncIterator, Callable, Iterable
+from concurrent.futures import Executor
+from contextlib import nullcontext
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpRequest
+
+_END = object()
+
+
+def get_loop_semaphore(
+    semaphores: weakref.WeakKeyDictionary, value: int
+) -> asyncio.Semaphore:
+    """Returns the semaphore of the running event loop, creating it on first use.
+
+    An ``asyncio.Semaphore`` can only be used in one event loop. Under ASGI the process
+    runs a single loop, so the semaphore limits all its requests, while under WSGI
+    ``async_to_sync`` runs every request in a new loop, which gets its own semaphore
+    (the concurrency is then limited by the server threads).
+
+    Args:
+        semaphores: The semaphores by event loop, kept by the caller.
+        value: The initial value of a new semaphore.
+
+    Returns:
+        asyncio.Semaphore: The semaphore of the running event loop.
+    """
+
+    loop = asyncio.get_running_loop()
+    semaphore = semaphores.get(loop)
+    if semaphore is None:
+        semaphore = semaphores[loop] = asyncio.Semaphore(value)
+    return semaphore
+
+
+async def aiterate(
+    iterable: Iterable,
+    executor: Executor | None = None,
+    get_semaphore: Callable[[], asyncio.Semaphore] | None = None,
+) -> AsyncIterator:
+    """Yields the items of a synchronous iterable, computing each one in a thread.
+
+    By default the items are computed in the thread of the request, like the code of a
+    synchronous view, so iterators reading the database (e.g. with a server-side cursor)
+    keep using the connection of the request. The iterator is closed in the same thread
+    if the response is not read to the end.
+
+    Args:
+        iterable: The synchronous iterable, e.g. a generator.
+        executor: The executor to compute the items in instead, for iterators that do
+            not use the database (see ``rlc_new.nlp.get_executor``).
+        get_semaphore: The function returning the semaphore held while the items are
+            computed, e.g. to limit the number of responses streamed at a time. It is
+            called in the event loop reading the response.
+
+    Yields:
+        The items of the iterable.
+    """
+
+    def in_thread(func):
+        if executor is None:
+            return sync_to_async(func)
+        return sync_to_async(func, thread_sensitive=False, executor=executor)
+
+    iterator = iter(iterable)
+    async with get_semaphore() if get_semaphore else nullcontext():
+        try:
+            while (item := await in_thread(next)(iterator, _END)) is not _END:
+                yield item
+        finally:
+            if hasattr(iterator, "close"):
+                await in_thread(iterator.close)()
+
+
+def streaming_iterator(
+    request: HttpRequest,
+    iterable: Iterable,
+    executor: Executor | None = None,
+    get_semaphore: Callable[[], asyncio.Semaphore] | None = None,
+) -> Iterable | AsyncIterator:
+    """Returns the iterator to stream in a ``StreamingHttpResponse`` to a request.
+
+    Under ASGI the items are computed by ``aiterate`` while the previous ones are sent.
+    Under WSGI the synchronous iterable is returned as is, as Django would read an
+    asynchronous iterator to the end before sending anything.
+
+    Args:
+        request: The HTTP request object.
+        iterable: The synchronous iterable, e.g. a generator.
+        executor: See ``aiterate``.
+        get_semaphore: See ``aiterate``, not used under WSGI, where every request runs
+            in its own server thread.
+
+    Returns:
+        The iterator to stream.
+    """
+
+    if isinstance(request, ASGIRequest):
+        return aiterate(iterable, executor=executor, get_semaphore=get_semaphore)
+    return iterable
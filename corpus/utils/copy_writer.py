@@ -0,0 +1,142 @@
+"""COPY-based writer for Sentence and Token objects.
+
+Large documents and bulk imports spend most of the saving time parsing multi-row
+INSERT statements. This module writes the rows with PostgreSQL binary
+``COPY ... FROM STDIN`` instead:
+
+- primary keys of the new sentences and tokens are reserved from their sequences in a
+  single query each, so the Token rows can reference their sentences and the objects
+  have primary keys after saving, as with ``bulk_create``;
+- sentences are copied to a temporary staging table and moved to the sentence table
+  with a single ``INSERT ... SELECT`` that also computes the search vector;
+- tokens are copied to the token table directly.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+import re
+
+from django.apps import apps
+from django.db import connection, transaction
+
+_RE_TYPE_MODIFIER = re.compile(r"\(\d+\)")
+
+
+def copy_sentences_and_tokens(sentences_bulk, tokens_bulk):
+    """Saves Sentence and Token objects with COPY and creates sentence search vectors.
+
+    The search vectors are the same as the ones created by ``_save_sentences_and_tokens``
+    in ``document_utils``.
+
+    Args:
+        sentences_bulk: List of unsaved Sentence objects.
+        tokens_bulk: List of unsaved Token objects referencing the sentences.
+    """
+    Sentence = apps.get_model("corpus", "Sentence")
+    Token = apps.get_model("corpus", "Token")
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        _reserve_primary_keys(cursor, Sentence, sentences_bulk)
+        _reserve_primary_keys(cursor, Token, tokens_bulk)
+        _set_foreign_keys(Sentence, sentences_bulk)
+        _set_foreign_keys(Token, tokens_bulk)
+
+        sentence_fields = [
+            field
+            for field in Sentence._meta.concrete_fields
+            if field.name != "search_vector"
+        ]
+        sentence_columns = ", ".join(
+            connection.ops.quote_name(field.column) for field in sentence_fields
+        )
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE sentence_staging AS SELECT {sentence_columns} "
+            f"FROM {Sentence._meta.db_table} WITH NO DATA"
+        )
+        _copy_rows(cursor, "sentence_staging", sentence_fields, sentences_bulk)
+        cursor.execute(
+            f"INSERT INTO {Sentence._meta.db_table} ({sentence_columns}, search_vector) "
+            f"SELECT {sentence_columns}, "
+            f"setweight(to_tsvector('simple', array_to_string(words, ' ')), 'A') "
+            f"FROM sentence_staging"
+        )
+        cursor.execute("DROP TABLE sentence_staging")
+
+        _copy_rows(
+            cursor, Token._meta.db_table, Token._meta.concrete_fields, tokens_bulk
+        )
+
+
+def _reserve_primary_keys(cursor, model, objects):
+    """Reserves primary keys from the model table sequence and assigns them to objects.
+
+    Args:
+        cursor: Database cursor.
+        model: Model class.
+        objects: List of unsaved model objects.
+    """
+    if not objects:
+        return
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)",
+        [model._meta.db_table, model._meta.pk.column, len(objects)],
+    )
+    for obj, (pk,) in zip(objects, cursor.fetchall()):
+        obj.pk = pk
+        obj._state.adding = False
+
+
+def _set_foreign_keys(model, objects):
+    """Sets the foreign keys of objects created with related objects that were unsaved
+    at the time, as ``bulk_create`` does.
+
+    Args:
+        model: Model class.
+        objects: List of model objects.
+
+    Raises:
+        ValueError: If a related object is still unsaved.
+    """
+    foreign_keys = [field for field in model._meta.concrete_fields if field.many_to_one]
+    for obj in objects:
+        for field in foreign_keys:
+            if getattr(obj, field.attname) is not None:
+                continue
+            # the descriptor returns the cached object without a query, as the key is
+            # not set
+            related = getattr(obj, field.name)
+            if related is None:
+                continue
+            if related.pk is None:
+                raise ValueError(
+                    f"Cannot copy {model.__name__} objects with an unsaved related "
+                    f"object '{field.name}'"
+                )
+            setattr(obj, field.attname, related.pk)
+
+
+def _copy_rows(cursor, table, fields, objects):
+    """Writes model objects to a table with binary COPY.
+
+    Args:
+        cursor: Database cursor.
+        table: Name of the table.
+        fields: List of model fields to write.
+        objects: List of model objects.
+    """
+    columns = ", ".join(connection.ops.quote_name(field.column) for field in fields)
+    with cursor.copy(
+        f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT BINARY)"
+    ) as copy:
+        # binary COPY needs exact types, e.g. varchar[] and not text[] for arrays
+        copy.set_types(
+            [_RE_TYPE_MODIFIER.sub("", field.db_type(connection)) for field in fields]
+        )
+        for obj in objects:
+            # e.g. JSON values have to be wrapped in an adapter
+            copy.write_row(
+                [
+                    field.get_db_prep_value(getattr(obj, field.attname), connection)
+                    for field in fields
+                ]
+            )
@@ -0,0 +1,148 @@
+"""Utility functions for computing the corrected texts of sentences from their annotations.
+
+The corrected and alternative corrected texts of a sentence are cached in the sentence
+(``Sentence.cached_correction`` and ``Sentence.cached_alt_correction``). They are
+computed for many sentences at once from the normalized ``start``, ``end`` and
+``replacement`` columns of their annotations, and reset when an annotation of the
+sentence is saved or deleted. The reset also increments the correction generation of
+the sentence, so that corrections computed from annotations read before the change are
+not saved over it.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+from collections import defaultdict
+
+from django.apps import apps
+from django.db.models import Case, F, FilteredRelation, Q, TextField, Value, When
+
+
+def apply_corrections(text, corrections):
+    """Returns a text with corrections applied.
+
+    The corrections are applied from the last one by start, so that the offsets of the
+    others stay valid. If they do not overlap, the corrected text is joined from the
+    pieces of the text in one pass.
+
+    Args:
+        text: The text to correct.
+        corrections: List of tuples of the start and end offsets of a span of the text
+            and its replacement.
+
+    Returns:
+        The corrected text.
+    """
+    if not corrections:
+        return text
+    corrections = sorted(
+        corrections, key=lambda correction: correction[0], reverse=True
+    )
+
+    position = len(text)
+    disjoint = True
+    for start, end, _ in corrections:
+        disjoint = disjoint and 0 <= start <= end <= position
+        position = start
+    if not disjoint:
+        for start, end, replacement in corrections:
+            text = text[:start] + replacement + text[end:]
+        return text
+
+    pieces = []
+    position = len(text)
+    for start, end, replacement in corrections:
+        pieces.append(text[end:position])
+        pieces.append(replacement)
+        position = start
+    pieces.append(text[:position])
+    return "".join(reversed(pieces))
+
+
+def fill_corrections(sentences):
+    """Fills the cached corrected texts of sentences, computing the missing ones at once.
+
+    The correction generations and the annotations of the sentences without cached
+    corrections are read in a single query, and the computed corrections are saved in a
+    single update, only for the sentences whose generation has not changed since.
+
+    Args:
+        sentences: List of Sentence objects with the text and the cached corrections
+            loaded.
+    """
+    Sentence = apps.get_model("corpus", "Sentence")
+
+    missing = [
+        sentence
+        for sentence in sentences
+        if sentence.cached_correction is None or sentence.cached_alt_correction is None
+    ]
+    if not missing:
+        return
+
+    # the correction generations, and the corrections and the alternative corrections
+    # by sentence id
+    generations = {}
+    corrections = defaultdict(lambda: ([], []))
+    for sentence_id, generation, alt, start, end, replacement in (
+        Sentence.objects.filter(pk__in=[sentence.id for sentence in missing])
+        .annotate(
+            corrections=FilteredRelation(
+                "annotation", condition=Q(annotation__replacement__isnull=False)
+            )
+        )
+        .order_by("pk", "corrections__pk")
+        .values_list(
+            "pk",
+            "correction_generation",
+            "corrections__alt",
+            "corrections__start",
+            "corrections__end",
+            "corrections__replacement",
+        )
+    ):
+        generations[sentence_id] = generation
+        if replacement is not None:
+            corrections[sentence_id][alt].append((start, end, replacement))
+
+    for sentence in missing:
+        sentence_corrections, alt_corrections = corrections[sentence.id]
+        sentence.cached_correction = apply_corrections(
+            sentence.text, sentence_corrections
+        )
+        sentence.cached_alt_correction = apply_corrections(
+            sentence.text, alt_corrections
+        )
+
+    for batch_start in range(0, len(missing), 1000):
+        batch = missing[batch_start : batch_start + 1000]
+        Sentence.objects.filter(pk__in=[sentence.id for sentence in batch]).update(
+            **{
+                field: Case(
+                    *[
+                        When(
+                            pk=sentence.id,
+                            correction_generation=generations.get(sentence.id),
+                            then=Value(getattr(sentence, field)),
+                        )
+                        for sentence in batch
+                    ],
+                    default=F(field),
+                    output_field=TextField(),
+                )
+                for field in ["cached_correction", "cached_alt_correction"]
+            }
+        )
+
+
+def invalidate_corrections(sentence_ids):
+    """Resets the cached corrected texts of sentences whose annotations changed.
+
+    Args:
+        sentence_ids: List of sentence ids.
+    """
+    Sentence = apps.get_model("corpus", "Sentence")
+    Sentence.objects.filter(pk__in=sentence_ids).update(
+        cached_correction=None,
+        cached_alt_correction=None,
+        correction_generation=F("correction_generation") + 1,
+    )
@@ -4,23 +4,48 @@ Type hints are ommited in this module because Django models are not available at
 """
 
 import re
+from datetime import timedelta
+from difflib import SequenceMatcher
+from functools import lru_cache
 
 from django.apps import apps
+from django.conf import settings
 from django.contrib.postgres.search import SearchVector
-from django.db.models import Func, F
+from django.db import transaction
+from django.db.models import Count, Func, F
 from django.db.models.signals import post_save
+from django.utils import timezone
 
-from natasha import Segmenter, Doc, MorphVocab, NewsEmbedding, NewsMorphTagger
+from rlc_new import nlp
+
+from .copy_writer import copy_sentences_and_tokens
+from .stats_utils import update_document_stats
+from .token_index import log_token_changes
 
 # compiled regex constants
 _RE_COMBINE_WHITESPACE = re.compile(r"\s+")
 _RE_SPAN_PATTERN = re.compile(r"<span>.*?</span>")
 
-# Natasha constants
-_SEGMENTER = Segmenter()
-_MORPH_VOCAB = MorphVocab()
-_EMB = NewsEmbedding()
-_MORPH_TAGGER = NewsMorphTagger(_EMB)
+# Universal Dependencies features stored in Token fields, in the CoNLL-U order
+_UD_FEATURES = {
+    "Animacy": "animacy",
+    "Aspect": "aspect",
+    "Case": "case",
+    "Degree": "degree",
+    "Foreign": "foreign",
+    "Gender": "gender",
+    "Hyph": "hyph",
+    "Mood": "mood",
+    "Number": "number",
+    "Person": "person",
+    "Polarity": "polarity",
+    "Tense": "tense",
+    "Variant": "variant",
+    "VerbForm": "verbform",
+    "Voice": "voice",
+}
+# digits of the packed token feature codes
+_FEATURE_CODE_DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
 
 
 def send_post_save_signal(document):
@@ -39,16 +64,190 @@ def send_post_save_signal(document):
 def process_body_changes(document):
     """Processes a document body change and saves the document.
 
-    This function is called when a document is saved with a different body. The
-    document is re-analyzed with the Natasha library, and the new sentences and tokens
-    are saved to the database. The old sentences and tokens are deleted, together with
-    any annotations that were created in the document.
+    This function is called when a document is saved with a different body. If the
+    document already has sentences and INCREMENTAL_DOCUMENT_PROCESSING is enabled,
+    only the changed sentences are re-analyzed (see ``_process_changed_sentences``).
+    Otherwise, the document is re-analyzed with the Natasha library, and the new
+    sentences and tokens are saved to the database. The old sentences and tokens are
+    deleted, together with any annotations that were created in the document.
 
     Args:
         document: Document object.
+
+    Returns:
+        The number of re-analyzed sentences.
     """
+    if settings.INCREMENTAL_DOCUMENT_PROCESSING and document.sentence_set.exists():
+        return _process_changed_sentences(document)
     _delete_related_objects(document)
-    _process_and_save_document(document)
+    return _process_and_save_document(document)
+
+
+def enqueue_body_changes(document):
+    """Queues the processing of a document body change.
+
+    The document is processed later by the ``process_documents`` management command
+    (see ``process_next_job``). If the document already has a pending job, no new job
+    is created, as the pending job will process the current body.
+
+    Args:
+        document: Document object.
+
+    Returns:
+        The pending DocumentProcessingJob object.
+    """
+    Document = apps.get_model("corpus", "Document")
+    DocumentProcessingJob = apps.get_model("corpus", "DocumentProcessingJob")
+    job, _ = DocumentProcessingJob.objects.get_or_create(
+        document=document, status=Document.ProcessingStatusChoices.PENDING
+    )
+    return job
+
+
+def process_next_job():
+    """Processes the oldest pending document processing job.
+
+    The job is claimed with ``SELECT ... FOR UPDATE SKIP LOCKED``, so several workers
+    can process the queue concurrently. The document is processed in a separate
+    transaction, and the job and document processing statuses are updated according
+    to the result.
+
+    The job stays locked while its document is processed. A job left processing by a
+    crashed worker is not locked, and is claimed again once it started more than
+    DOCUMENT_PROCESSING_TIMEOUT seconds ago (see ``_get_stale_jobs``). A job started
+    DOCUMENT_PROCESSING_MAX_ATTEMPTS times is marked as failed instead.
+
+    Returns:
+        The processed DocumentProcessingJob object or None if the queue is empty.
+    """
+    Document = apps.get_model("corpus", "Document")
+    DocumentProcessingJob = apps.get_model("corpus", "DocumentProcessingJob")
+    statuses = Document.ProcessingStatusChoices
+
+    with transaction.atomic():
+        jobs = DocumentProcessingJob.objects.select_for_update(skip_locked=True)
+        job = (
+            (jobs.filter(status=statuses.PENDING) | _get_stale_jobs(jobs))
+            .order_by("created_on", "id")
+            .first()
+        )
+        if job is None:
+            return None
+        if job.attempts >= settings.DOCUMENT_PROCESSING_MAX_ATTEMPTS:
+            _finish_job(job, statuses.FAILED, _abandoned_error(job))
+            _update_processing_status(job)
+            return job
+        job.status = statuses.PROCESSING
+        job.started_on = timezone.now()
+        job.attempts += 1
+        job.save(update_fields=["status", "started_on", "attempts"])
+        Document.objects.filter(pk=job.document_id).update(
+            processing_status=statuses.PROCESSING
+        )
+
+    try:
+        with transaction.atomic():
+            DocumentProcessingJob.objects.select_for_update().get(pk=job.pk)
+            document = Document.objects.select_for_update().get(pk=job.document_id)
+            job.retagged_sentences = process_body_changes(document)
+            # finished before the job is unlocked, so it is not claimed again
+            _finish_job(job, statuses.DONE)
+    except Exception as e:
+        _finish_job(job, statuses.FAILED, repr(e))
+
+    _update_processing_status(job)
+    return job
+
+
+def reclaim_stale_jobs():
+    """Returns the jobs left processing by crashed workers to the queue, or marks them
+    as failed if they were started DOCUMENT_PROCESSING_MAX_ATTEMPTS times.
+
+    Called when a worker starts, the stale jobs are otherwise claimed by
+    ``process_next_job``.
+
+    Returns:
+        The number of reclaimed jobs.
+    """
+    Document = apps.get_model("corpus", "Document")
+    DocumentProcessingJob = apps.get_model("corpus", "DocumentProcessingJob")
+    statuses = Document.ProcessingStatusChoices
+
+    with transaction.atomic():
+        jobs = list(
+            _get_stale_jobs(
+                DocumentProcessingJob.objects.select_for_update(skip_locked=True)
+            )
+        )
+        for job in jobs:
+            if job.attempts >= settings.DOCUMENT_PROCESSING_MAX_ATTEMPTS:
+                _finish_job(job, statuses.FAILED, _abandoned_error(job))
+            else:
+                job.status = statuses.PENDING
+                job.save(update_fields=["status"])
+            _update_processing_status(job)
+    return len(jobs)
+
+
+def _get_stale_jobs(jobs):
+    """Filters the jobs processing for more than DOCUMENT_PROCESSING_TIMEOUT seconds.
+
+    Args:
+        jobs: DocumentProcessingJob queryset, locked with ``skip_locked``, so the jobs
+            of the live workers are left out.
+
+    Returns:
+        The filtered queryset.
+    """
+    Document = apps.get_model("corpus", "Document")
+    return jobs.filter(
+        status=Document.ProcessingStatusChoices.PROCESSING,
+        started_on__lt=timezone.now()
+        - timedelta(seconds=settings.DOCUMENT_PROCESSING_TIMEOUT),
+    )
+
+
+def _abandoned_error(job):
+    return f"Abandoned by the workers after {job.attempts} attempts"
+
+
+def _finish_job(job, status, error=""):
+    """Saves the result of a job.
+
+    Args:
+        job: DocumentProcessingJob object.
+        status: The final status.
+        error: The error message if the job failed.
+    """
+    DocumentProcessingJob = apps.get_model("corpus", "DocumentProcessingJob")
+
+    job.status = status
+    job.error = error
+    job.finished_on = timezone.now()
+    # the job is deleted together with the document if the document was deleted
+    DocumentProcessingJob.objects.filter(pk=job.pk).update(
+        status=job.status,
+        error=job.error,
+        finished_on=job.finished_on,
+        retagged_sentences=job.retagged_sentences,
+    )
+
+
+def _update_processing_status(job):
+    """Sets the processing status of the document of a job to the status of the job,
+    unless a newer job was queued while the document was processed.
+
+    Args:
+        job: DocumentProcessingJob object.
+    """
+    Document = apps.get_model("corpus", "Document")
+    DocumentProcessingJob = apps.get_model("corpus", "DocumentProcessingJob")
+    statuses = Document.ProcessingStatusChoices
+
+    if not DocumentProcessingJob.objects.filter(
+        document_id=job.document_id, status=statuses.PENDING
+    ).exists():
+        Document.objects.filter(pk=job.document_id).update(processing_status=job.status)
 
 
 def _delete_related_objects(document):
@@ -60,6 +259,7 @@ def _delete_related_objects(document):
     document.sentence_set.all().delete()
     document.token_set.all().delete()
     document.annotation_set.all().delete()
+    log_token_changes([document.pk])
 
 
 def _process_and_save_document(document):
@@ -70,116 +270,247 @@ def _process_and_save_document(document):
 
     Args:
         document: Document object.
+
+    Returns:
+        The number of analyzed sentences.
     """
+    sentences_bulk, tokens_bulk = analyze_document(document)
+
+    _save_sentences_and_tokens(sentences_bulk, tokens_bulk)
+    update_document_stats(document, len(sentences_bulk), len(tokens_bulk))
+    return len(sentences_bulk)
+
+
+def _process_changed_sentences(document):
+    """Re-analyzes only the sentences of a document that were changed.
+
+    The new body is segmented, and the texts of the new sentences are matched against
+    the saved ones with ``difflib.SequenceMatcher``. A saved sentence is kept if its
+    text and number of tokens are unchanged: its number and the offsets of the
+    sentence and its tokens are shifted in place, and its annotations are kept, as
+    annotation offsets are relative to the sentence. The other saved sentences are
+    deleted together with their tokens and annotations, and only the new sentences are
+    morphologically tagged and saved.
+
+    Tagging a subset of the sentences gives the same result as tagging the whole
+    document, because the Natasha morphology tagger processes each sentence
+    independently.
+
+    Args:
+        document: Document object.
+
+    Returns:
+        The number of re-analyzed sentences.
+    """
+    from natasha import Doc
+
+    Sentence = apps.get_model("corpus", "Sentence")
+    Token = apps.get_model("corpus", "Token")
+
     document.body = _RE_COMBINE_WHITESPACE.sub(" ", document.body).strip()
     natasha_doc = Doc(document.body)
-    natasha_doc.segment(_SEGMENTER)
-    natasha_doc.tag_morph(_MORPH_TAGGER)
-    for token in natasha_doc.tokens:
-        token.lemmatize(_MORPH_VOCAB)
+    natasha_doc.segment(nlp.get_segmenter())
+    new_sents = natasha_doc.sents
+
+    old_sentences = list(
+        document.sentence_set.order_by("number")
+        .only("id", "text", "start")
+        .annotate(token_count=Count("tokens"))
+    )
+    matcher = SequenceMatcher(
+        None,
+        [(s.text, s.token_count) for s in old_sentences],
+        [(s.text, len(s.tokens)) for s in new_sents],
+        autojunk=False,
+    )
+
+    # saved sentences grouped by the shifts of their numbers and offsets
+    kept_sentences = {}
+    changed_nums = set(range(len(new_sents)))
+    for tag, i1, i2, j1, _ in matcher.get_opcodes():
+        if tag != "equal":
+            continue
+        for old_num, old_sentence in enumerate(old_sentences[i1:i2], i1):
+            new_num = j1 + old_num - i1
+            shift = new_sents[new_num].start - old_sentence.start
+            kept_sentences.setdefault((new_num - old_num, shift), []).append(
+                old_sentence.pk
+            )
+            changed_nums.discard(new_num)
+
+    kept_pks = {pk for pks in kept_sentences.values() for pk in pks}
+    document.sentence_set.exclude(pk__in=kept_pks).delete()
+    # sentence numbers are shifted in place, the delete above removed any collisions
+    for (num_shift, shift), pks in kept_sentences.items():
+        if num_shift == 0 and shift == 0:
+            continue
+        Sentence.objects.filter(pk__in=pks).update(
+            number=F("number") + num_shift,
+            start=F("start") + shift,
+            end=F("end") + shift,
+        )
+        Token.objects.filter(sentence_id__in=pks).update(
+            sentence_num=F("sentence_num") + num_shift,
+            start=F("start") + shift,
+            end=F("end") + shift,
+        )
+
+    changed_sents = [new_sents[num] for num in sorted(changed_nums)]
+    natasha_doc.sents = changed_sents
+    natasha_doc.tag_morph(nlp.get_morph_tagger())
+    natasha_doc.sents = new_sents
+    morph_vocab = nlp.get_morph_vocab()
+    for natasha_sent in changed_sents:
+        for token in natasha_sent.tokens:
+            token.lemmatize(morph_vocab)
 
     sentences_bulk, tokens_bulk = _make_sentence_and_token_objects(
-        document, natasha_doc
+        document, natasha_doc, changed_nums
     )
+    _save_sentences_and_tokens(sentences_bulk, tokens_bulk, index=False)
 
-    _save_sentences_and_tokens(sentences_bulk, tokens_bulk)
+    # tokens of the kept sentences have new positions, so the whole document is
+    # re-indexed once with the new tokens
+    log_token_changes([document.pk])
+    update_document_stats(
+        document, len(new_sents), sum(len(s.tokens) for s in new_sents)
+    )
+    return len(changed_sents)
+
+
+def analyze_document(document):
+    """Analyzes a document body with the Natasha library.
+
+    The document body is normalized in place, and unsaved Sentence and Token objects are
+    created for it. This function does not access the database, so it can be run in
+    worker processes.
+
+    Args:
+        document: Document object.
+
+    Returns:
+        Tuple of lists of Sentence and Token objects.
+    """
+    from natasha import Doc
 
+    document.body = _RE_COMBINE_WHITESPACE.sub(" ", document.body).strip()
+    natasha_doc = Doc(document.body)
+    natasha_doc.segment(nlp.get_segmenter())
+    natasha_doc.tag_morph(nlp.get_morph_tagger())
+    morph_vocab = nlp.get_morph_vocab()
+    for token in natasha_doc.tokens:
+        token.lemmatize(morph_vocab)
 
-def _make_sentence_and_token_objects(document, natasha_doc):
+    return _make_sentence_and_token_objects(document, natasha_doc)
+
+
+def _make_sentence_and_token_objects(document, natasha_doc, sentence_nums=None):
     """Returns Sentence and Token object instances from a Natasha document.
 
     This function creates Sentence and Token objects from a Natasha document, resolving
-    additional fields such as words, lemmas and HTML markup.
+    additional fields such as words, lemmas and the token data.
 
     Args:
         document: Document object.
         natasha_doc: Natasha Doc object.
+        sentence_nums: Set of the numbers of the sentences to create objects for,
+            defaults to all sentences.
 
     Returns:
         Tuple of lists of Sentence and Token objects.
     """
     sentences_bulk, tokens_bulk = [], []
     for sentence_num, natasha_sent in enumerate(natasha_doc.sents):
-        markup = _prepare_sentence_markup(natasha_sent)
-        sentence_object = _create_sentence_object(
-            document, natasha_sent, sentence_num, markup
-        )
+        if sentence_nums is not None and sentence_num not in sentence_nums:
+            continue
+        sentence_object = _create_sentence_object(document, natasha_sent, sentence_num)
         sentences_bulk.append(sentence_object)
         token_objects, words, lemmas = _create_token_objects_and_extract_words_lemmas(
             document, sentence_object, natasha_sent, sentence_num
         )
         sentence_object.words = words
         sentence_object.lemmas = lemmas
+        sentence_object.token_data = _get_token_data(sentence_object, token_objects)
         tokens_bulk.extend(token_objects)
 
     return sentences_bulk, tokens_bulk
 
 
-def _prepare_sentence_markup(natasha_sent):
-    """Creates HTML markup for a Natasha sentence with token information tooltips.
+def get_token_data_legend():
+    """Returns the POS and feature values used to decode the packed token data.
 
-    This function prepares HTML markup with Bootstrap 5 tooltips for sentence tokens.
-    The tooltips contain the token's lemmatised form, part of speech, and other
-    morphological features defined in the Universal Dependencies standard.
+    Returns:
+        Dictionary with the list of POS values under ``"pos"`` and a list of
+        ``[feature, values]`` pairs under ``"features"``, in the order of the feature
+        codes (see ``_get_token_data``).
+    """
+    Token = apps.get_model("corpus", "Token")
 
-    The markup is currently generated during NLP processing to reduce the amount of
-    database queries when the document is loaded. It is also easier to generate the
-    markup from a Natasha instance, since linguistic features are easily accessible
-    from the Natasha token object using the `feats` attribute. However, this approach
-    is not ideal since it mixes the presentation and business logic and is not flexible.
+    return {
+        "pos": [value for value, _ in Token._meta.get_field("pos").choices],
+        "features": [
+            [feature, [value for value, _ in Token._meta.get_field(field).choices]]
+            for feature, field in _UD_FEATURES.items()
+        ],
+    }
 
-    Args:
-        natasha_sent: Natasha sentence object.
 
-    Returns:
-        HTML markup of the sentence.
-    """
+def _get_token_data(sentence, tokens):
+    """Returns the packed token data of a sentence.
 
-    # TODO: consider moving the markup generation to the frontend
-    # suggested approach: store a JSON object with token information in the Sentence
-    # object and generate the markup in the frontend using JavaScript
-    markup = natasha_sent.text
-    replacements = []
-    offset = 0
-    if hasattr(natasha_sent.tokens[0], "start"):
-        offset = natasha_sent.tokens[0].start
-
-    for token in natasha_sent.tokens:
-        feats_markup = "\n".join(
-            [
-                f"<div class='col-6'><strong>{key}:</strong></div><div class='col-6'>{value}</div>"
-                for key, value in token.feats.items()
-            ]
-        )
+    The token data is a list with a ``[start, end, lemma, pos, feats]`` array for each
+    token, where the offsets are relative to the sentence, ``pos`` is the index of the
+    POS value in the legend returned by ``get_token_data_legend``, and ``feats`` has a
+    base-36 digit for each Universal Dependencies feature: 0 if the feature is not
+    set, or the index of its value in the legend plus one. Trailing zeros are removed,
+    so ``"1"`` is an animate token without other features. Values missing in the
+    legend are stored as is (POS) or omitted (features).
 
-        replacements.append(
-            (
-                getattr(token, "start", 1) - offset,
-                getattr(token, "end", token.start + len(token.text)) - offset,
-                f"""<span data-toggle="tooltip" data-bs-html="true" data-bs-original-title="
-                        <div class='row'>
-                            <div class='col-6'><strong>Lemma:</strong></div>
-                            <div class='col-6'>{token.lemma}</div>
-                        </div>
-                        <div class='row'>
-                            <div class='col-6'><strong>POS:</strong></div>
-                            <div class='col-6'>{token.pos}</div>
-                        </div>
-                        <div class='row'>
-                            {feats_markup}
-                        </div>
-                    ">{token.text}</span>""",
-            )
-        )
+    The frontend renders the token tooltips from it, see ``renderSentenceTokens`` in
+    ``annotator-utils.js``. Migration ``0009_backfill_sentence_token_data`` creates
+    the same data in SQL.
+
+    Args:
+        sentence: Sentence object.
+        tokens: List of the Token objects of the sentence, ordered by ``token_num``.
 
-    replacements.sort(key=lambda x: x[1], reverse=True)
-    for start, end, replacement in replacements:
-        markup = markup[:start] + replacement + markup[end:]
+    Returns:
+        List of token arrays.
+    """
+    pos_codes, feature_codes = _get_token_data_codes()
+    return [
+        [
+            token.start - sentence.start,
+            token.end - sentence.start,
+            token.lemma,
+            pos_codes.get(token.pos, token.pos),
+            "".join(
+                _FEATURE_CODE_DIGITS[codes.get(getattr(token, field), 0)]
+                for field, codes in feature_codes
+            ).rstrip("0"),
+        ]
+        for token in tokens
+    ]
+
+
+@lru_cache(maxsize=None)
+def _get_token_data_codes():
+    """Returns the mappings of POS and feature values to their token data codes.
 
-    return markup
+    Returns:
+        Tuple of a dictionary of POS codes and a list of tuples of a Token field name
+        and a dictionary of the feature value codes.
+    """
+    legend = get_token_data_legend()
+    pos_codes = {value: code for code, value in enumerate(legend["pos"])}
+    feature_codes = [
+        (field, {value: code for code, value in enumerate(values, 1)})
+        for field, (_, values) in zip(_UD_FEATURES.values(), legend["features"])
+    ]
+    return pos_codes, feature_codes
 
 
-def _create_sentence_object(document, natasha_sent, sentence_num, markup):
+def _create_sentence_object(document, natasha_sent, sentence_num):
     """Creates a Sentence object from a Natasha sentence.
 
     This function creates a Sentence instance from a Natasha sentence. The resulting
@@ -190,7 +521,6 @@ def _create_sentence_object(document, natasha_sent, sentence_num, markup):
         document: Document object.
         natasha_sent: Natasha sentence object.
         sentence_num: Number of the sentence in the document (zero-indexed).
-        markup: HTML markup of the sentence with token information tooltips.
 
     Returns:
         Sentence object.
@@ -200,7 +530,6 @@ def _create_sentence_object(document, natasha_sent, sentence_num, markup):
     return Sentence(
         document=document,
         text=natasha_sent.text,
-        markup=markup,
         number=sentence_num,
         start=natasha_sent.start,
         end=natasha_sent.stop,
@@ -263,15 +592,27 @@ def _create_token_objects_and_extract_words_lemmas(
     return token_objects, words, lemmas
 
 
-def _save_sentences_and_tokens(sentences_bulk, tokens_bulk):
-    """Saves Sentence and Token objects to the database and creates sentence search
-    vectors.
+def _save_sentences_and_tokens(sentences_bulk, tokens_bulk, writer=None, index=True):
+    """Saves Sentence and Token objects to the database, creates sentence search
+    vectors and logs the change of the tokens for the token index.
+
+    The objects are written either with ``bulk_create`` (the "orm" writer) or with
+    binary COPY (the "copy" writer, see ``copy_writer``).
 
     Args:
         sentences_bulk: List of Sentence objects.
         tokens_bulk: List of Token objects.
+        writer: The writer to use ("orm" or "copy"), defaults to the
+            CORPUS_BULK_WRITER setting.
+        index: Whether to log the change of the tokens, False if the caller logs it.
     """
 
+    if (writer or settings.CORPUS_BULK_WRITER) == "copy":
+        copy_sentences_and_tokens(sentences_bulk, tokens_bulk)
+        if index:
+            log_token_changes({token.document_id for token in tokens_bulk})
+        return
+
     Sentence = apps.get_model("corpus", "Sentence")
     Token = apps.get_model("corpus", "Token")
 
@@ -291,3 +632,5 @@ def _save_sentences_and_tokens(sentences_bulk, tokens_bulk):
     )
 
     Token.objects.bulk_create(tokens_bulk)
+    if index:
+        log_token_changes({token.document_id for token in tokens_bulk})
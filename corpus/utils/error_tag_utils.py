@@ -0,0 +1,81 @@
+"""Utility functions for maintaining the token error tag index.
+
+The error tags of the annotations are indexed by token in the ``TokenErrorTag`` table,
+with one row per annotation, annotated token and error tag, so that error filters of
+lexico-grammatical searches are answered with an index lookup instead of scanning the
+annotations of every candidate token. The rows of an annotation are rewritten when it
+is saved or its tokens change, and deleted together with the annotation, the token or
+the sentence.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+from django.apps import apps
+from django.db import connection, transaction
+
+# one row per annotation, annotated token and non-empty error tag; the filter on the
+# annotations is appended to the statement
+_INSERT_ERROR_TAGS = """
+    INSERT INTO {index_table} (annotation_id, token_id, sentence_id, error_tag, alt)
+    SELECT DISTINCT a.id, at.token_id, a.sentence_id, tag.error_tag, a.alt
+    FROM {annotation_table} a
+    JOIN {tokens_table} at ON at.annotation_id = a.id
+    CROSS JOIN LATERAL unnest(a.error_tags) AS tag(error_tag)
+    WHERE tag.error_tag <> ''
+"""
+
+
+def _get_insert_sql():
+    Annotation = apps.get_model("corpus", "Annotation")
+    TokenErrorTag = apps.get_model("corpus", "TokenErrorTag")
+    return _INSERT_ERROR_TAGS.format(
+        index_table=TokenErrorTag._meta.db_table,
+        annotation_table=Annotation._meta.db_table,
+        tokens_table=Annotation.tokens.through._meta.db_table,
+    )
+
+
+def index_error_tags(annotation_ids):
+    """Rewrites the index rows of annotations from their error tags and tokens.
+
+    Args:
+        annotation_ids: List of annotation ids.
+    """
+    TokenErrorTag = apps.get_model("corpus", "TokenErrorTag")
+
+    annotation_ids = list(annotation_ids)
+    if not annotation_ids:
+        return
+    with transaction.atomic():
+        TokenErrorTag.objects.filter(annotation_id__in=annotation_ids).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(_get_insert_sql() + " AND a.id = ANY(%s)", [annotation_ids])
+
+
+def rebuild_error_tag_index(batch_size=10000):
+    """Rebuilds the whole index from the annotations.
+
+    Args:
+        batch_size: The number of annotations indexed by one statement.
+
+    Returns:
+        The number of index rows.
+    """
+    Annotation = apps.get_model("corpus", "Annotation")
+    TokenErrorTag = apps.get_model("corpus", "TokenErrorTag")
+
+    annotation_ids = list(
+        Annotation.objects.order_by("pk").values_list("pk", flat=True)
+    )
+    with transaction.atomic():
+        TokenErrorTag.objects.all().delete()
+        with connection.cursor() as cursor:
+            for start in range(0, len(annotation_ids), batch_size):
+                cursor.execute(
+                    _get_insert_sql() + " AND a.id BETWEEN %s AND %s",
+                    [
+                        annotation_ids[start],
+                        annotation_ids[start : start + batch_size][-1],
+                    ],
+                )
+    return TokenErrorTag.objects.count()
@@ -0,0 +1,93 @@
+"""Utility functions for exporting documents.
+
+Documents are exported as a JSON array emitted document by document, so that the
+export of the whole corpus runs in constant memory. The documents are read in
+keyset-ordered batches with their sentences, annotations and users prefetched, and
+every batch is released before the next one is read.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+import json
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch, Q
+
+# the number of documents read and serialized at a time
+EXPORT_BATCH_SIZE = 100
+
+
+def iter_export_documents(documents, batch_size=EXPORT_BATCH_SIZE):
+    """Yields documents with everything ``Document.serialize`` reads, in batches.
+
+    The documents are ordered by creation date (newest first, as in the document list)
+    and read in batches after the last document of the previous batch, with the
+    prefetches of one batch at a time.
+
+    Args:
+        documents: QuerySet of Document objects, e.g. filtered by ``DocumentFilter``.
+        batch_size: The number of documents read at a time.
+
+    Yields:
+        Document objects.
+    """
+    Annotation = apps.get_model("corpus", "Annotation")
+    Sentence = apps.get_model("corpus", "Sentence")
+
+    documents = (
+        documents.select_related("user", "author")
+        .prefetch_related(
+            "annotators",
+            Prefetch(
+                "sentence_set",
+                queryset=Sentence.objects.only(
+                    "document", "number", "text", "token_data"
+                )
+                .order_by("number")
+                .prefetch_related(
+                    Prefetch(
+                        "annotation_set",
+                        queryset=Annotation.objects.select_related("user").order_by(
+                            "pk"
+                        ),
+                    )
+                ),
+            ),
+        )
+        .order_by("-created_on", "-pk")
+    )
+
+    last = None
+    while True:
+        batch = documents
+        if last is not None:
+            batch = batch.filter(
+                Q(created_on__lt=last.created_on)
+                | Q(created_on=last.created_on, pk__lt=last.pk)
+            )
+        batch = list(batch[:batch_size])
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        last = batch[-1]
+
+
+def stream_documents_json(documents, batch_size=EXPORT_BATCH_SIZE):
+    """Yields the JSON array of serialized documents in chunks of one document.
+
+    The joined chunks are the same as the JSON of the list of all serialized documents
+    encoded by ``JsonResponse``.
+
+    Args:
+        documents: QuerySet of Document objects.
+        batch_size: The number of documents read at a time.
+
+    Yields:
+        str: Chunks of the JSON array.
+    """
+    separator = "["
+    for document in iter_export_documents(documents, batch_size):
+        yield separator + json.dumps(document.serialize(), cls=DjangoJSONEncoder)
+        separator = ", "
+    yield "[]" if separator == "[" else "]"
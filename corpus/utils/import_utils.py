@@ -0,0 +1,232 @@
+"""Utility functions for bulk importing documents into the corpus.
+
+The import is split into two steps: ``analyze_document_record`` runs the NLP pipeline
+and does not access the database, so it can run in worker processes, while
+``save_analyzed_documents`` writes a whole batch of analyzed documents in bulk.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import translation
+
+from .document_utils import analyze_document, _save_sentences_and_tokens
+from .stats_utils import create_documents_stats
+
+# Document fields that can be imported from a record as is
+_DOCUMENT_FIELDS = [
+    "title",
+    "body",
+    "date",
+    "genre",
+    "subcorpus",
+    "time_limit",
+    "oral",
+    "language_level",
+]
+
+# Author fields written by ``Author.serialize``
+_AUTHOR_FIELDS = [
+    "name",
+    "gender",
+    "program",
+    "language_background",
+    "dominant_language",
+    "source",
+]
+
+_READ_SIZE = 1 << 20
+
+
+def iter_json_records(path):
+    """Iterates over the records of a JSON backup without loading the whole file.
+
+    Both a JSON array of objects and JSON Lines files are supported. Records in the
+    ``manage.py dumpdata`` format are flattened to their fields.
+
+    Args:
+        path: Path to the backup file.
+
+    Yields:
+        Dictionary of the record fields.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as f:
+        buffer = f.read(_READ_SIZE).lstrip()
+        is_array = buffer.startswith("[")
+        position = 1 if is_array else 0
+
+        while True:
+            position = _skip_separators(buffer, position)
+            if is_array and buffer.startswith("]", position):
+                return
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = f.read(_READ_SIZE)
+                if not chunk:
+                    if buffer[position:].strip():
+                        raise
+                    return
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield _flatten_record(record)
+
+
+def make_document(record, defaults=None):
+    """Creates an unsaved Document object from a backup record.
+
+    Both the ``manage.py dumpdata`` records and the records written by
+    ``Document.serialize`` (the documents export) are supported: the author is either a
+    primary key or the author fields, matched with an existing author or created, the
+    user is either a primary key or a username, and the status is either a value or a
+    label. The sentences and annotations of the record are not imported, the body is
+    analyzed again.
+
+    Args:
+        record: Dictionary of the record fields.
+        defaults: Dictionary of field values used if the record does not set them.
+
+    Returns:
+        Document object.
+
+    Raises:
+        ValueError: If the user, the author or the status of the record is unknown.
+    """
+    Document = apps.get_model("corpus", "Document")
+    Author = apps.get_model("corpus", "Author")
+    User = apps.get_model("auth", "User")
+
+    values = dict(defaults or {})
+    for field in _DOCUMENT_FIELDS:
+        if record.get(field) is not None:
+            values[field] = record[field]
+
+    author = record.get("author") or record.get("author_id")
+    if isinstance(author, dict):
+        unknown_fields = set(author) - set(_AUTHOR_FIELDS)
+        if unknown_fields:
+            raise ValueError(
+                f"Unknown author fields: {', '.join(sorted(unknown_fields))}"
+            )
+        values["author"], _ = Author.objects.get_or_create(**author)
+    elif author is not None:
+        values.pop("author", None)
+        values["author_id"] = author
+
+    user = record.get("user") or record.get("user_id")
+    if isinstance(user, str):
+        values["user"] = User.objects.filter(username=user).first()
+        if values["user"] is None:
+            raise ValueError(f"Unknown user: {user}")
+    elif user is not None:
+        values.pop("user", None)
+        values["user_id"] = user
+
+    if record.get("status") is not None:
+        values["status"] = _parse_status(record["status"])
+    return Document(**values)
+
+
+def _parse_status(status):
+    """Returns the value of a document status given as a value or a label.
+
+    The label is matched in the active language, in the default language and
+    untranslated, as the documents export writes it in the language of the request.
+
+    Args:
+        status: The status value or label.
+
+    Returns:
+        The status value.
+
+    Raises:
+        ValueError: If the status is unknown.
+    """
+    Document = apps.get_model("corpus", "Document")
+
+    if status in Document.StatusChoices.values:
+        return status
+    for language in [translation.get_language(), settings.LANGUAGE_CODE, None]:
+        with translation.override(language):
+            for value, label in Document.StatusChoices.choices:
+                if status == str(label):
+                    return value
+    raise ValueError(f"Unknown document status: {status}")
+
+
+def analyze_document_record(document):
+    """Analyzes an unsaved document, to be used as a worker process function.
+
+    Args:
+        document: Unsaved Document object.
+
+    Returns:
+        Tuple of the Document object and lists of its Sentence and Token objects.
+    """
+    sentences_bulk, tokens_bulk = analyze_document(document)
+    return document, sentences_bulk, tokens_bulk
+
+
+@transaction.atomic
+def save_analyzed_documents(analyzed_documents, writer=None):
+    """Saves a batch of analyzed documents with their sentences and tokens in bulk.
+
+    Args:
+        analyzed_documents: List of tuples returned by ``analyze_document_record``.
+        writer: The sentence and token writer to use ("orm" or "copy"), defaults to
+            the CORPUS_BULK_WRITER setting.
+
+    Returns:
+        The number of saved tokens.
+    """
+    Document = apps.get_model("corpus", "Document")
+
+    Document.objects.bulk_create([document for document, _, _ in analyzed_documents])
+    sentences_bulk = [s for _, sentences, _ in analyzed_documents for s in sentences]
+    tokens_bulk = [t for _, _, tokens in analyzed_documents for t in tokens]
+    _save_sentences_and_tokens(sentences_bulk, tokens_bulk, writer)
+    create_documents_stats(
+        [
+            (document, len(sentences), len(tokens))
+            for document, sentences, tokens in analyzed_documents
+        ]
+    )
+    return len(tokens_bulk)
+
+
+def _skip_separators(buffer, position):
+    """Returns the position of the first character that is not a whitespace or a comma.
+
+    Args:
+        buffer: The string to scan.
+        position: The position to start from.
+
+    Returns:
+        The position of the next value in the buffer.
+    """
+    while position < len(buffer) and (
+        buffer[position].isspace() or buffer[position] == ","
+    ):
+        position += 1
+    return position
+
+
+def _flatten_record(record):
+    """Returns the fields of a record in the ``manage.py dumpdata`` format or the
+    record itself.
+
+    Args:
+        record: Dictionary of the record.
+
+    Returns:
+        Dictionary of the record fields.
+    """
+    if isinstance(record.get("fields"), dict):
+        return record["fields"]
+    return record
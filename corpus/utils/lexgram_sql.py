@@ -0,0 +1,255 @@
+"""Set-based SQL engine for the lexico-grammatical search feature.
+
+The engine compiles a ``TokenSearchSequence`` into a single SQL statement that is
+evaluated by PostgreSQL. Every candidate sentence is joined laterally with a numbered
+list of its tokens (punctuation and symbols excluded), and the tokens of the search
+sequence are matched with self-joins on the token index, so a page of results costs a
+single round trip regardless of the number of sentences inspected. Error filters are
+answered from the error tag index (``TokenErrorTag``): the candidate sentences are
+restricted to the sentences with the searched error tags before their tokens are
+numbered.
+
+The Python matcher in ``lexgram_utils`` implements the same semantics and is kept as a
+reference implementation.
+"""
+
+from dataclasses import dataclass
+
+from django.db import connection
+from django.db.models import QuerySet
+
+from corpus.models import Sentence, Token, TokenErrorTag
+from .search_helper_classes import ANY_ERROR, TokenSearchSequence
+
+# Token fields that can be used in grammar filters, used to whitelist column names
+# before they are interpolated into the SQL statement.
+_FEATURE_COLUMNS = {
+    field.name: field.column
+    for field in Token._meta.get_fields()
+    if getattr(field, "choices", None) and field.name != "pos"
+}
+
+
+@dataclass
+class LexgramMatch:
+    """A sentence matching a lexico-grammatical search sequence.
+
+    Attributes:
+        sentence_id (int): The primary key of the matching sentence.
+        document_id (int): The primary key of the document of the matching sentence.
+        number (int): The position of the matching sentence in its document.
+        token_nums (list[int]): The ``token_num`` of every matched token, in the order
+            of the search sequence.
+        words (list[str]): The text of every matched token, in the order of the search
+            sequence.
+    """
+
+    sentence_id: int
+    document_id: int
+    number: int
+    token_nums: list[int]
+    words: list[str]
+
+
+def lexgram_query_sentences(
+    sentences: QuerySet[Sentence],
+    search_seq: TokenSearchSequence,
+    offset: int,
+    limit: int | None,
+) -> list[LexgramMatch]:
+    """Finds sentences matching the search sequence with a single SQL query.
+
+    The sentences are returned in the ``(-document_id, number)`` order. For every
+    sentence, the first match (by token position) is returned.
+
+    Args:
+        sentences (QuerySet[Sentence]): A queryset of Sentence objects to search in.
+        search_seq (TokenSearchSequence): A TokenSearchSequence object containing the search sequence.
+        offset (int): The number of matching sentences to skip.
+        limit (int | None): The maximum number of matching sentences to return, or None to return all of them.
+
+    Returns:
+        list[LexgramMatch]: The matching sentences with their matched tokens.
+    """
+
+    sql, params = compile_lexgram_query(sentences, search_seq, offset, limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            LexgramMatch(
+                sentence_id=row[0],
+                document_id=row[1],
+                number=row[2],
+                token_nums=row[3],
+                words=row[4],
+            )
+            for row in cursor.fetchall()
+        ]
+
+
+def compile_lexgram_query(
+    sentences: QuerySet[Sentence],
+    search_seq: TokenSearchSequence,
+    offset: int,
+    limit: int | None,
+) -> tuple[str, list]:
+    """Compiles a search sequence into an SQL statement and its parameters.
+
+    The statement selects five columns: the sentence id, the document id, the sentence
+    number, an array of matched token numbers and an array of matched token texts.
+
+    Args:
+        sentences (QuerySet[Sentence]): A queryset of Sentence objects to search in.
+        search_seq (TokenSearchSequence): A TokenSearchSequence object containing the search sequence.
+        offset (int): The number of matching sentences to skip.
+        limit (int | None): The maximum number of matching sentences to return, or None to return all of them.
+
+    Returns:
+        tuple[str, list]: The SQL statement and the list of its parameters.
+    """
+
+    sentences = _filter_sentences_with_errors(sentences, search_seq)
+    sentences_sql, sentences_params = (
+        sentences.order_by()
+        .values("id", "document_id", "number")
+        .query.sql_with_params()
+    )
+
+    # the first token of the sequence is filtered in the WHERE clause, the following
+    # ones are joined to their predecessors by the distance between them
+    first_conditions, first_params = _compile_token_conditions("t0", search_seq, 0)
+    joins = []
+    join_params = []
+    for seq_index in range(1, len(search_seq.wordforms)):
+        alias = f"t{seq_index}"
+        conditions = [
+            f"{alias}.idx BETWEEN t{seq_index - 1}.idx + %s AND t{seq_index - 1}.idx + %s"
+        ]
+        join_params.extend(
+            [search_seq.froms[seq_index - 1], search_seq.tos[seq_index - 1]]
+        )
+        token_conditions, token_params = _compile_token_conditions(
+            alias, search_seq, seq_index
+        )
+        conditions.extend(token_conditions)
+        join_params.extend(token_params)
+        joins.append(f"JOIN numbered {alias} ON {' AND '.join(conditions)}")
+
+    seq_range = range(len(search_seq.wordforms))
+    token_nums = ", ".join(f"t{i}.token_num" for i in seq_range)
+    words = ", ".join(f"t{i}.token" for i in seq_range)
+    match_order = ", ".join(f"t{i}.idx" for i in seq_range)
+
+    sql = f"""
+        SELECT s.id, s.document_id, s.number, m.token_nums, m.words
+        FROM ({sentences_sql}) s
+        CROSS JOIN LATERAL (
+            WITH numbered AS (
+                SELECT
+                    tok.*,
+                    row_number() OVER (ORDER BY tok.token_num) AS idx
+                FROM {Token._meta.db_table} tok
+                WHERE tok.sentence_id = s.id AND tok.pos NOT IN ('PUNCT', 'SYM')
+            )
+            SELECT ARRAY[{token_nums}] AS token_nums, ARRAY[{words}] AS words
+            FROM numbered t0
+            {" ".join(joins)}
+            WHERE {" AND ".join(first_conditions) or "TRUE"}
+            ORDER BY {match_order}
+            LIMIT 1
+        ) m
+        ORDER BY s.document_id DESC, s.number
+    """
+    if limit is not None:
+        sql += " LIMIT %s"
+    sql += " OFFSET %s"
+
+    all_params = list(sentences_params) + join_params + first_params
+    if limit is not None:
+        all_params.append(limit)
+    all_params.append(offset)
+
+    return sql, all_params
+
+
+def _filter_sentences_with_errors(
+    sentences: QuerySet[Sentence], search_seq: TokenSearchSequence
+) -> QuerySet[Sentence]:
+    """Restricts the sentences to the ones with the error tags of every token of the search sequence.
+
+    Args:
+        sentences (QuerySet[Sentence]): A queryset of Sentence objects to search in.
+        search_seq (TokenSearchSequence): A TokenSearchSequence object containing the search sequence.
+
+    Returns:
+        QuerySet[Sentence]: The filtered queryset.
+    """
+
+    for errors in search_seq.errors[: len(search_seq.wordforms)]:
+        if not errors:
+            continue
+        entries = TokenErrorTag.objects.all()
+        if ANY_ERROR not in errors:
+            entries = entries.filter(error_tag__in=errors)
+        sentences = sentences.filter(pk__in=entries.values("sentence_id"))
+    return sentences
+
+
+def _compile_token_conditions(
+    alias: str, search_seq: TokenSearchSequence, seq_index: int
+) -> tuple[list[str], list]:
+    """Compiles the conditions for a single token of the search sequence.
+
+    Args:
+        alias (str): The SQL alias of the token relation.
+        search_seq (TokenSearchSequence): A TokenSearchSequence object containing the search sequence.
+        seq_index (int): The index of the token in the search sequence.
+
+    Returns:
+        tuple[list[str], list]: The list of SQL conditions and the list of their parameters.
+    """
+
+    conditions = []
+    params = []
+
+    wordform = search_seq.wordforms[seq_index]
+    if wordform:
+        conditions.append(f"{alias}.lemma = %s")
+        params.append(wordform)
+
+    lexes = search_seq.lexes[seq_index] if seq_index < len(search_seq.lexes) else []
+    if lexes:
+        conditions.append(f"{alias}.pos = ANY(%s)")
+        params.append(list(lexes))
+
+    grams = (
+        search_seq.grammars[seq_index] if seq_index < len(search_seq.grammars) else []
+    )
+    if grams:
+        gram_conditions = []
+        for feature, value in grams:
+            column = _FEATURE_COLUMNS.get(feature)
+            if column is None:
+                continue
+            gram_conditions.append(f"{alias}.{column} = %s")
+            params.append(value)
+        conditions.append(
+            f"({' OR '.join(gram_conditions)})" if gram_conditions else "FALSE"
+        )
+
+    errors = search_seq.errors[seq_index] if seq_index < len(search_seq.errors) else []
+    if errors:
+        # a lookup of the error tag index
+        error_conditions = [f"e.token_id = {alias}.id"]
+        if ANY_ERROR not in errors:
+            error_conditions.append("e.error_tag = ANY(%s)")
+            params.append(list(errors))
+        conditions.append(
+            f"""EXISTS (
+                SELECT 1
+                FROM {TokenErrorTag._meta.db_table} e
+                WHERE {" AND ".join(error_conditions)}
+            )"""
+        )
+
+    return conditions, params
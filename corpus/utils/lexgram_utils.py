@@ -1,51 +1,61 @@
-"""Utility functions for the lexico-grammatical search feature."""
+"""Utility functions for the lexico-grammatical search feature.
+
+The matcher in this module walks the tokens of every sentence in Python and is kept as
+the reference implementation of the search semantics. Searches are executed by the
+set-based SQL engine in ``lexgram_sql``.
+"""
+
 from django.db.models import QuerySet
 
-from corpus.models import Token, Sentence
-from .search_helper_classes import TokenSearchSequence
+from corpus.models import Token, Sentence, TokenErrorTag
+from .search_helper_classes import ANY_ERROR, TokenSearchSequence
+from .search_utils import _filter_after_cursor
 
 
 def lexgram_find_sentences(
     sentences: QuerySet[Sentence],
     search_seq: TokenSearchSequence,
-    chunk_start: int,
     page_size: int,
+    cursor: tuple[int, int] | None = None,
 ):
-    """Finds no more than page_size sentences matching the search sequence and returns their
-    primary keys.
+    """Finds no more than page_size sentences matching the search sequence after the cursor and returns their primary
+    keys.
+
+    The sentences are inspected in the ``(-document_id, number)`` order of the search results and paginated with the
+    same keyset cursor as the search engines (see ``search_utils.decode_search_cursor``).
 
     Args:
         sentences (QuerySet[Sentence]): A queryset of Sentence objects to search in.
         search_seq (TokenSearchSequence): A TokenSearchSequence object containing the search sequence.
-        chunk_start (int): The number of sentences to skip from the beginning of the queryset.
         page_size (int): The number of search results to return per page.
+        cursor (tuple[int, int] | None, optional): The document id and the number of the last sentence of the
+            previous page. Defaults to None (the first page).
 
     Returns:
-        tuple[list[int], set[str], int]: A tuple containing:
+        tuple[list[int], set[str], tuple[int, int] | None]: A tuple containing:
             - list[int]: A list of sentence primary keys.
             - set[str]: A set of wordforms found in the search sequence.
-            - int: The number of sentences processed.
+            - tuple[int, int] | None: The document id and the number of the last matching sentence, the cursor of
+              the next page, or None if no sentence matches.
     """
 
     matching_sentence_pks = []
     matching_words = set()
-    processed_count = 0
-
-    for sentence in sentences.iterator():
-        if chunk_start != 0 and processed_count <= chunk_start:
-            processed_count += 1
-            continue
-
-        sentence_matches = _check_sentence_match(sentence, search_seq)
-        processed_count += 1
-
-        if sentence_matches:
+    next_cursor = None
+
+    for sentence in (
+        _filter_after_cursor(sentences, cursor)
+        .order_by("-document_id", "number")
+        .iterator()
+    ):
+        if _check_sentence_match(sentence, search_seq):
             matching_sentence_pks.append(sentence.pk)
+            next_cursor = (sentence.document_id, sentence.number)
 
         if len(matching_sentence_pks) == page_size:
-            return matching_sentence_pks, matching_words, processed_count
+            break
 
-    return matching_sentence_pks, matching_words, processed_count
+    return matching_sentence_pks, matching_words, next_cursor
 
 
 def _check_sentence_match(sentence: Sentence, search_seq: TokenSearchSequence) -> bool:
@@ -59,12 +69,23 @@ def _check_sentence_match(sentence: Sentence, search_seq: TokenSearchSequence) -
         bool: True if the sentence matches the search sequence, False otherwise.
     """
 
-    tokens = Token.objects.filter(sentence=sentence).exclude(pos__in=["PUNCT", "SYM"])
-    seq_len = len(search_seq.wordforms)
+    tokens = list(
+        Token.objects.filter(sentence=sentence)
+        .exclude(pos__in=["PUNCT", "SYM"])
+        .order_by("token_num")
+    )
+    # the error tags of all tokens of the sentence are read from the index at once
+    error_tags = {}
+    for token_id, error_tag in TokenErrorTag.objects.filter(
+        sentence=sentence
+    ).values_list("token_id", "error_tag"):
+        error_tags.setdefault(token_id, set()).add(error_tag)
+    for token in tokens:
+        token.error_tags = error_tags.get(token.pk, set())
 
     for token_index, token in enumerate(tokens):
         if _match_token(token, search_seq, 0) and _match_subsequent_tokens(
-            tokens, token_index, search_seq, seq_len
+            tokens, token_index, search_seq, 1
         ):
             return True
 
@@ -94,33 +115,35 @@ def _match_token(token: Token, search_seq: TokenSearchSequence, seq_index: int)
     )
 
 
-def _match_subsequent_tokens(tokens, start_index, search_seq, seq_len):
+def _match_subsequent_tokens(tokens, prev_index, search_seq, seq_index):
     """Matches subsequent tokens against the search sequence.
 
+    Every token in the allowed distance range is tried as a candidate for the current
+    element of the search sequence, so the sentence matches if any chain of tokens
+    satisfies the sequence (the same semantics as the SQL engine in ``lexgram_sql``).
+
     Args:
-        tokens (QuerySet[Token]): A queryset of Token objects to match.
-        start_index (int): The index of the first token to match.
+        tokens (list[Token]): A list of Token objects to match.
+        prev_index (int): The index of the token matched by the previous element of the search sequence.
         search_seq (TokenSearchSequence): A TokenSearchSequence object containing the search sequence.
-        seq_len (int): The length of the search sequence.
+        seq_index (int): The index of the current element of the search sequence.
 
     Returns:
-        bool: True if the tokens match the search sequence, False otherwise.
+        bool: True if the tokens match the rest of the search sequence, False otherwise.
     """
 
-    prev_word_index = start_index
-    for j in range(1, seq_len):
-        found_match = False
-        for k in range(
-            max(prev_word_index + search_seq.froms[j - 1], 0),
-            min(prev_word_index + search_seq.tos[j - 1] + 1, len(tokens)),
+    if seq_index == len(search_seq.wordforms):
+        return True
+
+    for k in range(
+        max(prev_index + search_seq.froms[seq_index - 1], 0),
+        min(prev_index + search_seq.tos[seq_index - 1] + 1, len(tokens)),
+    ):
+        if _match_token(tokens[k], search_seq, seq_index) and _match_subsequent_tokens(
+            tokens, k, search_seq, seq_index + 1
         ):
-            if _match_token(tokens[k], search_seq, j):
-                prev_word_index = k
-                found_match = True
-                break
-        if not found_match:
-            return False
-    return True
+            return True
+    return False
 
 
 def _check_lex(word: Token, lexes: list[str]) -> bool:
@@ -162,19 +185,15 @@ def _check_errors(word: Token, errors: list[str]) -> bool:
     """Check if a token's RLC error tags are in the list of allowed tags.
 
     Args:
-        word (Token): A Token object to check.
-        errors (list[str]): A list of allowed RLC error tags.
+        word (Token): A Token object to check, with the set of its error tags in the error_tags attribute.
+        errors (list[str]): A list of allowed RLC error tags, a list containing ANY_ERROR allows any tag.
 
     Returns:
         bool: True if the token's RLC error tags are in the list of allowed tags, False otherwise.
     """
 
-    # TODO make a toggle for all errors at once/any error (like in RLC)
     if not errors:
         return True
-
-    for annotation in word.annotations.all():
-        if any(error in annotation.error_tags for error in errors):
-            return True
-
-    return False
+    if ANY_ERROR in errors:
+        return bool(word.error_tags)
+    return not word.error_tags.isdisjoint(errors)
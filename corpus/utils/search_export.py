@@ -0,0 +1,371 @@
+"""Export of search results in the CSV, JSON Lines and CoNLL-U formats.
+
+An export runs the full search (not just one page of results) and streams the matching
+sentences with their document metadata, matched token positions and annotations. The
+matches are read with a server-side cursor (see ``iter_search_matches``), and the
+sentences are loaded and written in batches of ``SEARCH_EXPORT_BATCH_SIZE``, so an
+export of any size runs in constant memory and starts sending data at once. The
+exports streamed at a time are limited separately from the searches (see
+``get_export_semaphore``), so that long exports do not hold up the search pages.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import weakref
+from collections.abc import Iterator
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.http import (
+    HttpResponseBadRequest,
+    HttpResponseForbidden,
+    StreamingHttpResponse,
+)
+
+from corpus.models import Annotation, Sentence, Token, TokenErrorTag
+from .async_utils import get_loop_semaphore, streaming_iterator
+from .correction_utils import fill_corrections
+from .document_utils import _UD_FEATURES
+from .search_utils import (
+    iter_search_matches,
+    preprocess_exact_search,
+    preprocess_lexgram_search,
+)
+
+# the number of matching sentences loaded and written at a time
+SEARCH_EXPORT_BATCH_SIZE = 500
+
+# the semaphores limiting the exports by event loop, see get_export_semaphore
+_export_semaphores = weakref.WeakKeyDictionary()
+
+# content types and file extensions of the export formats
+SEARCH_EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "conllu": ("text/plain", "conllu"),
+}
+
+CSV_COLUMNS = [
+    "document_id",
+    "document_title",
+    "author",
+    "gender",
+    "language_background",
+    "dominant_language",
+    "language_level",
+    "date",
+    "genre",
+    "oral",
+    "sentence_id",
+    "sentence_number",
+    "text",
+    "correction",
+    "alt_correction",
+    "matched_token_nums",
+    "matched_words",
+    "annotations",
+]
+
+
+def export_search_results(request, search_type):
+    """Streams all results of a search in the requested format.
+
+    The request body is the JSON body of a search request (see ``preprocess_exact_search`` and
+    ``preprocess_lexgram_search``) with the export format in the format field ("csv", "jsonl" or "conllu"), sent as is
+    or in the query field of a submitted form, so that the browser downloads the export as it is streamed. The page
+    size and the cursor of the request are ignored. Only authenticated users can export search results.
+
+    Args:
+        request: The HTTP request object.
+        search_type: The type of the search ("exact" or "lexgram").
+
+    Returns:
+        StreamingHttpResponse: The response streaming the exported search results, HttpResponseForbidden if the user
+            is not authenticated, or HttpResponseBadRequest if the request body or the format is malformed.
+    """
+    if not request.user.is_authenticated:
+        return HttpResponseForbidden("Log in to export search results")
+
+    body = request.POST.get("query") or request.body
+    try:
+        export_format = json.loads(body).get("format", "csv")
+        if search_type == "lexgram":
+            search_query, subcorpus_settings, _, _ = preprocess_lexgram_search(body)
+        else:  # "exact"
+            search_query, subcorpus_settings, _, _ = preprocess_exact_search(body)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        # a malformed body or search cursor
+        return HttpResponseBadRequest(f"Invalid search request: {e}")
+    if export_format not in SEARCH_EXPORT_FORMATS:
+        return HttpResponseBadRequest(f"Unknown export format: {export_format}")
+
+    content_type, extension = SEARCH_EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        streaming_iterator(
+            request,
+            stream_search_results(
+                export_format, search_type, search_query, subcorpus_settings
+            ),
+            get_semaphore=get_export_semaphore,
+        ),
+        content_type=f"{content_type}; charset=utf-8",
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{search_type}_search.{extension}"'
+    )
+    return response
+
+
+def get_export_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore limiting the search exports streamed at a time by the process.
+
+    An export runs a full search and may take minutes to download, so the exports wait
+    for their own SEARCH_EXPORT_CONCURRENCY slots instead of those of the searches. The
+    semaphore belongs to the running event loop (see ``get_loop_semaphore``).
+
+    Returns:
+        asyncio.Semaphore: The semaphore shared by the search export views of the event
+            loop.
+    """
+
+    return get_loop_semaphore(_export_semaphores, settings.SEARCH_EXPORT_CONCURRENCY)
+
+
+def stream_search_results(
+    export_format: str,
+    search_type: str,
+    search_query,
+    subcorpus_settings,
+    batch_size: int = SEARCH_EXPORT_BATCH_SIZE,
+) -> Iterator[str]:
+    """Yields the exported search results in chunks of one batch of sentences.
+
+    Args:
+        export_format: The export format ("csv", "jsonl" or "conllu").
+        search_type: The type of the search ("exact" or "lexgram").
+        search_query: The TokenSearchSequence object for lexico-grammatical searches or the list of exact forms.
+        subcorpus_settings: The settings of the subcorpus to search in.
+        batch_size: The number of sentences loaded and written at a time.
+
+    Yields:
+        str: Chunks of the export.
+    """
+    if export_format == "csv":
+        yield _write_csv_rows([CSV_COLUMNS])
+
+    for matches in iter_search_matches(
+        search_type, search_query, subcorpus_settings, batch_size
+    ):
+        sentences = _load_sentences([sentence_id for sentence_id, _ in matches])
+        rows = []
+        for sentence_id, token_nums in matches:
+            sentence = sentences.get(sentence_id)
+            if sentence is None:  # deleted during the export
+                continue
+            if token_nums is None:
+                token_nums = _find_exact_match(sentence.export_tokens, search_query)
+            rows.append(_make_row(sentence, token_nums))
+
+        if export_format == "csv":
+            yield _write_csv_rows(_make_csv_row(row) for row in rows)
+        elif export_format == "jsonl":
+            yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        else:  # "conllu"
+            yield "".join(
+                _make_conllu_sentence(row, sentences[row["sentence_id"]])
+                for row in rows
+            )
+
+
+def _load_sentences(sentence_ids: list[int]) -> dict[int, Sentence]:
+    """Loads a batch of sentences with their documents, authors, tokens, annotations and cached corrections.
+
+    The tokens of every sentence are stored in its export_tokens attribute, each with the set of its error tags in its
+    export_error_tags attribute.
+
+    Args:
+        sentence_ids: List of sentence ids.
+
+    Returns:
+        dict[int, Sentence]: The sentences by id.
+    """
+
+    sentences = list(
+        Sentence.objects.filter(pk__in=sentence_ids)
+        .defer("search_vector", "token_data")
+        .select_related("document__author")
+        .prefetch_related(
+            Prefetch(
+                "tokens",
+                queryset=Token.objects.order_by("token_num"),
+                to_attr="export_tokens",
+            ),
+            Prefetch(
+                "annotation_set",
+                queryset=Annotation.objects.select_related("user").order_by("pk"),
+            ),
+        )
+    )
+    fill_corrections(sentences)
+
+    error_tags = {}
+    for token_id, error_tag in TokenErrorTag.objects.filter(
+        sentence_id__in=sentence_ids
+    ).values_list("token_id", "error_tag"):
+        error_tags.setdefault(token_id, set()).add(error_tag)
+    for sentence in sentences:
+        for token in sentence.export_tokens:
+            token.export_error_tags = error_tags.get(token.pk, set())
+
+    return {sentence.pk: sentence for sentence in sentences}
+
+
+def _find_exact_match(tokens: list[Token], exact_forms: list[str]) -> list[int]:
+    """Returns the ``token_num`` of the first sequence of word tokens equal to the exact forms, ignoring case.
+
+    Punctuation and symbols are skipped, as in exact searches.
+
+    Args:
+        tokens (list[Token]): The tokens of a sentence, in order.
+        exact_forms (list[str]): The exact forms of the search.
+
+    Returns:
+        list[int]: The token numbers of the matched tokens, empty if the forms are not found token by token (e.g. if
+            the full-text search split a token).
+    """
+
+    words = [token for token in tokens if token.pos not in ("PUNCT", "SYM")]
+    forms = [form.lower() for form in exact_forms]
+    for start in range(len(words) - len(forms) + 1):
+        if all(
+            word.token.lower() == form
+            for word, form in zip(words[start : start + len(forms)], forms)
+        ):
+            return [word.token_num for word in words[start : start + len(forms)]]
+    return []
+
+
+def _make_row(sentence: Sentence, token_nums: list[int]) -> dict:
+    """Returns the exported fields of a matching sentence.
+
+    Args:
+        sentence (Sentence): The sentence loaded by ``_load_sentences``.
+        token_nums (list[int]): The token numbers of the matched tokens.
+
+    Returns:
+        dict: The fields of the sentence, its document and its annotations.
+    """
+
+    document = sentence.document
+    author = document.author
+    tokens_by_num = {token.token_num: token for token in sentence.export_tokens}
+    return {
+        "document_id": document.pk,
+        "document_title": document.title,
+        "author": author.name if author else None,
+        "gender": author.gender if author else None,
+        "language_background": author.language_background if author else None,
+        "dominant_language": author.dominant_language if author else None,
+        "language_level": document.language_level,
+        "date": document.date,
+        "genre": document.genre,
+        "oral": document.oral,
+        "sentence_id": sentence.pk,
+        "sentence_number": sentence.number,
+        "text": sentence.text,
+        "correction": sentence.get_correction(),
+        "alt_correction": sentence.get_correction(alt=True),
+        "matched_token_nums": list(token_nums),
+        "matched_words": [
+            tokens_by_num[num].token for num in token_nums if num in tokens_by_num
+        ],
+        "annotations": [
+            {
+                "start": annotation.start,
+                "end": annotation.end,
+                "orig_text": annotation.orig_text,
+                "replacement": annotation.replacement,
+                "error_tags": annotation.error_tags or [],
+                "alt": annotation.alt,
+                "user": annotation.user.username,
+            }
+            for annotation in sentence.annotation_set.all()
+        ],
+    }
+
+
+def _make_csv_row(row: dict) -> list:
+    """Returns the CSV cells of an exported sentence, with the lists joined by spaces and the annotations in JSON."""
+
+    cells = dict(row)
+    cells["matched_token_nums"] = " ".join(map(str, row["matched_token_nums"]))
+    cells["matched_words"] = " ".join(row["matched_words"])
+    cells["annotations"] = json.dumps(row["annotations"], ensure_ascii=False)
+    return [cells[column] for column in CSV_COLUMNS]
+
+
+def _write_csv_rows(rows) -> str:
+    """Returns CSV rows as a string."""
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _make_conllu_sentence(row: dict, sentence: Sentence) -> str:
+    """Returns a sentence in the CoNLL-U format.
+
+    The document and the match are described in the comments, the token lines are built from the Token fields. The
+    syntax columns are empty, as the syntax is not stored. The MISC column marks the matched tokens (Match=Yes), the
+    error tags of the annotations of the tokens (ErrorTags) and the tokens not followed by a space (SpaceAfter=No).
+
+    Args:
+        row (dict): The exported fields of the sentence, see ``_make_row``.
+        sentence (Sentence): The sentence loaded by ``_load_sentences``.
+
+    Returns:
+        str: The sentence block, ending with an empty line.
+    """
+
+    lines = [
+        f"# sent_id = {row['sentence_id']}",
+        f"# doc_id = {row['document_id']}",
+        f"# sentence_number = {row['sentence_number']}",
+        f"# text = {row['text']}",
+        f"# correction = {row['correction']}",
+        f"# matched_token_nums = {' '.join(map(str, row['matched_token_nums']))}",
+    ]
+    matched = set(row["matched_token_nums"])
+    tokens = sentence.export_tokens
+    for index, token in enumerate(tokens):
+        feats = "|".join(
+            f"{feature}={getattr(token, field)}"
+            for feature, field in _UD_FEATURES.items()
+            if getattr(token, field)
+        )
+        misc = []
+        if token.token_num in matched:
+            misc.append("Match=Yes")
+        if token.export_error_tags:
+            misc.append(f"ErrorTags={','.join(sorted(token.export_error_tags))}")
+        if index + 1 < len(tokens) and tokens[index + 1].start == token.end:
+            misc.append("SpaceAfter=No")
+        lines.append(
+            "\t".join(
+                [
+                    str(token.token_num),
+                    token.token,
+                    token.lemma or "_",
+                    token.pos or "_",
+                    "_",
+                    feats or "_",
+                    "_",
+                    "_",
+                    "_",
+                    "|".join(misc) or "_",
+                ]
+            )
+        )
+    return "\n".join(lines) + "\n\n"
@@ -1,3 +1,7 @@
+# error tag matching the tokens with any error tag
+ANY_ERROR = "*"
+
+
 class TokenSearchSequence:
     """Sequence of tokens for lexico-grammatical searches, their features and distances between them.
 
@@ -21,7 +25,8 @@ class TokenSearchSequence:
         lexes (list[list[str]]): Lists of Universal Dependencies part-of-speech tags for each wordform.
         grammars (list[list[tuple[str, str]]]): Lists of tuples with feature-value pairs of Universal Dependencies
             grammatical features for each wordform.
-        errors (list[list[str]]): Lists of RLC error tags for each wordform.
+        errors (list[list[str]]): Lists of RLC error tags for each wordform. A list containing ``ANY_ERROR`` matches
+            the tokens with any error tag.
     """
 
     def __init__(
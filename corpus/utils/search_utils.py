@@ -1,23 +1,37 @@
 """Utility functions for both search types (exact match and lexico-grammatical search)."""
 
+import asyncio
+import base64
+import hashlib
 import json
+import weakref
+from collections.abc import Iterator
+from itertools import islice
 
+from django.conf import settings
 from django.contrib.postgres.search import SearchQuery, SearchRank
-from django.db.models import Q, Count, QuerySet
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Q, Count, QuerySet, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponseBadRequest
 from django.shortcuts import render
 
 from corpus.models import (
     Document,
+    DocumentStats,
     Sentence,
     Token,
     Author,
 )
-from .lexgram_utils import lexgram_find_sentences
+from .async_utils import get_loop_semaphore
+from .lexgram_sql import compile_lexgram_query, lexgram_query_sentences
 from .search_helper_classes import TokenSearchSequence, SubcorpusSettings
+from .stats_utils import get_corpus_stats
+from .token_index import get_token_index
 
-
-# TODO implement matching_words correctly
-# TODO implement paginated search
+# the semaphores limiting the searches by event loop, see get_search_semaphore
+_search_semaphores = weakref.WeakKeyDictionary()
 
 
 def get_search_stats(
@@ -36,15 +50,13 @@ def get_search_stats(
     Returns:
         Dictionary of search statistics.
     """
-    total_documents = Document.objects.count()
-    total_sentences = Sentence.objects.count()
-    total_tokens = Token.objects.count()
+    corpus_stats = get_corpus_stats()
     found_documents_ids = sentences.values_list("document_id", flat=True).distinct()
     found_sentences_count = sentences.count()
     return {
-        "total_documents": total_documents,
-        "total_sentences": total_sentences,
-        "total_tokens": total_tokens,
+        "total_documents": corpus_stats.documents,
+        "total_sentences": corpus_stats.sentences,
+        "total_tokens": corpus_stats.tokens,
         "subcorpus_documents": subcorpus_stats["documents"],
         "subcorpus_sentences": subcorpus_stats["sentences"],
         "subcorpus_tokens": subcorpus_stats["tokens"],
@@ -53,55 +65,97 @@ def get_search_stats(
     }
 
 
+def encode_search_cursor(document_id: int, number: int) -> str:
+    """Encodes the position of a sentence in the search results into an opaque cursor.
+
+    Search results are ordered by ``(-document_id, number)``, so a sentence position is
+    identified by its document id and its number in the document.
+
+    Args:
+        document_id (int): The primary key of the document of the sentence.
+        number (int): The position of the sentence in the document.
+
+    Returns:
+        str: The search cursor.
+    """
+
+    return base64.urlsafe_b64encode(f"{document_id}:{number}".encode()).decode()
+
+
+def decode_search_cursor(cursor: str | None) -> tuple[int, int] | None:
+    """Decodes a search cursor created by ``encode_search_cursor``.
+
+    Args:
+        cursor (str | None): The search cursor. An empty value (or zero, sent by older
+            clients) denotes the first page of the search results.
+
+    Returns:
+        tuple[int, int] | None: The document id and the number of the last sentence of
+            the previous page, or None for the first page.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+
+    if not cursor or cursor == "0":
+        return None
+    try:
+        document_id, number = base64.urlsafe_b64decode(str(cursor)).decode().split(":")
+        return int(document_id), int(number)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid search cursor: {cursor!r}") from e
+
+
 def preprocess_exact_search(
     json_body: str,
-) -> tuple[list[str], SubcorpusSettings, int, int]:
+) -> tuple[list[str], SubcorpusSettings, int, tuple[int, int] | None]:
     """Preprocesses the JSON body of an exact search request.
 
     This function parses the JSON body of an exact search request and returns the
     normalized search query string, the evaluated SubcorpusSettings object, the page
-    size, and the chunk start (the number of already processed sentences).
+    size, and the decoded search cursor (the position of the last sentence of the
+    previous page, passed in the chunk_start field).
 
     Args:
         json_body: JSON body of the request.
 
     Returns:
         Tuple of the normalized search query string, the evaluated SubcorpusSettings
-        object, the page size, and the chunk start.
+        object, the page size, and the decoded search cursor.
     """
     data = json.loads(json_body)
     subcorpus_settings = _create_subcorpus_settings(data.get("settings", {}))
 
     page_size = int(data.get("page_size", 10))
-    chunk_start = int(data.get("chunk_start", 1000))
+    cursor = decode_search_cursor(data.get("chunk_start"))
 
     search_query = data.get("query", "").strip().split()
 
-    return search_query, subcorpus_settings, page_size, chunk_start
+    return search_query, subcorpus_settings, page_size, cursor
 
 
 def preprocess_lexgram_search(
     json_body: str,
-) -> tuple[TokenSearchSequence, SubcorpusSettings, int, int]:
+) -> tuple[TokenSearchSequence, SubcorpusSettings, int, tuple[int, int] | None]:
     """Preprocesses the JSON body of a lexico-grammatical search request.
 
     This function parses the JSON body of a lexico-grammatical search request and
     returns the evaluated TokenSearchSequence object, the evaluated SubcorpusSettings
-    object, the page size, and the chunk start (the number of already processed
-    sentences).
+    object, the page size, and the decoded search cursor (the position of the last
+    sentence of the previous page, passed in the chunk_start field).
 
     Args:
         json_body: JSON body of the request.
 
     Returns:
         Tuple of the evaluated TokenSearchSequence object, the evaluated
-        SubcorpusSettings object, the page size, and the chunk start.
+        SubcorpusSettings object, the page size, and the decoded search cursor.
     """
     data = json.loads(json_body)
     subcorpus_settings = _create_subcorpus_settings(data.get("settings", {}))
 
     page_size = int(data.get("page_size", 10))
-    chunk_start = int(data.get("chunk_start", 1000))
+    cursor = decode_search_cursor(data.get("chunk_start"))
 
     tokens = data.get("tokens", {})
     wordforms = tokens["wordform[]"]
@@ -129,167 +183,351 @@ def preprocess_lexgram_search(
         errors=errors,
     )
 
-    return search_seq, subcorpus_settings, page_size, chunk_start
+    return search_seq, subcorpus_settings, page_size, cursor
 
 
 def perform_exact_search(
     exact_forms: list[str],
     subcorpus_settings: SubcorpusSettings,
     page_size: int,
-    chunk_start=0,
-) -> tuple[QuerySet[Sentence], list[str], dict[str, int], int]:
+    cursor: tuple[int, int] | None = None,
+) -> tuple[QuerySet[Sentence], list[str], dict[str, int], str | None]:
     """Performs an exact search, ignoring case and punctuation.
 
     This function executes a word-for-word search within a specified subcorpus, returning a set of sentences that
-    exactly match the given search terms. The search is paginated and returns search results starting from the
-    specified chunk start. The search ignores case and punctuation/symbols between tokens.
+    exactly match the given search terms. The search is paginated with a keyset cursor and returns search results
+    following the specified cursor. The search ignores case and punctuation/symbols between tokens.
 
     Args:
         exact_forms (list[str]): A list of strings representing the exact word forms to search for.
         subcorpus_settings (SubcorpusSettings): The settings of the subcorpus to search in.
         page_size (int): The number of search results to return per page.
-        chunk_start (int, optional): The starting index of the search results chunk. Defaults to zero.
+        cursor (tuple[int, int] | None, optional): The document id and the number of the last sentence of the
+            previous page. Defaults to None (the first page).
 
     Returns:
-        tuple[QuerySet[Sentence], list[str], dict[str, int], int]: A tuple containing:
+        tuple[QuerySet[Sentence], list[str], dict[str, int], str | None]: A tuple containing:
             - QuerySet[Sentence]: A QuerySet of Sentence objects matching the search criteria.
             - list[str]: The list of exact forms to highlight in the search results.
             - dict[str, int]: The search statistics (corpus, user subcorpus, and search results).
-            - int: The starting index of the next chunk of search results.
+            - str | None: The encoded cursor of the next chunk of search results.
     """
     sentences_queryset, subcorpus_stats = _get_subcorpus_with_stats(subcorpus_settings)
 
-    sentences_queryset = sentences_queryset.order_by("-document_id", "number")
+    sentences_queryset = _filter_after_cursor(sentences_queryset, cursor).order_by(
+        "-document_id", "number"
+    )
 
-    # prepare the PostgreSQL full-text search query
-    fts_query_string = " <-> ".join(exact_forms)
-    fts_query = SearchQuery(fts_query_string, config="simple", search_type="phrase")
+    fts_query = _get_exact_search_query(exact_forms)
 
-    matching_sentences_ids = (
+    matching_sentences = list(
         sentences_queryset.annotate(rank=SearchRank("search_vector", fts_query))
         .filter(search_vector=fts_query)
-        .values_list("id", flat=True)[chunk_start : chunk_start + page_size]
+        .values_list("id", "document_id", "number")[:page_size]
     )
 
-    matching_sentences_chunk = Sentence.objects.filter(id__in=matching_sentences_ids)
+    matching_sentences_chunk = Sentence.objects.filter(
+        id__in=[sentence_id for sentence_id, _, _ in matching_sentences]
+    )
 
-    new_chunk_start = chunk_start + page_size
+    new_cursor = (
+        encode_search_cursor(*matching_sentences[-1][1:])
+        if matching_sentences
+        else None
+    )
 
-    return matching_sentences_chunk, list(exact_forms), subcorpus_stats, new_chunk_start
+    return matching_sentences_chunk, list(exact_forms), subcorpus_stats, new_cursor
 
 
 def perform_lexgram_search(
     search_seq: TokenSearchSequence,
     subcorpus_settings: SubcorpusSettings,
     page_size: int,
-    chunk_start=0,
-) -> tuple[QuerySet[Sentence], list[str], dict[str, int], int]:
+    cursor: tuple[int, int] | None = None,
+) -> tuple[QuerySet[Sentence], list[str], dict[str, int], str | None]:
     """Performs a lexico-grammatical search of wordforms with specified attributes and distances.
 
     This function executes a lexico-grammatical search within a specified subcorpus, returning a set of sentences that
     contain the specified token sequence with the specified attributes and distances between tokens. The search is
-    paginated and looks for sentence matches starting from the specified chunk start.
+    paginated with a keyset cursor and returns search results following the specified cursor. Depending on the
+    ``LEXGRAM_SEARCH_ENGINE`` setting, the whole page is found either with a single SQL query (``"sql"``, see
+    ``lexgram_sql``) or in the in-memory token index (``"index"``, see ``token_index``).
 
     When searching for a sequence of tokens, punctuation and symbol tokens are ignored.
 
-    Note that the chunk_start is handled differently for lexico-grammatical searches than for exact searches. Here, it
-    is used to skip the first chunk_start sentences in the subcorpus and not in the search results.
-
     For more information on how the search request looks like, refer to the ```TokenSearchSequence``` documentation.
 
     Args:
         search_seq (TokenSearchSequence): A sequence of tokens with specified attributes for the search.
         subcorpus_settings (SubcorpusSettings): The settings of the subcorpus to search in.
         page_size (int): The number of search results to return per page.
-        chunk_start (int, optional): The starting index of the searched sentences in the subcorpus. Defaults to zero.
+        cursor (tuple[int, int] | None, optional): The document id and the number of the last sentence of the
+            previous page. Defaults to None (the first page).
 
     Returns:
-        tuple[QuerySet[Sentence], list[str], dict[str, int], int]: A tuple containing:
+        tuple[QuerySet[Sentence], list[str], dict[str, int], str | None]: A tuple containing:
             - QuerySet[Sentence]: A QuerySet of Sentence objects matching the search criteria.
-            - list[str]: The list of lemmas to highlight in the search results.
+            - list[str]: The list of matched wordforms to highlight in the search results.
             - dict[str, int]: The search statistics (corpus, user subcorpus, and search results).
-            - int: The starting index of the next chunk of search results.
+            - str | None: The encoded cursor of the next chunk of search results.
     """
     search_seq.wordforms = [word.lower() for word in search_seq.wordforms]
 
     sentences, subcorpus_stats = _get_subcorpus_with_stats(subcorpus_settings)
-    sentences = (
-        sentences.filter(lemmas__contains=search_seq.wordforms)
-        .order_by("-document_id", "number")
-        .only("id")
-    )
 
-    matching_sentence_pks, matching_words, processed_count = lexgram_find_sentences(
-        sentences, search_seq, chunk_start, page_size
+    if settings.LEXGRAM_SEARCH_ENGINE == "index":
+        document_ids = _get_subcorpus_document_ids(subcorpus_settings)
+        matches = get_token_index().search(
+            search_seq, document_ids, 0, page_size, after=cursor
+        )
+    else:
+        sentences = _filter_after_cursor(
+            _filter_required_lemmas(sentences, search_seq), cursor
+        )
+        matches = lexgram_query_sentences(sentences, search_seq, 0, page_size)
+
+    matching_words = {word for match in matches for word in match.words}
+    page_sentences = Sentence.objects.filter(
+        pk__in=[match.sentence_id for match in matches]
+    )
+    new_cursor = (
+        encode_search_cursor(matches[-1].document_id, matches[-1].number)
+        if matches
+        else None
     )
 
-    page_sentences = Sentence.objects.filter(pk__in=matching_sentence_pks)
-    return page_sentences, list(matching_words), subcorpus_stats, processed_count
+    return page_sentences, list(matching_words), subcorpus_stats, new_cursor
+
+
+def iter_search_matches(
+    search_type: str,
+    search_query: TokenSearchSequence | list[str],
+    subcorpus_settings: SubcorpusSettings,
+    batch_size: int,
+) -> Iterator[list[tuple[int, list[int] | None]]]:
+    """Yields all sentences matching a search in batches, for exporting the search results.
+
+    The sentences are found with a single query in the ``(-document_id, number)`` order, and read with a server-side
+    cursor in batches of batch_size, so that the whole result set is never held in memory. Lexico-grammatical searches
+    always run on the SQL engine (see ``lexgram_sql``), whatever the ``LEXGRAM_SEARCH_ENGINE`` setting.
+
+    Args:
+        search_type: The type of the search ("exact" or "lexgram").
+        search_query: The TokenSearchSequence object for lexico-grammatical searches or the list of exact forms.
+        subcorpus_settings: The settings of the subcorpus to search in.
+        batch_size: The number of sentences read at a time.
+
+    Yields:
+        list[tuple[int, list[int] | None]]: Lists of the ids of the matching sentences with the ``token_num`` of their
+            matched tokens. The token numbers are None for exact searches, whose matches are not located by the full-text
+            search.
+    """
+    subcorpus = Document.objects.filter(_get_subcorpus_query(subcorpus_settings))
+    sentences = Sentence.objects.filter(document__in=subcorpus)
+
+    if search_type == "lexgram":
+        search_query.wordforms = [word.lower() for word in search_query.wordforms]
+        sql, params = compile_lexgram_query(
+            _filter_required_lemmas(sentences, search_query), search_query, 0, None
+        )
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(sql, params)
+            while rows := cursor.fetchmany(batch_size):
+                yield [(row[0], row[3]) for row in rows]
+    else:  # "exact"
+        sentence_ids = (
+            sentences.filter(search_vector=_get_exact_search_query(search_query))
+            .order_by("-document_id", "number")
+            .values_list("id", flat=True)
+            .iterator(chunk_size=batch_size)
+        )
+        while batch := list(islice(sentence_ids, batch_size)):
+            yield [(sentence_id, None) for sentence_id in batch]
+
+
+def get_search_semaphore() -> asyncio.Semaphore:
+    """Returns the semaphore limiting the searches run at a time by the process.
+
+    The searches are mostly CPU-bound, so running more than SEARCH_CONCURRENCY of them
+    at a time only makes each slower. The async views wait for the semaphore in the
+    event loop, so the waiting searches hold no thread or database connection. The
+    semaphore belongs to the running event loop (see ``get_loop_semaphore``).
+
+    Returns:
+        asyncio.Semaphore: The semaphore shared by the search views of the event loop.
+    """
+
+    return get_loop_semaphore(_search_semaphores, settings.SEARCH_CONCURRENCY)
 
 
 def render_search_results(request, search_type):
     """Execute the search and render the results.
 
     This function executes the search of specified type (exact or lexico-grammatical) with the parameters specified in
-    the POST request body and renders the search results. If the chunk_start parameter is non-zero, the function
-    renders the next chunk of search results, otherwise it renders the initial search results with the first chunk.
+    the POST request body and renders the search results. If the chunk_start parameter contains a search cursor, the
+    function renders the next chunk of search results, otherwise it renders the initial search results with the first
+    chunk.
+
+    Search results are cached in the "search" cache (see ``_get_search_cache_key``), so repeated requests for the same
+    page only load the sentences to render.
 
     Args:
         request: The HTTP request object.
         search_type: The type of the search ("exact" or "lexgram").
 
     Returns:
-        HttpResponse: The HTTP response object containing the rendered search results.
+        HttpResponse: The HTTP response object containing the rendered search results,
+            or HttpResponseBadRequest if the request body or the search cursor is malformed.
     """
     body = request.body
 
-    if search_type == "lexgram":
-        (
-            search_sequence,
-            subcorpus_settings,
-            page_size,
-            chunk_start,
-        ) = preprocess_lexgram_search(body)
-
-        sentences, words, subcorpus_stats, processed_count = perform_lexgram_search(
-            search_sequence, subcorpus_settings, page_size, chunk_start
-        )
-    else:  # "exact"
-        (
-            search_query,
-            subcorpus_settings,
-            page_size,
-            chunk_start,
-        ) = preprocess_exact_search(body)
-
-        sentences, words, subcorpus_stats, processed_count = perform_exact_search(
-            search_query, subcorpus_settings, page_size, chunk_start
-        )
-
-    stats = get_search_stats(sentences, subcorpus_stats)
+    try:
+        if search_type == "lexgram":
+            (
+                search_query,
+                subcorpus_settings,
+                page_size,
+                cursor,
+            ) = preprocess_lexgram_search(body)
+        else:  # "exact"
+            (
+                search_query,
+                subcorpus_settings,
+                page_size,
+                cursor,
+            ) = preprocess_exact_search(body)
+    except (KeyError, TypeError, ValueError) as e:
+        # a malformed body or search cursor
+        return HttpResponseBadRequest(f"Invalid search request: {e}")
+
+    cache = caches["search"]
+    cache_key = _get_search_cache_key(
+        search_type, search_query, subcorpus_settings, page_size, cursor
+    )
+    results = cache.get(cache_key)
+    if results is None:
+        if search_type == "lexgram":
+            sentences, words, subcorpus_stats, next_cursor = perform_lexgram_search(
+                search_query, subcorpus_settings, page_size, cursor
+            )
+        else:  # "exact"
+            sentences, words, subcorpus_stats, next_cursor = perform_exact_search(
+                search_query, subcorpus_settings, page_size, cursor
+            )
+        results = {
+            "sentence_ids": list(
+                sentences.order_by("-document_id", "number").values_list(
+                    "id", flat=True
+                )
+            ),
+            "words": words,
+            "stats": get_search_stats(sentences, subcorpus_stats),
+            "next_cursor": next_cursor,
+        }
+        cache.set(cache_key, results)
+
+    sentences_by_id = Sentence.objects.in_bulk(results["sentence_ids"])
+    ordered_sentences = [
+        sentences_by_id[sentence_id]
+        for sentence_id in results["sentence_ids"]
+        if sentence_id in sentences_by_id
+    ]
 
     template = "partials/search/search_results.html"
-    if chunk_start > 0:
+    if cursor is not None:
         template = "partials/search/search_results_sentences.html"
 
-    # evaluate the queryset to apply ordering
-    ordered_sentences = list(sentences.order_by("-document_id", "number"))
-
     return render(
         request,
         template,
         {
             "sentences": ordered_sentences,
-            "stats": stats,
-            "tokens_list": words,
+            "stats": results["stats"],
+            "tokens_list": results["words"],
             "is_authenticated": request.user.is_authenticated,
-            "chunk_start": processed_count,
+            "chunk_start": results["next_cursor"],
             "search_type": search_type,
-            "is_last_chunk": len(ordered_sentences) < page_size,
+            "is_last_chunk": len(results["sentence_ids"]) < page_size,
         },
     )
 
 
+def _get_search_cache_key(
+    search_type: str,
+    search_query: TokenSearchSequence | list[str],
+    subcorpus_settings: SubcorpusSettings,
+    page_size: int,
+    cursor: tuple[int, int] | None,
+) -> str:
+    """Returns the cache key of a search results page.
+
+    The key is a hash of the canonical JSON representation of the parsed search request. It also includes the corpus
+    generation, which is incremented whenever documents, authors or annotations change, so that cached results are
+    never stale.
+
+    Args:
+        search_type: The type of the search ("exact" or "lexgram").
+        search_query: The TokenSearchSequence object for lexico-grammatical searches or the list of exact forms.
+        subcorpus_settings: The settings of the subcorpus to search in.
+        page_size: The number of search results per page.
+        cursor: The decoded search cursor.
+
+    Returns:
+        str: The cache key.
+    """
+
+    if isinstance(search_query, TokenSearchSequence):
+        query = vars(search_query) | {
+            "wordforms": [word.lower() for word in search_query.wordforms]
+        }
+    else:
+        query = [form.lower() for form in search_query]
+
+    request_data = {
+        "type": search_type,
+        "query": query,
+        "settings": vars(subcorpus_settings),
+        "page_size": page_size,
+        "cursor": cursor,
+        "generation": get_corpus_stats().generation,
+    }
+    canonical_json = json.dumps(request_data, sort_keys=True, ensure_ascii=False)
+    return "search:" + hashlib.sha256(canonical_json.encode()).hexdigest()
+
+
+def _get_exact_search_query(exact_forms: list[str]) -> SearchQuery:
+    """Returns the PostgreSQL full-text search query of an exact search.
+
+    Args:
+        exact_forms: The exact word forms to search for.
+
+    Returns:
+        SearchQuery: The phrase query of the forms.
+    """
+
+    fts_query_string = " <-> ".join(exact_forms)
+    return SearchQuery(fts_query_string, config="simple", search_type="phrase")
+
+
+def _filter_required_lemmas(
+    sentences: QuerySet[Sentence], search_seq: TokenSearchSequence
+) -> QuerySet[Sentence]:
+    """Filters sentences containing all lemmas of the search sequence, using the GIN index of the sentence lemmas.
+
+    Args:
+        sentences: QuerySet of Sentence objects.
+        search_seq: The search sequence with lowercased wordforms.
+
+    Returns:
+        QuerySet[Sentence]: The filtered QuerySet of Sentence objects.
+    """
+
+    required_lemmas = [word for word in search_seq.wordforms if word]
+    if required_lemmas:
+        sentences = sentences.filter(lemmas__contains=required_lemmas)
+    return sentences
+
+
 def _parse_date(date_str: str | None) -> int | None:
     """Parses a date string (start/end year) into an integer.
 
@@ -380,19 +618,48 @@ def _create_subcorpus_settings(settings: dict) -> SubcorpusSettings:
     )
 
 
-def _get_subcorpus_with_stats(
-    subcorpus_settings: SubcorpusSettings,
-) -> tuple[QuerySet[Sentence], dict[str, int]]:
-    """Returns sentences found in the user-defined subcorpus and the subcorpus statistics.
+def _filter_after_cursor(
+    sentences: QuerySet[Sentence], cursor: tuple[int, int] | None
+) -> QuerySet[Sentence]:
+    """Filters sentences following the search cursor in the ``(-document_id, number)`` order.
+
+    The upper bound on the document id lets PostgreSQL seek directly to the cursor position in the
+    ``(document_id DESC, number)`` sentence index, so that later pages cost the same as the first one.
+
+    Args:
+        sentences: QuerySet of Sentence objects.
+        cursor: The document id and the number of the last sentence of the previous page, or None.
+
+    Returns:
+        QuerySet[Sentence]: The filtered QuerySet of Sentence objects.
+    """
+
+    if cursor is None:
+        return sentences
+    document_id, number = cursor
+    return sentences.filter(
+        Q(document_id__lte=document_id)
+        & (Q(document_id__lt=document_id) | Q(number__gt=number))
+    )
+
+
+def _get_subcorpus_query(
+    subcorpus_settings: SubcorpusSettings, author_prefix: str = "author__"
+) -> Q:
+    """Returns the filter of the documents found in the user-defined subcorpus.
 
     Args:
         subcorpus_settings: The settings of the subcorpus to search in.
+        author_prefix: The prefix of the author fields. Use the default value to filter Document objects and an empty
+            string to filter DocumentStats objects, where the author facets are denormalized.
 
     Returns:
-        tuple[QuerySet[Sentence], dict[str, int]]: A tuple containing:
-            - QuerySet[Sentence]: A QuerySet of Sentence objects in the user-defined subcorpus.
-            - dict[str, int]: The subcorpus statistics (documents, sentences, and tokens).
+        Q: The filter of the subcorpus documents, empty if the subcorpus is the whole corpus.
     """
+    gender_field = f"{author_prefix}gender"
+    background_field = f"{author_prefix}language_background"
+    languages_field = f"{author_prefix}dominant_language__in"
+
     query = Q()
     if subcorpus_settings.date_from:
         query &= Q(date__gte=subcorpus_settings.date_from) & ~Q(date__isnull=True)
@@ -401,37 +668,86 @@ def _get_subcorpus_with_stats(
         query &= Q(date__lte=subcorpus_settings.date_to) & ~Q(date__isnull=True)
 
     if subcorpus_settings.gender:
-        query &= Q(author__gender=subcorpus_settings.gender)
+        query &= Q(**{gender_field: subcorpus_settings.gender})
 
     if subcorpus_settings.oral:
         query &= Q(oral=subcorpus_settings.oral)
 
     if subcorpus_settings.language_background:
-        query &= Q(author__language_background=subcorpus_settings.language_background)
+        query &= Q(**{background_field: subcorpus_settings.language_background})
 
     if subcorpus_settings.dominant_languages:
-        query &= Q(author__dominant_language__in=subcorpus_settings.dominant_languages)
+        query &= Q(**{languages_field: subcorpus_settings.dominant_languages})
 
     if subcorpus_settings.language_level:
         query &= Q(language_level__in=subcorpus_settings.language_level)
 
-    subcorpus = Document.objects.filter(query)
+    return query
 
-    document_count = subcorpus.aggregate(Count("id"))["id__count"]
-    sentence_count = Sentence.objects.filter(document__in=subcorpus).aggregate(
-        Count("id")
-    )["id__count"]
-    token_count = Token.objects.filter(document__in=subcorpus).aggregate(Count("id"))[
-        "id__count"
-    ]
 
-    subcorpus_stats = {
-        "documents": document_count,
-        "sentences": sentence_count,
-        "tokens": token_count,
-    }
+def _get_subcorpus_document_ids(
+    subcorpus_settings: SubcorpusSettings,
+) -> list[int] | None:
+    """Returns primary keys of the documents found in the user-defined subcorpus.
+
+    Args:
+        subcorpus_settings: The settings of the subcorpus to search in.
+
+    Returns:
+        list[int] | None: The primary keys of the subcorpus documents, or None if the subcorpus is the whole corpus.
+    """
+    query = _get_subcorpus_query(subcorpus_settings, author_prefix="")
+    if not query:
+        return None
+    return list(
+        DocumentStats.objects.filter(query).values_list("document_id", flat=True)
+    )
+
+
+def _get_subcorpus_stats(subcorpus_settings: SubcorpusSettings) -> dict[str, int]:
+    """Returns the statistics of the user-defined subcorpus.
+
+    The statistics are evaluated from the precomputed document statistics with a single aggregate query, or taken from
+    the corpus statistics if the subcorpus is the whole corpus.
+
+    Args:
+        subcorpus_settings: The settings of the subcorpus to search in.
+
+    Returns:
+        dict[str, int]: The subcorpus statistics (documents, sentences, and tokens).
+    """
+    query = _get_subcorpus_query(subcorpus_settings, author_prefix="")
+    if not query:
+        corpus_stats = get_corpus_stats()
+        return {
+            "documents": corpus_stats.documents,
+            "sentences": corpus_stats.sentences,
+            "tokens": corpus_stats.tokens,
+        }
+
+    return DocumentStats.objects.filter(query).aggregate(
+        documents=Count("document_id"),
+        sentences=Coalesce(Sum("sentence_count"), 0),
+        tokens=Coalesce(Sum("token_count"), 0),
+    )
+
+
+def _get_subcorpus_with_stats(
+    subcorpus_settings: SubcorpusSettings,
+) -> tuple[QuerySet[Sentence], dict[str, int]]:
+    """Returns sentences found in the user-defined subcorpus and the subcorpus statistics.
+
+    Args:
+        subcorpus_settings: The settings of the subcorpus to search in.
+
+    Returns:
+        tuple[QuerySet[Sentence], dict[str, int]]: A tuple containing:
+            - QuerySet[Sentence]: A QuerySet of Sentence objects in the user-defined subcorpus.
+            - dict[str, int]: The subcorpus statistics (documents, sentences, and tokens).
+    """
+    subcorpus = Document.objects.filter(_get_subcorpus_query(subcorpus_settings))
 
     return (
         Sentence.objects.filter(document__in=subcorpus),
-        subcorpus_stats,
+        _get_subcorpus_stats(subcorpus_settings),
     )
@@ -0,0 +1,153 @@
+"""Utility functions for finding misspelled tokens with the shared verdict table.
+
+The verdicts of the spelling dictionary are cached by token form in the
+``SpellingVerdict`` table, so a form is checked once for the whole corpus. A verdict
+is recomputed only when the dictionary version (see ``get_dictionary_version``)
+changes.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+
+from rlc_new import nlp
+
+# parts of speech of the tokens that are not spell-checked
+SKIPPED_POS = ["PUNCT", "SYM"]
+
+
+@lru_cache(maxsize=None)
+def get_dictionary_version():
+    """Returns the version of the spelling dictionary the verdicts are valid for.
+
+    The version combines the SPELLING_DICTIONARY_VERSION setting, to be changed when
+    the dictionary files are updated, with the provider and language of the dictionary.
+    It is computed once per process, since the dictionary is loaded once too, so the
+    requests answered from the ETag of the workspace do not load the dictionary.
+    """
+    dictionary = nlp.get_spelling_dictionary()
+    return (
+        f"{settings.SPELLING_DICTIONARY_VERSION}:"
+        f"{dictionary.provider.name}:{dictionary.tag}"
+    )
+
+
+def get_misspelled_forms(forms, verdicts=None):
+    """Returns the token forms that are not in the spelling dictionary.
+
+    The verdicts are read from the verdict table, and the forms without a verdict of
+    the current dictionary version are checked and saved.
+
+    Args:
+        forms: Iterable of token forms.
+        verdicts: Dictionary of the verdicts of the current version already read for
+            some of the forms, the others are read from the table.
+
+    Returns:
+        Set of the misspelled forms.
+    """
+    SpellingVerdict = apps.get_model("corpus", "SpellingVerdict")
+
+    forms = set(forms)
+    version = get_dictionary_version()
+    verdicts = dict(verdicts or {})
+    if forms - verdicts.keys():
+        verdicts.update(
+            SpellingVerdict.objects.filter(
+                form__in=forms - verdicts.keys(), version=version
+            ).values_list("form", "correct")
+        )
+
+    missing = forms - verdicts.keys()
+    if missing:
+        dictionary = nlp.get_spelling_dictionary()
+        new_verdicts = [
+            SpellingVerdict(form=form, version=version, correct=dictionary.check(form))
+            for form in sorted(missing)
+        ]
+        # the verdicts of other versions are replaced
+        SpellingVerdict.objects.bulk_create(
+            new_verdicts,
+            update_conflicts=True,
+            unique_fields=["form"],
+            update_fields=["version", "correct"],
+        )
+        verdicts.update((verdict.form, verdict.correct) for verdict in new_verdicts)
+
+    return {form for form in forms if not verdicts[form]}
+
+
+def get_sentence_errors(sentence_ids):
+    """Returns the misspelled tokens of sentences, skipping punctuation and symbols.
+
+    The tokens are read with their verdicts in a single query, the forms without a
+    verdict of the current dictionary version are checked and saved.
+
+    Args:
+        sentence_ids: List of sentence ids.
+
+    Returns:
+        Dictionary of the lists of misspelled token forms by sentence id, in the order
+        of the tokens. Sentences without misspelled tokens are included with empty
+        lists.
+    """
+    SpellingVerdict = apps.get_model("corpus", "SpellingVerdict")
+    Token = apps.get_model("corpus", "Token")
+
+    tokens = list(
+        Token.objects.filter(sentence_id__in=sentence_ids)
+        .exclude(pos__in=SKIPPED_POS)
+        .annotate(
+            correct=Subquery(
+                SpellingVerdict.objects.filter(
+                    form=OuterRef("token"), version=get_dictionary_version()
+                ).values("correct")
+            )
+        )
+        .order_by("sentence_id", "token_num")
+        .values_list("sentence_id", "token", "correct")
+    )
+    misspelled = get_misspelled_forms(
+        (form for _, form, _ in tokens),
+        {form: correct for _, form, correct in tokens if correct is not None},
+    )
+
+    errors = {sentence_id: [] for sentence_id in sentence_ids}
+    for sentence_id, form, _ in tokens:
+        if form in misspelled:
+            errors[sentence_id].append(form)
+    return errors
+
+
+def refresh_spelling_verdicts(batch_size=10000):
+    """Computes the verdicts of all token forms of the corpus missing for the current
+    dictionary version and deletes the verdicts of other versions.
+
+    Args:
+        batch_size: The number of forms checked and saved at a time.
+
+    Returns:
+        Tuple of the number of checked forms and the number of deleted verdicts.
+    """
+    SpellingVerdict = apps.get_model("corpus", "SpellingVerdict")
+    Token = apps.get_model("corpus", "Token")
+
+    version = get_dictionary_version()
+    forms = list(
+        Token.objects.exclude(pos__in=SKIPPED_POS)
+        .exclude(
+            token__in=SpellingVerdict.objects.filter(version=version).values("form")
+        )
+        .order_by("token")
+        .values_list("token", flat=True)
+        .distinct()
+    )
+    for start in range(0, len(forms), batch_size):
+        get_misspelled_forms(forms[start : start + batch_size])
+
+    deleted, _ = SpellingVerdict.objects.exclude(version=version).delete()
+    return len(forms), deleted
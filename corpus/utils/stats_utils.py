@@ -0,0 +1,415 @@
+"""Utility functions for maintaining the precomputed document, corpus and statistics page
+statistics.
+
+Type hints are omitted in this module because Django models are not available at import time.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+_CORPUS_STATS_PK = 1
+_STATISTICS_SNAPSHOT_PK = 1
+
+
+def get_corpus_stats():
+    """Returns the statistics of the whole corpus, evaluating them if necessary.
+
+    Returns:
+        CorpusStats object.
+    """
+    CorpusStats = apps.get_model("corpus", "CorpusStats")
+    corpus_stats = CorpusStats.objects.filter(pk=_CORPUS_STATS_PK).first()
+    return corpus_stats or refresh_corpus_stats()
+
+
+def bump_corpus_generation():
+    """Increments the corpus generation, invalidating cached search results.
+
+    The generation is incremented whenever the documents, their authors or annotations
+    change.
+    """
+    _add_to_corpus_stats(documents=0, sentences=0, tokens=0)
+
+
+def update_document_stats(document, sentence_count=None, token_count=None):
+    """Updates the statistics of a document and the corpus statistics.
+
+    Args:
+        document: Document object.
+        sentence_count: The new number of sentences in the document. If None, the
+            previous value is kept.
+        token_count: The new number of tokens in the document. If None, the previous
+            value is kept.
+    """
+    DocumentStats = apps.get_model("corpus", "DocumentStats")
+
+    old_counts = (
+        DocumentStats.objects.filter(document=document)
+        .values_list("sentence_count", "token_count")
+        .first()
+    )
+    old_sentence_count, old_token_count = old_counts or (0, 0)
+    if sentence_count is None:
+        sentence_count = old_sentence_count
+    if token_count is None:
+        token_count = old_token_count
+
+    DocumentStats.objects.update_or_create(
+        document=document,
+        defaults={
+            "sentence_count": sentence_count,
+            "token_count": token_count,
+            **_get_document_facets(document),
+        },
+    )
+
+    _add_to_corpus_stats(
+        documents=0 if old_counts else 1,
+        sentences=sentence_count - old_sentence_count,
+        tokens=token_count - old_token_count,
+    )
+
+
+def create_documents_stats(documents_counts):
+    """Creates the statistics of new documents in bulk and adds them to the corpus
+    statistics.
+
+    Args:
+        documents_counts: List of tuples of a saved Document object, its number of
+            sentences and its number of tokens.
+    """
+    DocumentStats = apps.get_model("corpus", "DocumentStats")
+
+    DocumentStats.objects.bulk_create(
+        [
+            DocumentStats(
+                document=document,
+                sentence_count=sentence_count,
+                token_count=token_count,
+                **_get_document_facets(document),
+            )
+            for document, sentence_count, token_count in documents_counts
+        ]
+    )
+    _add_to_corpus_stats(
+        documents=len(documents_counts),
+        sentences=sum(counts[1] for counts in documents_counts),
+        tokens=sum(counts[2] for counts in documents_counts),
+    )
+
+
+def remove_document_stats(document):
+    """Deletes the statistics of a document that is being deleted and subtracts them
+    from the corpus statistics.
+
+    Args:
+        document: Document object.
+    """
+    DocumentStats = apps.get_model("corpus", "DocumentStats")
+
+    document_stats = DocumentStats.objects.filter(document=document)
+    counts = document_stats.values_list("sentence_count", "token_count").first()
+    document_stats.delete()
+    if counts:
+        _add_to_corpus_stats(documents=-1, sentences=-counts[0], tokens=-counts[1])
+
+
+def update_author_stats(author):
+    """Updates the denormalized author facets in the statistics of the author's
+    documents.
+
+    Args:
+        author: Author object.
+    """
+    DocumentStats = apps.get_model("corpus", "DocumentStats")
+    DocumentStats.objects.filter(document__author=author).update(
+        gender=author.gender,
+        language_background=author.language_background,
+        dominant_language=author.dominant_language,
+    )
+    bump_corpus_generation()
+
+
+def rebuild_stats():
+    """Recomputes the statistics of all documents and the corpus statistics from
+    scratch.
+
+    Returns:
+        CorpusStats object.
+    """
+    Document = apps.get_model("corpus", "Document")
+    DocumentStats = apps.get_model("corpus", "DocumentStats")
+    Sentence = apps.get_model("corpus", "Sentence")
+    Token = apps.get_model("corpus", "Token")
+
+    sentence_counts = dict(
+        Sentence.objects.values("document_id")
+        .annotate(count=Count("id"))
+        .values_list("document_id", "count")
+        .order_by()
+    )
+    token_counts = dict(
+        Token.objects.values("document_id")
+        .annotate(count=Count("id"))
+        .values_list("document_id", "count")
+        .order_by()
+    )
+
+    documents_stats = [
+        DocumentStats(
+            document_id=document["id"],
+            sentence_count=sentence_counts.get(document["id"], 0),
+            token_count=token_counts.get(document["id"], 0),
+            date=document["date"],
+            oral=document["oral"],
+            language_level=document["language_level"],
+            gender=document["author__gender"],
+            language_background=document["author__language_background"],
+            dominant_language=document["author__dominant_language"],
+        )
+        for document in Document.objects.values(
+            "id",
+            "date",
+            "oral",
+            "language_level",
+            "author__gender",
+            "author__language_background",
+            "author__dominant_language",
+        ).order_by()
+    ]
+
+    DocumentStats.objects.all().delete()
+    DocumentStats.objects.bulk_create(documents_stats, batch_size=1000)
+    return refresh_corpus_stats()
+
+
+def refresh_corpus_stats():
+    """Recomputes the corpus statistics from the document statistics.
+
+    Returns:
+        CorpusStats object.
+    """
+    CorpusStats = apps.get_model("corpus", "CorpusStats")
+    DocumentStats = apps.get_model("corpus", "DocumentStats")
+
+    totals = DocumentStats.objects.aggregate(
+        documents=Count("document_id"),
+        sentences=Coalesce(Sum("sentence_count"), 0),
+        tokens=Coalesce(Sum("token_count"), 0),
+    )
+    corpus_stats, _ = CorpusStats.objects.update_or_create(
+        pk=_CORPUS_STATS_PK, defaults=totals
+    )
+    return corpus_stats
+
+
+def get_statistics_snapshot():
+    """Returns the snapshot of the statistics page, computing it if there is none yet
+    and recomputing it if it is stale (see ``refresh_stale_statistics_snapshot``).
+
+    Returns:
+        StatisticsSnapshot object.
+    """
+    StatisticsSnapshot = apps.get_model("corpus", "StatisticsSnapshot")
+    snapshot = StatisticsSnapshot.objects.filter(pk=_STATISTICS_SNAPSHOT_PK).first()
+    if _is_stale(snapshot):
+        return refresh_statistics_snapshot()
+    return snapshot
+
+
+def refresh_statistics_snapshot():
+    """Recomputes the snapshot of the statistics page.
+
+    Every distribution is taken from one grouped aggregation over all the facets of the
+    documents, sentences, authors or tokens, so the snapshot is computed with four
+    queries. Each distribution is a list of ``[code, count]`` pairs, with None for the
+    objects without the facet.
+
+    Returns:
+        StatisticsSnapshot object.
+    """
+    Author = apps.get_model("corpus", "Author")
+    Document = apps.get_model("corpus", "Document")
+    Sentence = apps.get_model("corpus", "Sentence")
+    StatisticsSnapshot = apps.get_model("corpus", "StatisticsSnapshot")
+    Token = apps.get_model("corpus", "Token")
+
+    # read before the counts, so that changes made meanwhile make the snapshot stale
+    generation = get_corpus_stats().generation
+
+    document_rows = _count_groups(
+        Document.objects,
+        "status",
+        "genre",
+        "author__dominant_language",
+        "author__gender",
+        "author__language_background",
+    )
+    sentence_rows = _count_groups(
+        Sentence.objects, "document__author__dominant_language"
+    )
+    author_rows = _count_groups(
+        Author.objects, "gender", "language_background", "dominant_language", "favorite"
+    )
+    token_rows = _count_groups(
+        Token.objects,
+        "pos",
+        "document__language_level",
+        "document__author__dominant_language",
+    )
+
+    document_statuses = _sum_counts(document_rows, 0)
+    data = {
+        "documents": _sum_counts(document_rows),
+        # every status is shown, including the ones without documents
+        "document_status": [
+            [status, dict(document_statuses).get(status, 0)]
+            for status in Document.StatusChoices.values
+        ],
+        "document_genre": _sum_counts(document_rows, 1),
+        "document_dominant_language": _sum_counts(document_rows, 2),
+        "document_gender": _sum_counts(document_rows, 3),
+        "document_language_background": _sum_counts(document_rows, 4),
+        "sentences": _sum_counts(sentence_rows),
+        "sentence_dominant_language": _sum_counts(sentence_rows, 0),
+        "authors": _sum_counts(author_rows),
+        "favorite_authors": dict(_sum_counts(author_rows, 3)).get(True, 0),
+        "author_gender": _sum_counts(author_rows, 0),
+        "author_language_background": _sum_counts(author_rows, 1),
+        "author_dominant_language": _sum_counts(author_rows, 2),
+        "tokens": _sum_counts(token_rows),
+        "token_pos": _sum_counts(token_rows, 0),
+        "token_language_level": _sum_counts(token_rows, 1),
+        "token_dominant_language": _sum_counts(token_rows, 2),
+    }
+
+    snapshot, _ = StatisticsSnapshot.objects.update_or_create(
+        pk=_STATISTICS_SNAPSHOT_PK, defaults={"data": data, "generation": generation}
+    )
+    return snapshot
+
+
+def refresh_stale_statistics_snapshot():
+    """Recomputes the snapshot of the statistics page if the corpus changed since it was
+    computed, at most once per STATISTICS_REFRESH_INTERVAL seconds.
+
+    Returns:
+        The new StatisticsSnapshot object, or None if the snapshot is up to date or was
+        computed less than STATISTICS_REFRESH_INTERVAL seconds ago.
+    """
+    StatisticsSnapshot = apps.get_model("corpus", "StatisticsSnapshot")
+    snapshot = (
+        StatisticsSnapshot.objects.filter(pk=_STATISTICS_SNAPSHOT_PK)
+        .only("generation", "computed_on")
+        .first()
+    )
+    if not _is_stale(snapshot):
+        return None
+    return refresh_statistics_snapshot()
+
+
+def _is_stale(snapshot):
+    """Checks whether the snapshot of the statistics page should be recomputed.
+
+    A snapshot is stale if there is none or if the corpus changed since it was computed,
+    but it is kept for STATISTICS_REFRESH_INTERVAL seconds after it was computed.
+
+    Args:
+        snapshot: StatisticsSnapshot object or None.
+
+    Returns:
+        True if the snapshot should be recomputed, False otherwise.
+    """
+    if snapshot is None:
+        return True
+    if timezone.now() - snapshot.computed_on < timedelta(
+        seconds=settings.STATISTICS_REFRESH_INTERVAL
+    ):
+        return False
+    return snapshot.generation != get_corpus_stats().generation
+
+
+def _count_groups(manager, *fields):
+    """Returns the numbers of objects grouped by the values of the given fields.
+
+    Args:
+        manager: Model manager.
+        *fields: Names of the fields (or lookups) to group by.
+
+    Returns:
+        List of tuples of the field values followed by the number of objects.
+    """
+    return list(
+        manager.values(*fields)
+        .annotate(count=Count("pk"))
+        .values_list(*fields, "count")
+        .order_by()
+    )
+
+
+def _sum_counts(rows, index=None):
+    """Sums the counts of the groups by the field at the given index.
+
+    Args:
+        rows: List of tuples returned by ``_count_groups``.
+        index: The index of the field, or None to return the total count.
+
+    Returns:
+        List of ``[value, count]`` pairs in the order of first appearance, or the total
+        count if the index is None.
+    """
+    if index is None:
+        return sum(row[-1] for row in rows)
+    counts = Counter()
+    for row in rows:
+        counts[row[index]] += row[-1]
+    return [[value, count] for value, count in counts.items()]
+
+
+def _get_document_facets(document):
+    """Returns the denormalized search facets of a document.
+
+    Args:
+        document: Document object.
+
+    Returns:
+        Dictionary of DocumentStats field values.
+    """
+    author = document.author
+    return {
+        "date": document.date,
+        "oral": document.oral,
+        "language_level": document.language_level,
+        "gender": author.gender if author else None,
+        "language_background": author.language_background if author else None,
+        "dominant_language": author.dominant_language if author else None,
+    }
+
+
+def _add_to_corpus_stats(documents, sentences, tokens):
+    """Adds the given differences to the corpus statistics and increments the corpus
+    generation.
+
+    The differences are applied in the database, so concurrent updates are not lost.
+
+    Args:
+        documents: The difference in the number of documents.
+        sentences: The difference in the number of sentences.
+        tokens: The difference in the number of tokens.
+    """
+    CorpusStats = apps.get_model("corpus", "CorpusStats")
+
+    updated = CorpusStats.objects.filter(pk=_CORPUS_STATS_PK).update(
+        documents=F("documents") + documents,
+        sentences=F("sentences") + sentences,
+        tokens=F("tokens") + tokens,
+        generation=F("generation") + 1,
+    )
+    if not updated:
+        refresh_corpus_stats()
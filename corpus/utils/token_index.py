@@ -0,0 +1,696 @@
+"""In-memory columnar token index for the lexico-grammatical search feature.
+
+The index keeps one entry per word token of the corpus (punctuation and symbols are
+left out, as they are ignored by lexico-grammatical searches) in NumPy arrays sorted by
+sentence and token position, so that consecutive tokens of a sentence are neighbours
+in every array. A search sequence is evaluated with vectorized comparisons of these
+arrays shifted by the allowed distances between the sequence tokens.
+
+The index lives in the memory of the process. It is loaded from a snapshot written by
+the ``build_token_index`` management command, or built from the database if there is
+no snapshot. The writers of tokens (the web workers, the document processing worker and
+the imports) log the changed documents in the ``TokenIndexChange`` table, in the
+transaction changing the tokens (see ``log_token_changes``). Every process reads the
+changes logged since its index was loaded, at most every TOKEN_INDEX_REFRESH_INTERVAL
+seconds, and reloads the tokens of the changed documents only.
+
+The changes are read by transaction id rather than in the order of the log, as the
+transactions do not commit in the order they start. Every index records the watermark
+of the changes it contains, the oldest transaction running when it was read
+(``txid_snapshot_xmin``): all the changes of the older transactions are visible, and
+the changes of the newer ones are read again on the next refresh, which is harmless as
+a document is reloaded as a whole.
+
+An index is never modified once it is published: an update builds a new index, which
+replaces the published one with a single assignment, so a search running in another
+thread keeps reading the arrays of the index it started with.
+
+Type hints for Django models are omitted in this module because the models are not
+available at import time.
+"""
+
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+
+from .search_helper_classes import ANY_ERROR
+
+_IGNORED_POS = ["PUNCT", "SYM"]
+
+# UD features stored in the index, in the order of the feature columns
+FEATURES = [
+    "animacy",
+    "aspect",
+    "case",
+    "degree",
+    "foreign",
+    "gender",
+    "hyph",
+    "mood",
+    "number",
+    "person",
+    "polarity",
+    "tense",
+    "variant",
+    "verbform",
+    "voice",
+]
+
+# the published index, replaced as a whole when the changes are loaded (under the
+# lock), and the time of the last check of the changes
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+_CHECKED_ON = None
+
+
+def _get_choices(field_name):
+    Token = apps.get_model("corpus", "Token")
+    return [value for value, _ in Token._meta.get_field(field_name).choices]
+
+
+class TokenIndex:
+    """Columnar index of the corpus word tokens.
+
+    Attributes:
+        token_ids (np.ndarray): Primary keys of the tokens.
+        document_ids (np.ndarray): Primary keys of the documents of the tokens.
+        sentence_ids (np.ndarray): Primary keys of the sentences of the tokens.
+        sentence_nums (np.ndarray): Positions of the sentences in their documents.
+        token_nums (np.ndarray): Positions of the tokens in their sentences.
+        lemma_ids (np.ndarray): Codes of the token lemmas in the ``lemmas`` vocabulary.
+        pos (np.ndarray): Codes of the part-of-speech tags (1-based indices of the
+            ``Token.POS`` choices).
+        features (np.ndarray): A ``(tokens, len(FEATURES))`` matrix of UD feature codes
+            (1-based indices of the feature choices, 0 if the feature is not set).
+        lemmas (list[str]): The lemma vocabulary.
+        watermark (int | None): The transaction id from which the logged changes are
+            not known to be in the index, None if unknown.
+
+    The lemma postings and the feature bitmaps are computed lazily and cached; as the
+    arrays of a published index do not change, concurrent searches at worst compute
+    the same cache entry twice.
+    """
+
+    def __init__(
+        self,
+        token_ids,
+        document_ids,
+        sentence_ids,
+        sentence_nums,
+        token_nums,
+        lemma_ids,
+        pos,
+        features,
+        lemmas,
+        watermark=None,
+    ):
+        self.token_ids = token_ids
+        self.document_ids = document_ids
+        self.sentence_ids = sentence_ids
+        self.sentence_nums = sentence_nums
+        self.token_nums = token_nums
+        self.lemma_ids = lemma_ids
+        self.pos = pos
+        self.features = features
+        self.lemmas = lemmas
+        self.watermark = watermark
+        self.lemma_lookup = {lemma: code for code, lemma in enumerate(lemmas)}
+        self.pos_codes = {
+            value: code + 1 for code, value in enumerate(_get_choices("pos"))
+        }
+        self.feature_codes = [
+            {value: code + 1 for code, value in enumerate(_get_choices(feature))}
+            for feature in FEATURES
+        ]
+        self._postings = None
+        self._bitmaps = {}
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    @classmethod
+    def build(cls):
+        """Builds the index from the tokens stored in the database.
+
+        The watermark is read before the tokens, so the index contains at least the
+        changes preceding it.
+
+        Returns:
+            TokenIndex: The new index.
+        """
+        Token = apps.get_model("corpus", "Token")
+        watermark = _get_watermark()
+        index = cls.from_rows(_get_token_rows(Token.objects.all()))
+        index.watermark = watermark
+        return index
+
+    @classmethod
+    def from_rows(cls, rows, lemmas=None):
+        """Creates an index from token rows.
+
+        Args:
+            rows: Iterable of ``(id, document_id, sentence_id, sentence_num, token_num,
+                lemma, pos, *features)`` tuples.
+            lemmas: Initial lemma vocabulary, extended with new lemmas in place.
+
+        Returns:
+            TokenIndex: The new index.
+        """
+        lemmas = [] if lemmas is None else lemmas
+        lemma_lookup = {lemma: code for code, lemma in enumerate(lemmas)}
+        pos_codes = {value: code + 1 for code, value in enumerate(_get_choices("pos"))}
+        feature_codes = [
+            {value: code + 1 for code, value in enumerate(_get_choices(feature))}
+            for feature in FEATURES
+        ]
+
+        columns = [[] for _ in range(7)]
+        features = []
+        for row in rows:
+            lemma = row[5] or ""
+            lemma_id = lemma_lookup.get(lemma)
+            if lemma_id is None:
+                lemma_id = lemma_lookup[lemma] = len(lemmas)
+                lemmas.append(lemma)
+            for column, value in zip(
+                columns, (*row[:5], lemma_id, pos_codes.get(row[6], 0))
+            ):
+                column.append(value)
+            features.append(
+                [codes.get(value, 0) for codes, value in zip(feature_codes, row[7:])]
+            )
+
+        index = cls(
+            token_ids=np.array(columns[0], dtype=np.int64),
+            document_ids=np.array(columns[1], dtype=np.int64),
+            sentence_ids=np.array(columns[2], dtype=np.int64),
+            sentence_nums=np.array(columns[3], dtype=np.int32),
+            token_nums=np.array(columns[4], dtype=np.int32),
+            lemma_ids=np.array(columns[5], dtype=np.int32),
+            pos=np.array(columns[6], dtype=np.int8),
+            features=np.array(features, dtype=np.int8).reshape(-1, len(FEATURES)),
+            lemmas=lemmas,
+        )
+        index._sort()
+        return index
+
+    @classmethod
+    def load(cls, path):
+        """Loads an index snapshot.
+
+        Args:
+            path: Path to the snapshot file.
+
+        Returns:
+            TokenIndex: The loaded index.
+        """
+        with np.load(path) as data:
+            watermark = int(data["watermark"]) if "watermark" in data else None
+            return cls(
+                token_ids=data["token_ids"],
+                document_ids=data["document_ids"],
+                sentence_ids=data["sentence_ids"],
+                sentence_nums=data["sentence_nums"],
+                token_nums=data["token_nums"],
+                lemma_ids=data["lemma_ids"],
+                pos=data["pos"],
+                features=data["features"],
+                lemmas=data["lemmas"].tolist(),
+                watermark=watermark,
+            )
+
+    def save(self, path):
+        """Writes an index snapshot.
+
+        The snapshot is written to a temporary file first and then moved in place, so
+        that other processes never load a partially written snapshot.
+
+        Args:
+            path: Path to the snapshot file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                token_ids=self.token_ids,
+                document_ids=self.document_ids,
+                sentence_ids=self.sentence_ids,
+                sentence_nums=self.sentence_nums,
+                token_nums=self.token_nums,
+                lemma_ids=self.lemma_ids,
+                pos=self.pos,
+                features=self.features,
+                lemmas=np.array(self.lemmas, dtype=str),
+                watermark=np.int64(-1 if self.watermark is None else self.watermark),
+            )
+        tmp_path.replace(path)
+
+    def with_documents(self, document_ids, watermark=None):
+        """Returns a new index with the tokens of the given documents reloaded from
+        the database.
+
+        The tokens of the deleted documents are removed.
+
+        Args:
+            document_ids: List of document primary keys.
+            watermark: The watermark of the new index.
+
+        Returns:
+            TokenIndex: The new index.
+        """
+        Token = apps.get_model("corpus", "Token")
+        rows = _get_token_rows(Token.objects.filter(document_id__in=document_ids))
+        # the vocabulary is copied, as the published index must not change
+        loaded = TokenIndex.from_rows(rows, lemmas=list(self.lemmas))
+        keep = ~np.isin(self.document_ids, document_ids)
+        index = TokenIndex(
+            **{
+                name: np.concatenate([getattr(self, name)[keep], getattr(loaded, name)])
+                for name in self._column_names()
+            },
+            lemmas=loaded.lemmas,
+            watermark=watermark,
+        )
+        index._sort()
+        return index
+
+    def lemma_postings(self, lemma):
+        """Returns the sorted positions of the tokens with the given lemma.
+
+        Args:
+            lemma: The lemma to look up.
+
+        Returns:
+            np.ndarray: The positions of the tokens in the index arrays.
+        """
+        lemma_id = self.lemma_lookup.get(lemma)
+        if lemma_id is None:
+            return np.empty(0, dtype=np.int64)
+        if self._postings is None:
+            order = np.argsort(self.lemma_ids, kind="stable")
+            bounds = np.searchsorted(
+                self.lemma_ids[order], np.arange(len(self.lemmas) + 1)
+            )
+            self._postings = order, bounds
+        order, bounds = self._postings
+        return order[bounds[lemma_id] : bounds[lemma_id + 1]]
+
+    def feature_bitmap(self, feature, value):
+        """Returns a packed bitmap of the tokens with the given UD feature value.
+
+        Args:
+            feature: Name of the feature (a Token field name).
+            value: Value of the feature.
+
+        Returns:
+            np.ndarray | None: The packed bitmap or None if the feature is unknown.
+        """
+        if feature not in FEATURES:
+            return None
+        key = (feature, value)
+        if key not in self._bitmaps:
+            column = FEATURES.index(feature)
+            code = self.feature_codes[column].get(value, -1)
+            self._bitmaps[key] = np.packbits(self.features[:, column] == code)
+        return self._bitmaps[key]
+
+    def token_mask(self, search_seq, seq_index):
+        """Evaluates the conditions of a single search sequence token.
+
+        Args:
+            search_seq: TokenSearchSequence object.
+            seq_index: Index of the token in the search sequence.
+
+        Returns:
+            np.ndarray: Boolean mask of the matching tokens.
+        """
+        size = len(self)
+        wordform = search_seq.wordforms[seq_index]
+        if wordform:
+            mask = np.zeros(size, dtype=bool)
+            mask[self.lemma_postings(wordform)] = True
+        else:
+            mask = np.ones(size, dtype=bool)
+
+        lexes = search_seq.lexes[seq_index] if seq_index < len(search_seq.lexes) else []
+        if lexes:
+            codes = [self.pos_codes[lex] for lex in lexes if lex in self.pos_codes]
+            mask &= np.isin(self.pos, codes)
+
+        grams = (
+            search_seq.grammars[seq_index]
+            if seq_index < len(search_seq.grammars)
+            else []
+        )
+        if grams:
+            gram_bits = np.zeros((size + 7) // 8, dtype=np.uint8)
+            for feature, value in grams:
+                bitmap = self.feature_bitmap(feature, value)
+                if bitmap is not None:
+                    gram_bits |= bitmap
+            mask &= np.unpackbits(gram_bits, count=size).astype(bool)
+
+        errors = (
+            search_seq.errors[seq_index] if seq_index < len(search_seq.errors) else []
+        )
+        if errors:
+            mask &= np.isin(self.token_ids, _get_token_ids_with_errors(errors))
+
+        return mask
+
+    def search(self, search_seq, document_ids, offset, limit, after=None):
+        """Finds sentences matching the search sequence.
+
+        The sentences are returned in the ``(-document_id, number)`` order. For every
+        sentence, the first match (by token position) is returned.
+
+        Args:
+            search_seq: TokenSearchSequence object.
+            document_ids: Primary keys of the documents to search in or None to search
+                in the whole corpus.
+            offset: The number of matching sentences to skip.
+            limit: The maximum number of matching sentences to return, or None to
+                return all of them.
+            after: A ``(document_id, number)`` pair of the last sentence of the
+                previous page, only sentences following it are returned.
+
+        Returns:
+            list[LexgramMatch]: The matching sentences with their matched tokens.
+        """
+        from .lexgram_sql import LexgramMatch
+
+        if not len(self):
+            return []
+
+        masks = [
+            self.token_mask(search_seq, seq_index)
+            for seq_index in range(len(search_seq.wordforms))
+        ]
+        if document_ids is not None:
+            masks[0] &= np.isin(self.document_ids, document_ids)
+        if after is not None:
+            document_id, number = after
+            masks[0] &= (self.document_ids < document_id) | (
+                (self.document_ids == document_id) & (self.sentence_nums > number)
+            )
+
+        # completes[i][p] is True if the token at position p matches the i-th element of
+        # the search sequence and the rest of the sequence can be matched after it
+        completes = [None] * len(masks)
+        completes[-1] = masks[-1]
+        for seq_index in range(len(masks) - 2, -1, -1):
+            completes[seq_index] = masks[seq_index] & self._any_in_range(
+                completes[seq_index + 1],
+                search_seq.froms[seq_index],
+                search_seq.tos[seq_index],
+            )
+
+        first_positions = np.flatnonzero(completes[0])
+        _, unique_index = np.unique(
+            self.sentence_ids[first_positions], return_index=True
+        )
+        first_positions = first_positions[unique_index]
+        order = np.lexsort(
+            (
+                self.sentence_nums[first_positions],
+                -self.document_ids[first_positions],
+            )
+        )
+        end = None if limit is None else offset + limit
+        page_positions = first_positions[order][offset:end]
+
+        chains = [
+            self._first_chain(position, completes, search_seq)
+            for position in page_positions
+        ]
+        texts = _get_token_texts(
+            [int(self.token_ids[p]) for chain in chains for p in chain]
+        )
+        return [
+            LexgramMatch(
+                sentence_id=int(self.sentence_ids[chain[0]]),
+                document_id=int(self.document_ids[chain[0]]),
+                number=int(self.sentence_nums[chain[0]]),
+                token_nums=[int(self.token_nums[p]) for p in chain],
+                words=[texts.get(int(self.token_ids[p]), "") for p in chain],
+            )
+            for chain in chains
+        ]
+
+    def _any_in_range(self, mask, distance_from, distance_to):
+        """Marks positions followed by a marked position of the same sentence within
+        the given distance range.
+
+        Args:
+            mask: Boolean mask of the marked positions.
+            distance_from: The minimal distance, can be negative.
+            distance_to: The maximal distance, can be negative.
+
+        Returns:
+            np.ndarray: Boolean mask of the positions.
+        """
+        size = len(mask)
+        result = np.zeros(size, dtype=bool)
+        for distance in range(distance_from, distance_to + 1):
+            if abs(distance) >= size:
+                continue
+            if distance >= 0:
+                source = slice(0, size - distance)
+                target = slice(distance, size)
+            else:
+                source = slice(-distance, size)
+                target = slice(0, size + distance)
+            result[source] |= mask[target] & (
+                self.sentence_ids[source] == self.sentence_ids[target]
+            )
+        return result
+
+    def _first_chain(self, position, completes, search_seq):
+        """Returns the positions of the first chain of tokens matching the search
+        sequence that starts at the given position.
+
+        Args:
+            position: Position of the first token of the chain.
+            completes: Masks of the positions that can complete the search sequence.
+            search_seq: TokenSearchSequence object.
+
+        Returns:
+            list[int]: The positions of the chain tokens.
+        """
+        positions = [int(position)]
+        sentence_id = self.sentence_ids[position]
+        for seq_index in range(1, len(completes)):
+            previous = positions[-1]
+            for candidate in range(
+                previous + search_seq.froms[seq_index - 1],
+                previous + search_seq.tos[seq_index - 1] + 1,
+            ):
+                if (
+                    0 <= candidate < len(self)
+                    and self.sentence_ids[candidate] == sentence_id
+                    and completes[seq_index][candidate]
+                ):
+                    positions.append(candidate)
+                    break
+        return positions
+
+    def _sort(self):
+        # only called on new indexes, before they are published
+        order = np.lexsort((self.token_nums, self.sentence_ids))
+        for name in self._column_names():
+            setattr(self, name, getattr(self, name)[order])
+        self._postings = None
+        self._bitmaps = {}
+
+    @staticmethod
+    def _column_names():
+        return [
+            "token_ids",
+            "document_ids",
+            "sentence_ids",
+            "sentence_nums",
+            "token_nums",
+            "lemma_ids",
+            "pos",
+            "features",
+        ]
+
+
+def _get_token_ids_with_errors(errors):
+    """Returns primary keys of the tokens annotated with any of the given error tags.
+
+    The tokens are read from the error tag index, see ``error_tag_utils``.
+
+    Args:
+        errors: List of RLC error tags, a list containing ``ANY_ERROR`` matches any
+            error tag.
+
+    Returns:
+        np.ndarray: The token primary keys.
+    """
+    TokenErrorTag = apps.get_model("corpus", "TokenErrorTag")
+    entries = TokenErrorTag.objects.all()
+    if ANY_ERROR not in errors:
+        entries = entries.filter(error_tag__in=errors)
+    token_ids = entries.values_list("token_id", flat=True).distinct()
+    return np.fromiter(token_ids, dtype=np.int64)
+
+
+def _get_token_texts(token_ids):
+    """Returns the texts of the given tokens.
+
+    The texts are not stored in the index, so they are fetched for a page of results
+    with a single query.
+
+    Args:
+        token_ids: List of token primary keys.
+
+    Returns:
+        dict[int, str]: Mapping of token primary keys to their texts.
+    """
+    Token = apps.get_model("corpus", "Token")
+    return dict(Token.objects.filter(pk__in=token_ids).values_list("id", "token"))
+
+
+def get_token_index_path():
+    """Returns the path of the token index snapshot."""
+    return Path(settings.TOKEN_INDEX_PATH)
+
+
+def get_token_index():
+    """Returns the token index of the current process.
+
+    The index is loaded from the snapshot or built from the database on first use.
+    Afterwards the changes logged since it was loaded are checked at most every
+    TOKEN_INDEX_REFRESH_INTERVAL seconds, and the changed documents are reloaded. While
+    a thread reloads them, the other threads search in the current index. The returned
+    index does not change, so a search reads it consistently even if the index is
+    replaced meanwhile.
+
+    Returns:
+        TokenIndex: The token index.
+    """
+    global _INDEX, _CHECKED_ON
+
+    index = _INDEX
+    if index is not None and _is_checked():
+        return index
+    if not _INDEX_LOCK.acquire(blocking=index is None):
+        return index
+    try:
+        if _INDEX is None:
+            path = get_token_index_path()
+            index = TokenIndex.load(path) if path.exists() else None
+            _INDEX = index if index and index.watermark is not None else None
+        if _INDEX is None:
+            _INDEX = TokenIndex.build()
+        elif not _is_checked():
+            _INDEX = _load_changes(_INDEX)
+        _CHECKED_ON = time.monotonic()
+        return _INDEX
+    finally:
+        _INDEX_LOCK.release()
+
+
+def log_token_changes(document_ids):
+    """Logs a change of the tokens of the documents for the token indexes.
+
+    The change must be logged after the tokens are written or deleted, in the same
+    transaction, so the processes reading it see the new tokens. The token index of the
+    current process loads it on the next search after the transaction is committed.
+
+    Args:
+        document_ids: List of document primary keys.
+    """
+    TokenIndexChange = apps.get_model("corpus", "TokenIndexChange")
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TokenIndexChange._meta.db_table} (document_id, xact_id) "
+            "SELECT unnest(%s::bigint[]), txid_current()",
+            [list(document_ids)],
+        )
+    transaction.on_commit(_expire_check)
+
+
+def _is_checked():
+    """Returns whether the changes were checked in the last refresh interval."""
+    return (
+        _CHECKED_ON is not None
+        and time.monotonic() - _CHECKED_ON < settings.TOKEN_INDEX_REFRESH_INTERVAL
+    )
+
+
+def _expire_check():
+    """Makes the next search check the changes, e.g. the ones of the current
+    process."""
+    global _CHECKED_ON
+
+    _CHECKED_ON = None
+
+
+def _get_watermark():
+    """Returns the id of the oldest transaction running, all the changes logged by
+    the older transactions are visible."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def _load_changes(index):
+    """Returns the index with the documents changed since its watermark reloaded.
+
+    Args:
+        index: TokenIndex object.
+
+    Returns:
+        TokenIndex: The index, the same object if no documents changed.
+    """
+    TokenIndexChange = apps.get_model("corpus", "TokenIndexChange")
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT txid_snapshot_xmin(txid_current_snapshot()), "
+            f"array(SELECT DISTINCT document_id FROM {TokenIndexChange._meta.db_table} "
+            "WHERE xact_id >= %s)",
+            [index.watermark],
+        )
+        watermark, document_ids = cursor.fetchone()
+    if document_ids:
+        return index.with_documents(document_ids, watermark)
+    # only the watermark changes, the arrays of the published index stay the same
+    index.watermark = watermark
+    return index
+
+
+def _get_token_rows(tokens):
+    """Returns the rows of the word tokens of a queryset for ``TokenIndex.from_rows``.
+
+    Args:
+        tokens: Token queryset.
+
+    Returns:
+        Iterator of token rows.
+    """
+    return (
+        tokens.exclude(pos__in=_IGNORED_POS)
+        .order_by("sentence_id", "token_num")
+        .values_list(
+            "id",
+            "document_id",
+            "sentence_id",
+            "sentence_num",
+            "token_num",
+            "lemma",
+            "pos",
+            *FEATURES,
+        )
+        .iterator(chunk_size=10000)
+    )
@@ -1,27 +1,42 @@
 import uuid
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.views import redirect_to_login
 from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
-from django.db.models import Count
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 
 from .filters import DocumentFilter
 from .forms import DocumentForm, NewAuthorForm, FavoriteAuthorForm
-from .models import Document, Sentence, Author
+from .models import Document, Sentence, Author, Token
+from .utils.async_utils import streaming_iterator
+from .utils.correction_utils import fill_corrections
+from .utils.document_utils import get_token_data_legend
+from .utils.export_utils import stream_documents_json
+from .utils.search_export import export_search_results
 from .utils.search_utils import (
+    get_search_semaphore,
     render_search_results,
 )
-
-
-def export_documents(request):
-    document_list = Document.objects.select_related("user", "author").prefetch_related(
-        "annotators", "sentence_set__annotation_set__user"
+from .utils.stats_utils import get_statistics_snapshot
+
+
+async def export_documents(request):
+    # login_required does not support async views before Django 5.1
+    if not (await request.auser()).is_authenticated:
+        return redirect_to_login(request.get_full_path())
+
+    # the filter validates the selected owner in the database
+    documents = await sync_to_async(
+        lambda: DocumentFilter(request.GET, queryset=Document.objects.all()).qs
+    )()
+    # the documents are serialized in batches while the response is sent
+    response = StreamingHttpResponse(
+        streaming_iterator(request, stream_documents_json(documents)),
+        content_type="application/json",
     )
-    document_filter = DocumentFilter(request.GET, queryset=document_list)
-    data = [document.serialize() for document in document_filter.qs]
-    response = JsonResponse(data, safe=False)
     response["Content-Disposition"] = 'attachment; filename="documents.json"'
     return response
 
@@ -50,114 +65,72 @@ def get_verbose_name(model, field_name, choice_code):
     return dict(model._meta.get_field(field_name).flatchoices).get(choice_code)
 
 
+def get_verbose_counts(model, field_name, counts):
+    """Transforms [code, count] pairs into a dictionary of counts by verbose name"""
+    verbose_counts = {}
+    for choice_code, count in counts:
+        label = get_verbose_name(model, field_name, choice_code)
+        verbose_counts[label] = verbose_counts.get(label, 0) + count
+    return verbose_counts
+
+
+def sort_by_label(counts):
+    """Sorts counts by their verbose names, with the unknown ones last"""
+    return dict(
+        sorted(counts.items(), key=lambda item: (item[0] is None, str(item[0])))
+    )
+
+
 def clean_for_js(data):
     """Transforms None into a value appropriate for JavaScript"""
     return [item if item is not None else "Unknown" for item in data]
 
 
 def statistics(request):
-    # Aggregate the data
-    status_counts = Document.objects.values("status").annotate(count=Count("status"))
+    # the figures are precomputed, see stats_utils.refresh_statistics_snapshot
+    data = get_statistics_snapshot().data
     # Prepare the data for the chart
     labels = [status[1] for status in Document.StatusChoices.choices]
-    text_types = []
-    for status_value, status_label in Document.StatusChoices.choices:
-        count = int(status_counts.get(status=status_value)["count"])
-        text_types.append(count)
-    texts_count = int(Document.objects.count())
+    text_types = [count for _, count in data["document_status"]]
+    texts_count = data["documents"]
     colors = ["#8c61ff", "#44c2fd", "#6592fd"]
     # Статистика по документам
-    languages_counts = (
-        Document.objects.values("author__dominant_language")
-        .annotate(count=Count("id"))
-        .order_by()
+    languages_counts = get_verbose_counts(
+        Author, "dominant_language", data["document_dominant_language"]
     )
-    languages_counts = {
-        get_verbose_name(
-            Author, "dominant_language", doc["author__dominant_language"]
-        ): doc["count"]
-        for doc in languages_counts
-    }
-    gender_counts = (
-        Document.objects.values("author__gender").annotate(count=Count("id")).order_by()
-    )
-    gender_counts = {
-        get_verbose_name(Author, "gender", doc["author__gender"]): doc["count"]
-        for doc in gender_counts
-    }
-    lang_background_counts = (
-        Document.objects.values("author__language_background")
-        .annotate(count=Count("id"))
-        .order_by()
+    gender_counts = get_verbose_counts(Author, "gender", data["document_gender"])
+    lang_background_counts = get_verbose_counts(
+        Author, "language_background", data["document_language_background"]
     )
-    lang_background_counts = {
-        get_verbose_name(
-            Author, "language_background", doc["author__language_background"]
-        ): doc["count"]
-        for doc in lang_background_counts
-    }
-    genre_counts = (
-        Document.objects.values("genre").annotate(count=Count("id")).order_by()
-    )
-    genre_counts = {
-        get_verbose_name(Document, "genre", doc["genre"]): doc["count"]
-        for doc in genre_counts
-    }
+    genre_counts = get_verbose_counts(Document, "genre", data["document_genre"])
     # статистика по предложениям
-    lang_sent_counts = (
-        Sentence.objects.values("document__author__dominant_language")
-        .annotate(count=Count("id"))
-        .order_by()
+    lang_sent_counts = get_verbose_counts(
+        Author, "dominant_language", data["sentence_dominant_language"]
     )
-    lang_sent_counts = {
-        get_verbose_name(
-            Author, "dominant_language", sent["document__author__dominant_language"]
-        ): sent["count"]
-        for sent in lang_sent_counts
-    }
     # Статистика по авторам
-    auth_gender = Author.objects.values("gender").annotate(count=Count("id")).order_by()
-    auth_gender = {
-        get_verbose_name(Author, "gender", auth["gender"]): auth["count"]
-        for auth in auth_gender
-    }
-    auth_lang_bg_counts = (
-        Author.objects.values("language_background")
-        .annotate(count=Count("id"))
-        .order_by()
+    auth_gender = get_verbose_counts(Author, "gender", data["author_gender"])
+    auth_lang_bg_counts = get_verbose_counts(
+        Author, "language_background", data["author_language_background"]
     )
-    auth_lang_bg_counts = {
-        get_verbose_name(
-            Author, "language_background", auth["language_background"]
-        ): auth["count"]
-        for auth in auth_lang_bg_counts
-    }
-    auth_lang_counts = (
-        Author.objects.values("dominant_language")
-        .annotate(count=Count("id"))
-        .order_by()
+    auth_lang_counts = get_verbose_counts(
+        Author, "dominant_language", data["author_dominant_language"]
     )
-    auth_lang_counts = {
-        get_verbose_name(Author, "dominant_language", auth["dominant_language"]): auth[
-            "count"
-        ]
-        for auth in auth_lang_counts
-    }
-    languages_counts = dict(sorted(languages_counts.items()))
-    lang_sent_counts = dict(sorted(lang_sent_counts.items()))
-    # Render the chart
-    table_data = list(
-        zip(
-            languages_counts.keys(),
-            languages_counts.values(),
-            lang_sent_counts.values(),
-        )
+    # статистика по токенам
+    token_pos_counts = get_verbose_counts(Token, "pos", data["token_pos"])
+    token_level_counts = get_verbose_counts(
+        Document, "language_level", data["token_language_level"]
     )
-    # статистика по предложениям
-    total_sentences = Sentence.objects.count()
-    # Статистика по авторам
-    total_authors = Author.objects.count()
-    total_fav_authors = Author.objects.filter(favorite=True).count()
+    token_lang_counts = get_verbose_counts(
+        Author, "dominant_language", data["token_dominant_language"]
+    )
+    languages_counts = sort_by_label(languages_counts)
+    lang_sent_counts = sort_by_label(lang_sent_counts)
+    token_lang_counts = sort_by_label(token_lang_counts)
+    # Render the chart
+    table_data = [
+        (language, count, lang_sent_counts.get(language, 0))
+        for language, count in languages_counts.items()
+    ]
     context = {
         "labels": labels,
         "text_types": text_types,
@@ -171,17 +144,24 @@ def statistics(request):
         "lang_background_counts": list(lang_background_counts.values()),
         "genre_labels": clean_for_js(list(genre_counts.keys())),
         "genre_counts": list(genre_counts.values()),
-        "total_sentences": total_sentences,
+        "total_sentences": data["sentences"],
         "lang_sent_labels": clean_for_js(list(lang_sent_counts.keys())),
         "lang_sent_counts": list(lang_sent_counts.values()),
-        "total_authors": total_authors,
-        "total_fav_authors": total_fav_authors,
+        "total_authors": data["authors"],
+        "total_fav_authors": data["favorite_authors"],
         "auth_gender_labels": clean_for_js(list(auth_gender.keys())),
         "auth_gender_counts": list(auth_gender.values()),
         "auth_lang_bg_labels": clean_for_js(list(auth_lang_bg_counts.keys())),
         "auth_lang_bg_counts": list(auth_lang_bg_counts.values()),
         "auth_lang_labels": clean_for_js(list(auth_lang_counts.keys())),
         "auth_lang_counts": list(auth_lang_counts.values()),
+        "total_tokens": data["tokens"],
+        "token_pos_labels": clean_for_js(list(token_pos_counts.keys())),
+        "token_pos_counts": list(token_pos_counts.values()),
+        "token_level_labels": clean_for_js(list(token_level_counts.keys())),
+        "token_level_counts": list(token_level_counts.values()),
+        "token_lang_labels": clean_for_js(list(token_lang_counts.keys())),
+        "token_lang_counts": list(token_lang_counts.values()),
         "table_data": table_data,
     }
     return render(request, "statistics.html", context)
@@ -194,9 +174,20 @@ def help_page(request):
 # Представление для аннотирования документа
 def annotate(request, document_id):
     doc = Document.objects.get(id=document_id)
+    # the sentences are replaced when the queued processing of the document finishes
+    is_processing = doc.processing_status != Document.ProcessingStatusChoices.DONE
+    sentences = (
+        []
+        if is_processing
+        else list(Sentence.objects.filter(document=doc).order_by("number"))
+    )
+    # the corrections missing from the cache are computed at once
+    fill_corrections(sentences)
     context = {
         "document": doc,
-        "sentences": Sentence.objects.filter(document=doc).order_by("number"),
+        "is_processing": is_processing,
+        "token_data_legend": get_token_data_legend(),
+        "sentences": sentences,
     }
     return render(request, "document/annotate.html", context)
 
@@ -272,6 +263,11 @@ def edit_document(request, document_id):
             ):
                 document.author = favorite_author_form.cleaned_data["selected_author"]
             document.save()
+            if document.retagged_sentences is not None:
+                messages.info(
+                    request,
+                    f"Повторно размечено предложений: {document.retagged_sentences}.",
+                )
             return redirect("annotate", document_id=document.id)
         else:
             messages.error(
@@ -356,15 +352,24 @@ def search(request):
     return render(request, "search.html", {"block_id": uuid.uuid4()})
 
 
-def lexgram_search_results(request):
-    return render_search_results(request, "lexgram")
+# the searches run in the thread of the request, outside of the event loop (see
+# corpus.utils.async_utils)
+async def lexgram_search_results(request):
+    async with get_search_semaphore():
+        return await sync_to_async(render_search_results)(request, "lexgram")
+
+
+async def exact_search_results(request):
+    async with get_search_semaphore():
+        return await sync_to_async(render_search_results)(request, "exact")
 
 
-def exact_search_results(request):
-    return render_search_results(request, "exact")
+async def lexgram_search_export(request):
+    return await sync_to_async(export_search_results)(request, "lexgram")
 
 
-# TODO add search export
+async def exact_search_export(request):
+    return await sync_to_async(export_search_results)(request, "exact")
 
 
 def dynamic_lexgram_form(request):
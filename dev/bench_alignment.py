@@ -0,0 +1,91 @@
+"""Measures the token alignment of the auto-annotator on texts of increasing length.
+
+The original texts are built by repeating a paragraph, and the corrected ones by
+editing words: changing endings, swapping adjacent words and dropping words, so most
+tokens match. Every fifth word is edited by default, pass --edit-every 50 for texts
+with few corrections. The texts are processed once, and the alignment is timed with
+the full matrix and with a band, checking that both give the same alignment.
+
+Usage: python dev/bench_alignment.py [--lengths 10 50 ...] [--edit-every N] [--band N]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.conf import settings
+
+from auto_annotator.alignment import Alignment
+from rlc_new import nlp
+
+PARAGRAPH = (
+    "Вчера я ходил в магазин со своей сестрой, потому что нам нужно было купить "
+    "продукты для ужина. Мы долго выбирали овощи и фрукты, а потом стояли в "
+    "длинной очереди у кассы. Когда мы вернулись домой, мама уже приготовила суп, "
+    "и мы все вместе сели за стол."
+)
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--lengths", type=int, nargs="+", default=[10, 25, 50, 100, 200, 400, 1000]
+)
+parser.add_argument("--edit-every", type=int, default=5)
+parser.add_argument(
+    "--band", type=int, default=settings.AUTO_ANNOTATION_ALIGNMENT_BAND or 8
+)
+parser.add_argument("--runs", type=int, default=3)
+args = parser.parse_args()
+
+
+def make_pair(length):
+    """Returns an original text of the given number of words and its correction."""
+    words = (PARAGRAPH.split() * (length // len(PARAGRAPH.split()) + 1))[:length]
+    corrected = list(words)
+    for number, index in enumerate(range(0, length, args.edit_every)):
+        if number % 3 == 0:
+            corrected[index] = corrected[index] + "а"
+        elif number % 3 == 1 and index + 1 < length:
+            corrected[index], corrected[index + 1] = (
+                corrected[index + 1],
+                corrected[index],
+            )
+        else:
+            corrected[index] = ""
+    return " ".join(words), " ".join(word for word in corrected if word)
+
+
+def best_time(function):
+    """Returns the best time of several runs of a function and its result."""
+    times = []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+annotator = nlp.get_annotator()
+band = args.band
+print(f"a word in {args.edit_every} edited, band: {band}")
+for length in args.lengths:
+    original, corrected = map(annotator.process, make_pair(length))
+    full_time, full = best_time(lambda: Alignment(original, corrected))
+    band_time, banded = best_time(lambda: Alignment(original, corrected, band))
+    if full.align_seq != banded.align_seq:
+        sys.exit(f"{length} words: the banded alignment differs")
+    print(
+        f"{len(original.tokens):4} x {len(corrected.tokens):4} tokens: "
+        f"full {full_time * 1000:8.1f} ms, banded {band_time * 1000:8.1f} ms"
+        f"{'' if banded.band is not None else ' (fell back to full)'}"
+    )
@@ -0,0 +1,222 @@
+"""Reports the latency of annotation requests while heavy searches run concurrently.
+
+Starts gunicorn, measures the latency of annotation create, read, update and delete
+requests alone, then again while several clients export the results of a
+lexico-grammatical and an exact search in a loop, and prints the percentiles of both
+runs. The created annotations are deleted by the requests themselves.
+
+Usage: python dev/bench_asgi_load.py [--searches N] [--duration S] [--app APP] [-- gunicorn args]
+
+Examples:
+    python dev/bench_asgi_load.py --searches 4
+    python dev/bench_asgi_load.py --app rlc_new.wsgi:application -- --worker-class sync
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import json
+import statistics
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.middleware.csrf import _get_new_csrf_string
+
+from corpus.models import Sentence
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--app", default="rlc_new.asgi:application")
+parser.add_argument("--workers", type=int, default=1)
+parser.add_argument("--searches", type=int, default=4)
+parser.add_argument("--annotators", type=int, default=2)
+parser.add_argument("--duration", type=float, default=20)
+parser.add_argument("--port", type=int, default=8766)
+parser.add_argument("gunicorn_args", nargs="*")
+args = parser.parse_args()
+
+LEXGRAM_SEARCH = {
+    "tokens": {
+        "wordform[]": ["", ""],
+        "from[]": ["1"],
+        "to[]": ["2"],
+        "lex[]": ["", "NOUN"],
+        "grammar[]": ["", ""],
+        "errors[]": ["", ""],
+    },
+    "settings": {},
+    "page_size": "10",
+    "format": "csv",
+}
+EXACT_SEARCH = {"query": "Монета", "settings": {}, "page_size": "10", "format": "csv"}
+
+# log in as the first superuser
+user = User.objects.filter(is_superuser=True).order_by("id").first()
+session = SessionStore()
+session["_auth_user_id"] = str(user.pk)
+session["_auth_user_backend"] = "django.contrib.auth.backends.ModelBackend"
+session["_auth_user_hash"] = user.get_session_auth_hash()
+session.create()
+csrf_token = _get_new_csrf_string()
+sentence = Sentence.objects.order_by("id").first()
+
+server = subprocess.Popen(
+    [
+        "gunicorn",
+        args.app,
+        "--bind",
+        f"127.0.0.1:{args.port}",
+        "--workers",
+        str(args.workers),
+        *args.gunicorn_args,
+    ],
+    cwd=repo_path,
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.DEVNULL,
+)
+
+
+def request(method, path, data=None):
+    """Sends a request with the session of the superuser and reads the response."""
+    http_request = urllib.request.Request(
+        f"http://127.0.0.1:{args.port}{path}",
+        method=method,
+        data=None if data is None else json.dumps(data).encode(),
+        headers={
+            "Content-Type": "application/json",
+            "Cookie": f"{settings.SESSION_COOKIE_NAME}={session.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={csrf_token}",
+            "X-CSRFToken": csrf_token,
+            "Referer": f"http://127.0.0.1:{args.port}/",
+        },
+    )
+    with urllib.request.urlopen(http_request, timeout=600) as response:
+        return response.read()
+
+
+def annotate(index, latencies):
+    """Creates, reads, updates and deletes an annotation, recording the latencies."""
+    guid = f"#bench-{index}"
+    annotation = {
+        "sentence": sentence.pk,
+        "document": sentence.document_id,
+        "user": user.pk,
+        "guid": guid,
+        "alt": "false",
+        "body": {
+            "id": guid,
+            "body": [
+                {"type": "TextualBody", "value": "Ortho", "purpose": "tagging"},
+                {"type": "TextualBody", "value": "x", "purpose": "commenting"},
+            ],
+            "target": {
+                "selector": [
+                    {"type": "TextQuoteSelector", "exact": sentence.text[:1]},
+                    {"type": "TextPositionSelector", "start": 0, "end": 1},
+                ]
+            },
+        },
+    }
+    for method, path, data in [
+        ("POST", "/api/annotations/create/", annotation),
+        ("GET", f"/api/annotations/get/{sentence.pk}/", None),
+        ("PUT", "/api/annotations/update/", annotation),
+        ("DELETE", "/api/annotations/delete/", {"guid": guid}),
+    ]:
+        started = time.perf_counter()
+        request(method, path, data)
+        latencies.append(time.perf_counter() - started)
+
+
+def run_annotators(stop):
+    """Runs the annotation clients until stop is set and returns the latencies."""
+    latencies = []
+
+    def client(number):
+        index = 0
+        while not stop.is_set():
+            annotate(f"{number}-{index}", latencies)
+            index += 1
+
+    with ThreadPoolExecutor(args.annotators) as executor:
+        for number in range(args.annotators):
+            executor.submit(client, number)
+    return latencies
+
+
+def run_searches(stop, durations):
+    """Exports the results of the searches in a loop until stop is set."""
+    searches = [
+        ("/corpus/lexgram_search_export/", LEXGRAM_SEARCH),
+        ("/corpus/exact_search_export/", EXACT_SEARCH),
+    ]
+    index = 0
+    while not stop.is_set():
+        path, data = searches[index % len(searches)]
+        started = time.perf_counter()
+        request("POST", path, data)
+        durations.append(time.perf_counter() - started)
+        index += 1
+
+
+def report(name, latencies):
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name}: {len(latencies)} requests, "
+        f"p50 {percentiles[49] * 1000:.0f} ms, p99 {percentiles[98] * 1000:.0f} ms, "
+        f"max {max(latencies) * 1000:.0f} ms"
+    )
+
+
+try:
+    started = time.perf_counter()
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/", timeout=60)
+            break
+        except urllib.error.HTTPError:
+            break
+        except OSError:
+            if server.poll() is not None:
+                sys.exit("gunicorn exited")
+            time.sleep(0.2)
+    print(f"boot: {time.perf_counter() - started:.1f}s")
+
+    stop = threading.Event()
+    threading.Timer(args.duration / 2, stop.set).start()
+    report("annotations alone", run_annotators(stop))
+
+    stop = threading.Event()
+    search_durations = []
+    searchers = [
+        threading.Thread(target=run_searches, args=(stop, search_durations))
+        for _ in range(args.searches)
+    ]
+    for searcher in searchers:
+        searcher.start()
+    threading.Timer(args.duration, stop.set).start()
+    latencies = run_annotators(stop)
+    for searcher in searchers:
+        searcher.join()
+    report(f"annotations with {args.searches} concurrent searches", latencies)
+    report("searches", search_durations)
+finally:
+    server.terminate()
+    server.wait()
+    session.delete()
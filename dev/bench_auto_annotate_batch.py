@@ -0,0 +1,137 @@
+"""Compares single and batch auto-annotation requests on the sentences of a document.
+
+The sentences of a document (the longest one by default) are corrupted by changing
+word endings and swapping adjacent words, and the pairs are annotated with one
+/api/auto_annotate/ request per pair and with one /api/auto_annotate/batch/ request
+per number of workers, checking that the annotations are the same. The requests are
+sent with the Django test client as the first superuser.
+
+Usage: python dev/bench_auto_annotate_batch.py [--document ID] [--workers 1 2 ...]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import json
+import random
+import time
+
+import django
+from asgiref.sync import async_to_sync
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+
+from corpus.models import Document, Sentence
+from rlc_new import nlp
+
+
+def corrupt(text):
+    """Changes the ending of a word and swaps two adjacent words."""
+    words = text.split()
+    index = random.randrange(len(words))
+    if len(words[index]) > 3:
+        words[index] = words[index][:-1] + "ы"
+    if len(words) > 3:
+        index = random.randrange(len(words) - 1)
+        words[index], words[index + 1] = words[index + 1], words[index]
+    return " ".join(words)
+
+
+def edits(annotations):
+    """Returns the annotations without the generated ids and dates."""
+    return [
+        (
+            [body["value"] for body in annotation["body"]["body"]],
+            annotation["body"]["target"],
+        )
+        for annotation in annotations
+    ]
+
+
+@async_to_sync
+async def read_lines(response):
+    """Returns the JSON lines of a streaming response of an async view."""
+    return [json.loads(line) async for line in response.streaming_content]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--document", type=int)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    args = parser.parse_args()
+
+    if args.document:
+        document = Document.objects.get(pk=args.document)
+    else:
+        document = (
+            Document.objects.annotate(sentence_count=Count("sentence"))
+            .order_by("-sentence_count")
+            .first()
+        )
+    sentences = list(Sentence.objects.filter(document=document).order_by("number"))
+
+    random.seed(0)
+    corrected_sentences = {sentence.id: sentence.text for sentence in sentences}
+    for sentence in sentences:
+        sentence.text = corrupt(sentence.text)
+
+    client = Client()
+    client.force_login(User.objects.filter(is_superuser=True).order_by("id").first())
+    nlp.preload()
+    print(f"document {document.pk}: {len(sentences)} sentences")
+
+    started = time.perf_counter()
+    single_results = []
+    for sentence in sentences:
+        response = client.post(
+            "/api/auto_annotate/",
+            {
+                "original_sentence": sentence.text,
+                "corrected_sentence": corrected_sentences[sentence.id],
+            },
+            content_type="application/json",
+        )
+        single_results.append(edits(response.json()))
+    print(f"single requests: {time.perf_counter() - started:.2f}s")
+
+    for workers in args.workers:
+        with override_settings(AUTO_ANNOTATION_WORKERS=workers):
+            started = time.perf_counter()
+            response = client.post(
+                "/api/auto_annotate/batch/",
+                {
+                    "sentences": [
+                        {
+                            "original_sentence": sentence.text,
+                            "corrected_sentence": corrected_sentences[sentence.id],
+                        }
+                        for sentence in sentences
+                    ]
+                },
+                content_type="application/json",
+            )
+            results = read_lines(response)
+            elapsed = time.perf_counter() - started
+        batch_results = [
+            edits(result["annotations"])
+            for result in sorted(results, key=lambda result: result["index"])
+        ]
+        if batch_results != single_results:
+            sys.exit(f"{workers} workers: the annotations differ")
+        print(f"batch request, {workers} workers: {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    # the processes of the annotation pool import this module
+    main()
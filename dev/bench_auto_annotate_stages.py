@@ -0,0 +1,144 @@
+"""Reports the time of the auto-annotation stages with and without parsing every text.
+
+The first sentences of the corpus are corrupted by changing word endings and, in a
+fraction of them (--swaps), swapping adjacent words. The pairs are annotated stage by
+stage (segmentation, morphology, lemmas, syntax, alignment, merging and
+classification) with the syntax parsed for every pair, as before the layers were
+declared, and on demand (see ``Annotator.layers``), checking that the edits are the
+same. Then the latency of /api/auto_annotate/ is measured in both modes with the
+Django test client as the first superuser.
+
+Usage: python dev/bench_auto_annotate_stages.py [--limit N] [--swaps FRACTION]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.contrib.auth.models import User
+from django.test import Client
+
+from auto_annotator.alignment import Alignment
+from auto_annotator.classifier import SyntaxNeeded
+from auto_annotator.text_processor import LEMMA, MORPH, SYNTAX
+from corpus.models import Sentence
+from rlc_new import nlp
+
+STAGES = ["segment", "morph", "lemma", "syntax", "align", "merge", "classify"]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--limit", type=int, default=200)
+parser.add_argument("--swaps", type=float, default=0.3)
+args = parser.parse_args()
+
+texts = list(
+    Sentence.objects.order_by("document", "number").values_list("text", flat=True)[
+        : args.limit
+    ]
+)
+
+random.seed(0)
+
+
+def corrupt(text):
+    """Changes the ending of a word and may swap two adjacent words."""
+    words = text.split()
+    index = random.randrange(len(words))
+    if len(words[index]) > 3:
+        words[index] = words[index][:-1] + "ы"
+    if len(words) > 3 and random.random() < args.swaps:
+        index = random.randrange(len(words) - 1)
+        words[index], words[index + 1] = words[index + 1], words[index]
+    return " ".join(words)
+
+
+pairs = [(corrupt(text), text) for text in texts]
+annotator = nlp.get_annotator()
+processor = annotator.processor
+nlp.preload()
+# warm up the caches of the lemmatizer and the classifier
+for orig, cor in pairs:
+    annotator.annotate(orig, cor)
+
+
+def annotate(orig, cor, timings):
+    """Annotates a pair like Annotator.annotate, adding the stage times to timings."""
+
+    def timed(stage, function, *function_args):
+        started = time.perf_counter()
+        result = function(*function_args)
+        timings[stage] += time.perf_counter() - started
+        return result
+
+    docs = timed("segment", processor.process_many, [orig, cor], ())
+    timed("morph", processor.add_layers, docs, [MORPH])
+    timed("lemma", processor.add_layers, docs, [LEMMA])
+    if annotator.syntax:
+        timed("syntax", processor.add_layers, docs, [SYNTAX])
+        parsed[annotator.syntax] += 1
+    alignment = timed("align", Alignment, *docs, annotator.alignment_band)
+    edits = timed("merge", annotator.merge, alignment)
+    for edit in edits:
+        try:
+            timed("classify", annotator.classify, edit)
+        except SyntaxNeeded:
+            timed("syntax", processor.add_layers, docs, [SYNTAX])
+            parsed[annotator.syntax] += 1
+            timed("classify", annotator.classify, edit)
+    return [
+        (edit.o_start, edit.o_end, edit.c_start, edit.c_end, edit.type)
+        for edit in edits
+    ]
+
+
+print(f"{len(pairs)} sentence pairs, times per pair in ms")
+print(f"{'':10}" + "".join(f"{stage:>9}" for stage in STAGES) + f"{'total':>9}")
+results = {}
+parsed = defaultdict(int)
+for syntax in [True, False]:
+    annotator.syntax = syntax
+    timings = defaultdict(float)
+    results[syntax] = [annotate(orig, cor, timings) for orig, cor in pairs]
+    print(
+        f"{'always' if syntax else 'on demand':10}"
+        + "".join(f"{timings[stage] * 1000 / len(pairs):9.2f}" for stage in STAGES)
+        + f"{sum(timings.values()) * 1000 / len(pairs):9.2f}"
+        + f"   {parsed[syntax]} pairs parsed"
+    )
+if results[True] != results[False]:
+    sys.exit("the edits differ")
+
+client = Client()
+client.force_login(User.objects.filter(is_superuser=True).order_by("id").first())
+print("/api/auto_annotate/ latency in ms")
+for syntax in [True, False]:
+    annotator.syntax = syntax
+    latencies = []
+    for orig, cor in pairs:
+        started = time.perf_counter()
+        client.post(
+            "/api/auto_annotate/",
+            {"original_sentence": orig, "corrected_sentence": cor},
+            content_type="application/json",
+        )
+        latencies.append((time.perf_counter() - started) * 1000)
+    quantiles = statistics.quantiles(latencies, n=20)
+    print(
+        f"{'always' if syntax else 'on demand':10} "
+        f"mean {statistics.mean(latencies):6.2f}, median {quantiles[9]:6.2f}, "
+        f"p95 {quantiles[18]:6.2f}"
+    )
@@ -0,0 +1,89 @@
+"""Measures the classification of auto-annotator edits with the morphology caches.
+
+The first sentences of the corpus (or of a document) are corrupted by changing
+word endings and swapping adjacent words, the pairs are processed, aligned and merged
+once, and the edits are classified with cold morphology caches and then again with
+warm ones, checking that the types are the same. Prints the hits and misses of the
+caches (see ``auto_annotator.morphology``).
+
+Usage: python dev/bench_classifier.py [--document ID] [--limit N] [--runs N]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import random
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from auto_annotator import morphology
+from auto_annotator.alignment import Alignment
+from corpus.models import Sentence
+from rlc_new import nlp
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--document", type=int)
+parser.add_argument("--limit", type=int, default=1000)
+parser.add_argument("--runs", type=int, default=3)
+args = parser.parse_args()
+
+sentences = Sentence.objects.order_by("document", "number")
+if args.document:
+    sentences = sentences.filter(document=args.document)
+texts = list(sentences.values_list("text", flat=True)[: args.limit])
+
+random.seed(0)
+
+
+def corrupt(text):
+    """Changes the ending of a word and swaps two adjacent words."""
+    words = text.split()
+    index = random.randrange(len(words))
+    if len(words[index]) > 3:
+        words[index] = words[index][:-1] + "ы"
+    if len(words) > 3:
+        index = random.randrange(len(words) - 1)
+        words[index], words[index + 1] = words[index + 1], words[index]
+    return " ".join(words)
+
+
+annotator = nlp.get_annotator()
+# with the syntax, which some rules read
+processed = annotator.processor.process_many([corrupt(text) for text in texts] + texts)
+edits = [
+    edit
+    for orig, cor in zip(processed[: len(texts)], processed[len(texts) :])
+    for edit in annotator.merge(Alignment(orig, cor))
+]
+print(f"{len(texts)} sentences, {len(edits)} edits")
+
+
+def classify_all():
+    """Classifies all the edits, returns the time and the types."""
+    started = time.perf_counter()
+    types = [annotator.classify(edit).type for edit in edits]
+    return time.perf_counter() - started, types
+
+
+morphology.cache_clear()
+cold_time, cold_types = classify_all()
+print(f"cold caches: {cold_time * 1000:.1f} ms")
+for lookup, info in morphology.cache_info().items():
+    print(f"  {lookup:14} hits {info.hits:6}, misses {info.misses:6}")
+
+warm_time = float("inf")
+for _ in range(args.runs):
+    elapsed, types = classify_all()
+    if types != cold_types:
+        sys.exit("the types differ with warm caches")
+    warm_time = min(warm_time, elapsed)
+print(f"warm caches: {warm_time * 1000:.1f} ms (best of {args.runs})")
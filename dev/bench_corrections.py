@@ -0,0 +1,89 @@
+"""Compares computing the corrected texts of all sentences one by one and in batches.
+
+The corrected texts used to be computed sentence by sentence from the JSON of the
+annotations. They are computed now by ``fill_corrections`` from the normalized columns
+of the annotations of many sentences at once, and cached in the sentences. The
+sentence-by-sentence computation is timed with a query for the annotations of every
+sentence, the batch one with the caches reset before every run, and both are checked
+to give the same texts. The caches are left filled.
+
+Usage: python dev/bench_corrections.py [--runs N]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from corpus.models import Annotation, Sentence, get_replacement, get_selectors
+from corpus.utils.correction_utils import fill_corrections, invalidate_corrections
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--runs", type=int, default=3)
+args = parser.parse_args()
+
+sentence_ids = list(Sentence.objects.order_by("pk").values_list("pk", flat=True))
+print(f"{len(sentence_ids)} sentences, {Annotation.objects.count()} annotations")
+
+
+def sentence_corrections():
+    """Returns the corrected texts computed sentence by sentence from the JSON."""
+    corrections = {}
+    for sentence in Sentence.objects.order_by("pk").only("text"):
+        texts = []
+        for alt in (False, True):
+            spans = []
+            for annotation in Annotation.objects.filter(
+                sentence=sentence, alt=alt
+            ).order_by("pk"):
+                replacement = get_replacement(annotation.json)
+                if replacement is not None:
+                    start, end, _ = get_selectors(annotation.json)
+                    spans.append((start, end, replacement))
+            text = sentence.text
+            for start, end, replacement in sorted(
+                spans, key=lambda span: span[0], reverse=True
+            ):
+                text = text[:start] + replacement + text[end:]
+            texts.append(text)
+        corrections[sentence.pk] = tuple(texts)
+    return corrections
+
+
+def batch_corrections():
+    """Returns the corrected texts computed in batches after resetting the caches."""
+    invalidate_corrections(sentence_ids)
+    sentences = list(
+        Sentence.objects.order_by("pk").only(
+            "text", "cached_correction", "cached_alt_correction"
+        )
+    )
+    fill_corrections(sentences)
+    return {
+        sentence.pk: (sentence.cached_correction, sentence.cached_alt_correction)
+        for sentence in sentences
+    }
+
+
+corrections = sentence_corrections()
+for name, function in [
+    ("sentence by sentence", sentence_corrections),
+    ("batch", batch_corrections),
+]:
+    best = float("inf")
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        if function() != corrections:
+            sys.exit(f"{name}: the corrections differ")
+        best = min(best, time.perf_counter() - started)
+    print(f"{name}: {best * 1000:.1f} ms (best of {args.runs})")
@@ -0,0 +1,90 @@
+"""Compares the spell-checking of a document sentence by sentence and in one request.
+
+The annotate page used to request /api/get_sentence_errors/ for every sentence of a
+document, and requests /api/get_document_errors/ once now. Both are timed for a
+document (the longest one by default) with the Django test client, checking that the
+errors are the same. The first document request also fills the verdict table for the
+forms of the document that were not checked before.
+
+Usage: python dev/bench_spelling_errors.py [--document ID] [--runs N]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.db.models import Count
+from django.test import Client
+
+from corpus.models import Document, Sentence
+from rlc_new import nlp
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--document", type=int)
+parser.add_argument("--runs", type=int, default=3)
+args = parser.parse_args()
+
+if args.document:
+    document = Document.objects.get(pk=args.document)
+else:
+    document = (
+        Document.objects.annotate(sentence_count=Count("sentence"))
+        .order_by("-sentence_count")
+        .first()
+    )
+sentence_ids = list(
+    Sentence.objects.filter(document=document)
+    .order_by("number")
+    .values_list("id", flat=True)
+)
+
+client = Client()
+nlp.get_spelling_dictionary()
+print(f"document {document.pk}: {len(sentence_ids)} sentences")
+
+
+def document_errors():
+    """Returns the errors of the document requested at once."""
+    response = client.get(f"/api/get_document_errors/{document.pk}/")
+    return {
+        int(sentence_id): errors
+        for sentence_id, errors in response.json()["errors"].items()
+    }
+
+
+def sentences_errors():
+    """Returns the errors of the document requested sentence by sentence."""
+    return {
+        sentence_id: client.get(f"/api/get_sentence_errors/{sentence_id}/").json()[
+            "errors"
+        ]
+        for sentence_id in sentence_ids
+    }
+
+
+started = time.perf_counter()
+errors = document_errors()
+print(f"first document request: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+for name, function in [
+    ("document request", document_errors),
+    ("sentence requests", sentences_errors),
+]:
+    best = float("inf")
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        if function() != errors:
+            sys.exit(f"{name}: the errors differ")
+        best = min(best, time.perf_counter() - started)
+    print(f"{name}: {best * 1000:.1f} ms (best of {args.runs})")
@@ -0,0 +1,112 @@
+"""Measures the startup time of management commands and gunicorn workers.
+
+Reports the time of ``manage.py check``, the gunicorn boot time (until the first
+response, including the preloading of the NLP models, see ``gunicorn.conf.py``) and
+the latency of the first auto-annotation request. Run it with and without the NLP
+resources directory (see the ``build_nlp_resources`` command) to compare, e.g.:
+
+    python dev/bench_startup.py
+    NLP_RESOURCES_DIR=/nonexistent python dev/bench_startup.py
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import json
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.middleware.csrf import _get_new_csrf_string
+
+PORT = 8766
+RUNS = 3
+
+print(f"NLP_RESOURCES_DIR: {settings.NLP_RESOURCES_DIR}")
+
+check_times = []
+for _ in range(RUNS):
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "manage.py", "check"],
+        cwd=repo_path,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+    check_times.append(time.perf_counter() - started)
+print(f"manage.py check: {min(check_times):.2f}s (best of {RUNS})")
+
+# log in as the first superuser
+user = User.objects.filter(is_superuser=True).order_by("id").first()
+session = SessionStore()
+session["_auth_user_id"] = str(user.pk)
+session["_auth_user_backend"] = "django.contrib.auth.backends.ModelBackend"
+session["_auth_user_hash"] = user.get_session_auth_hash()
+session.create()
+csrf_token = _get_new_csrf_string()
+
+auto_annotate_request = urllib.request.Request(
+    f"http://127.0.0.1:{PORT}/api/auto_annotate/",
+    data=json.dumps(
+        {
+            "original_sentence": "Я пошол в магазин вчера утром.",
+            "corrected_sentence": "Я пошёл в магазин вчера утром.",
+        }
+    ).encode(),
+    headers={
+        "Content-Type": "application/json",
+        "Cookie": f"{settings.SESSION_COOKIE_NAME}={session.session_key}; "
+        f"{settings.CSRF_COOKIE_NAME}={csrf_token}",
+        "X-CSRFToken": csrf_token,
+        "Referer": f"http://127.0.0.1:{PORT}/",
+    },
+)
+
+try:
+    for _ in range(RUNS):
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            ["gunicorn", "rlc_new.asgi:application", "--bind", f"127.0.0.1:{PORT}"],
+            cwd=repo_path,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            while True:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{PORT}/", timeout=60)
+                    break
+                except urllib.error.HTTPError:
+                    break
+                except OSError:
+                    if server.poll() is not None:
+                        sys.exit("gunicorn exited")
+                    time.sleep(0.05)
+            boot_time = time.perf_counter() - started
+
+            started = time.perf_counter()
+            with urllib.request.urlopen(auto_annotate_request) as response:
+                response.read()
+            first_request_time = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+        print(
+            f"gunicorn boot: {boot_time:.2f}s, "
+            f"first auto_annotate request: {first_request_time:.2f}s"
+        )
+finally:
+    session.delete()
@@ -0,0 +1,92 @@
+"""Compares the size of the packed sentence token data with the legacy HTML markup.
+
+The legacy markup (the removed Sentence.markup field) is rebuilt from the Token rows
+with the template of the removed ``_prepare_sentence_markup`` function.
+
+Usage: python dev/bench_token_data.py [number of documents]
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+from html import escape
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment
+from django.urls import reverse
+
+from corpus.models import Document, Sentence
+from corpus.utils.document_utils import _UD_FEATURES
+
+
+def legacy_markup(sentence, tokens):
+    markup = sentence.text
+    for token in sorted(tokens, key=lambda t: t.end, reverse=True):
+        feats_markup = "\n".join(
+            f"<div class='col-6'><strong>{feature}:</strong></div>"
+            f"<div class='col-6'>{getattr(token, field)}</div>"
+            for feature, field in _UD_FEATURES.items()
+            if getattr(token, field)
+        )
+        replacement = f"""<span data-toggle="tooltip" data-bs-html="true" data-bs-original-title="
+                        <div class='row'>
+                            <div class='col-6'><strong>Lemma:</strong></div>
+                            <div class='col-6'>{token.lemma}</div>
+                        </div>
+                        <div class='row'>
+                            <div class='col-6'><strong>POS:</strong></div>
+                            <div class='col-6'>{token.pos}</div>
+                        </div>
+                        <div class='row'>
+                            {feats_markup}
+                        </div>
+                    ">{token.token}</span>"""
+        start, end = token.start - sentence.start, token.end - sentence.start
+        markup = markup[:start] + replacement + markup[end:]
+    return markup
+
+
+document_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+documents = list(Document.objects.order_by("id")[:document_count])
+sentences = Sentence.objects.filter(document__in=documents).prefetch_related("tokens")
+
+text_size = markup_size = token_data_size = 0
+for sentence in sentences:
+    tokens = list(sentence.tokens.all())
+    text_size += len(escape(sentence.text).encode())
+    markup_size += len(legacy_markup(sentence, tokens).encode())
+    token_data_size += len(escape(sentence.token_data_json).encode())
+
+with connection.cursor() as cursor:
+    cursor.execute(
+        "SELECT SUM(pg_column_size(token_data)) FROM corpus_sentence "
+        "WHERE document_id = ANY(%s)",
+        [[document.pk for document in documents]],
+    )
+    (stored_token_data_size,) = cursor.fetchone()
+
+setup_test_environment()
+client = Client()
+page_size = sum(
+    len(client.get(reverse("annotate", args=[document.pk])).content)
+    for document in documents
+)
+# every sentence is rendered twice, with and without the alternative correction
+legacy_page_size = page_size + 2 * (markup_size - text_size - token_data_size)
+
+print(f"{len(documents)} documents, {len(sentences)} sentences")
+print(f"legacy markup:           {markup_size / 1024:10.1f} KiB")
+print(f"token data:              {token_data_size / 1024:10.1f} KiB")
+print(f"token data (stored):     {stored_token_data_size / 1024:10.1f} KiB")
+print(f"annotate pages (legacy): {legacy_page_size / 1024:10.1f} KiB")
+print(f"annotate pages:          {page_size / 1024:10.1f} KiB")
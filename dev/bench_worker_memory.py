@@ -0,0 +1,148 @@
+"""Reports the memory of gunicorn workers after they ran the NLP models.
+
+Starts gunicorn, sends auto-annotation requests (which run the Natasha models) from
+several threads so every worker handles some of them, and prints the RSS and PSS
+(the resident memory with shared pages divided between the processes) of the master
+and the workers. Linux only, as the memory is read from /proc.
+
+Usage: python dev/bench_worker_memory.py [--workers N] [--app-dir DIR] [-- gunicorn args]
+
+Examples:
+    python dev/bench_worker_memory.py --workers 4
+    python dev/bench_worker_memory.py --workers 4 -- --config /dev/null  # no preload
+"""
+
+import sys
+import os
+
+# add project root to path to make django.setup() work
+repo_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repo_path)
+
+import argparse
+import json
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "rlc_new.settings")
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.middleware.csrf import _get_new_csrf_string
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--workers", type=int, default=2)
+parser.add_argument("--requests", type=int, default=20)
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--app-dir", default=repo_path)
+parser.add_argument("gunicorn_args", nargs="*")
+args = parser.parse_args()
+
+# log in as the first superuser
+user = User.objects.filter(is_superuser=True).order_by("id").first()
+session = SessionStore()
+session["_auth_user_id"] = str(user.pk)
+session["_auth_user_backend"] = "django.contrib.auth.backends.ModelBackend"
+session["_auth_user_hash"] = user.get_session_auth_hash()
+session.create()
+csrf_token = _get_new_csrf_string()
+
+server = subprocess.Popen(
+    [
+        "gunicorn",
+        "rlc_new.asgi:application",
+        "--bind",
+        f"127.0.0.1:{args.port}",
+        "--workers",
+        str(args.workers),
+        *args.gunicorn_args,
+    ],
+    cwd=args.app_dir,
+    stdout=subprocess.DEVNULL,
+    stderr=subprocess.DEVNULL,
+)
+
+
+def auto_annotate(_):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{args.port}/api/auto_annotate/",
+        data=json.dumps(
+            {
+                "original_sentence": "Я пошол в магазин вчера утром.",
+                "corrected_sentence": "Я пошёл в магазин вчера утром.",
+            }
+        ).encode(),
+        headers={
+            "Content-Type": "application/json",
+            "Cookie": f"{settings.SESSION_COOKIE_NAME}={session.session_key}; "
+            f"{settings.CSRF_COOKIE_NAME}={csrf_token}",
+            "X-CSRFToken": csrf_token,
+            "Referer": f"http://127.0.0.1:{args.port}/",
+        },
+    )
+    with urllib.request.urlopen(request) as response:
+        return response.status
+
+
+def memory(pid):
+    """Returns the RSS and PSS of a process in MiB."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(value.split()[0]) / 1024
+    return values["Rss"], values["Pss"]
+
+
+def children(pid):
+    """Returns the process ids of the child processes of a process."""
+    child_pids = []
+    for child_pid in filter(str.isdigit, os.listdir("/proc")):
+        try:
+            with open(f"/proc/{child_pid}/stat") as f:
+                # the parent process id is the second field after the command name
+                if f.read().rpartition(") ")[2].split()[1] == str(pid):
+                    child_pids.append(int(child_pid))
+        except FileNotFoundError:
+            continue
+    return sorted(child_pids)
+
+
+try:
+    started = time.perf_counter()
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/", timeout=60)
+            break
+        except urllib.error.HTTPError:
+            break
+        except OSError:
+            if server.poll() is not None:
+                sys.exit("gunicorn exited")
+            time.sleep(0.2)
+    print(f"boot: {time.perf_counter() - started:.1f}s")
+
+    with ThreadPoolExecutor(args.workers * 2) as executor:
+        statuses = list(executor.map(auto_annotate, range(args.requests)))
+    print(f"auto_annotate responses: {statuses.count(200)}/{len(statuses)} OK")
+
+    rss, pss = memory(server.pid)
+    print(f"master:  RSS {rss:7.1f} MiB, PSS {pss:7.1f} MiB")
+    total_pss = pss
+    for pid in children(server.pid):
+        rss, pss = memory(pid)
+        total_pss += pss
+        print(f"worker:  RSS {rss:7.1f} MiB, PSS {pss:7.1f} MiB")
+    print(f"total PSS: {total_pss:.1f} MiB")
+finally:
+    server.terminate()
+    server.wait()
+    session.delete()
@@ -0,0 +1,40 @@
+"""Gunicorn configuration, loaded automatically from the working directory.
+
+The application and the NLP models are loaded in the master process before the
+workers are forked, so the workers share the memory pages of the models
+copy-on-write instead of loading a copy each (see ``rlc_new.nlp``).
+
+The workers run the ASGI application (``rlc_new.asgi``) with uvicorn, so a worker
+serves other requests while the searches and the NLP models of slow requests run in
+threads.
+"""
+
+import os
+
+workers = int(os.environ.get("GUNICORN_WORKERS", 1))
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+
+
+def when_ready(server):
+    # runs in the master process after the application is loaded and before the
+    # workers are forked
+    from corpus.utils import spelling_utils
+    from rlc_new import nlp
+
+    nlp.preload()
+    spelling_utils.get_dictionary_version()
+    server.log.info("Preloaded the NLP models")
+
+
+def post_worker_init(worker):
+    # starts the processes of the annotation pool of the worker, which load the
+    # annotator before the first batch auto-annotation request
+    from django.conf import settings
+
+    from rlc_new import nlp
+
+    pool = nlp.get_annotation_pool()
+    if pool is not None:
+        for _ in range(settings.AUTO_ANNOTATION_WORKERS):
+            pool.submit(int)
@@ -0,0 +1,246 @@
+"""Process-wide registry of the NLP models.
+
+The models are loaded lazily on first use and shared by the document processing
+(``corpus.utils.document_utils``) and the auto-annotator
+(``auto_annotator.text_processor``), so a process holds a single copy of the
+embeddings.
+
+The NLP libraries (natasha, pymorphy2, nltk, enchant) are imported by the accessors
+as well, so the management commands and the pages that do not process texts neither
+import nor load them. ``api.tests.ImportTimeTest`` checks that ``manage.py check``
+does not import them.
+
+Under gunicorn with ``preload_app`` (see ``gunicorn.conf.py``), ``preload`` is called
+in the master process before the workers are forked, and the workers share the
+memory pages of the models copy-on-write.
+
+If the resources directory (NLP_RESOURCES_DIR) was built with the
+``build_nlp_resources`` management command, the embedding is memory-mapped from it
+and the taggers share its vocabulary (see ``rlc_new.nlp_resources``).
+
+The async views run the models in the NLP executor (see ``run_in_executor``), so a
+text being processed does not block the event loop of the ASGI server.
+
+The batch auto-annotation aligns and classifies the sentences in the annotation pool
+(see ``get_annotation_pool``), a pool of processes started once per server process
+with forkserver, whose processes load the annotator from their own registry.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+_MODELS = {}
+# reentrant, as the taggers load the embedding while the lock is held
+_MODELS_LOCK = threading.RLock()
+_EXECUTOR = None
+
+
+def get_segmenter():
+    """Returns the shared Natasha Segmenter."""
+    from natasha import Segmenter
+
+    return _get_model("segmenter", Segmenter)
+
+
+def get_morph_vocab():
+    """Returns the shared Natasha MorphVocab."""
+    from natasha import MorphVocab
+
+    return _get_model("morph_vocab", MorphVocab)
+
+
+def get_embedding():
+    """Returns the shared Natasha NewsEmbedding."""
+    from natasha import NewsEmbedding
+
+    from . import nlp_resources
+
+    if _use_resources():
+        return _get_model(
+            "embedding",
+            lambda: nlp_resources.load_embedding(
+                settings.NLP_RESOURCES_DIR, _get_words_vocab()
+            ),
+        )
+    return _get_model("embedding", NewsEmbedding)
+
+
+def get_morph_tagger():
+    """Returns the shared Natasha NewsMorphTagger."""
+    from natasha import NewsMorphTagger
+
+    from . import nlp_resources
+
+    if _use_resources():
+        return _get_model(
+            "morph_tagger",
+            lambda: nlp_resources.load_morph_tagger(
+                get_embedding(), _get_words_vocab()
+            ),
+        )
+    return _get_model("morph_tagger", lambda: NewsMorphTagger(get_embedding()))
+
+
+def get_syntax_parser():
+    """Returns the shared Natasha NewsSyntaxParser."""
+    from natasha import NewsSyntaxParser
+
+    from . import nlp_resources
+
+    if _use_resources():
+        return _get_model(
+            "syntax_parser",
+            lambda: nlp_resources.load_syntax_parser(
+                get_embedding(), _get_words_vocab()
+            ),
+        )
+    return _get_model("syntax_parser", lambda: NewsSyntaxParser(get_embedding()))
+
+
+def get_annotator():
+    """Returns the shared auto-annotator (``auto_annotator.annotator.Annotator``)."""
+    from auto_annotator.annotator import Annotator
+
+    return _get_model(
+        "annotator",
+        lambda: Annotator(
+            alignment_band=settings.AUTO_ANNOTATION_ALIGNMENT_BAND,
+            syntax=settings.AUTO_ANNOTATION_SYNTAX,
+        ),
+    )
+
+
+def get_spelling_dictionary():
+    """Returns the shared enchant dictionary of Russian."""
+    from enchant import Dict
+
+    return _get_model("spelling_dictionary", lambda: Dict("ru_RU"))
+
+
+def preload():
+    """Loads all models, e.g. before forking worker processes."""
+    preload_analysis()
+    get_syntax_parser()
+    get_annotator()
+    get_spelling_dictionary()
+
+
+def preload_analysis():
+    """Loads the models of the document analysis (the segmenter, the morphology
+    tagger and its vocabulary), e.g. before forking the workers of an import."""
+    get_segmenter()
+    get_morph_vocab()
+    get_morph_tagger()
+
+
+def get_executor():
+    """Returns the shared executor the async views run the models in.
+
+    The executor has NLP_EXECUTOR_WORKERS threads, so at most that many texts are
+    processed at a time and the other requests wait in its queue without holding a
+    server thread or a database connection.
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        with _MODELS_LOCK:
+            if _EXECUTOR is None:
+                _EXECUTOR = ThreadPoolExecutor(
+                    settings.NLP_EXECUTOR_WORKERS, thread_name_prefix="nlp"
+                )
+    return _EXECUTOR
+
+
+async def run_in_executor(func, *args):
+    """Runs a function in the NLP executor and returns its result.
+
+    The function must not use the database, as the connections of the executor
+    threads are not closed at the end of the requests.
+    """
+    return await sync_to_async(func, thread_sensitive=False, executor=get_executor())(
+        *args
+    )
+
+
+def get_annotation_pool():
+    """Returns the shared pool of processes the batch auto-annotation runs in.
+
+    The pool has AUTO_ANNOTATION_WORKERS processes and is created on first use, or at
+    the start of the gunicorn workers (see ``gunicorn.conf.py``). The processes are
+    started with forkserver rather than forked from the threads of the server, and
+    load the annotator once when they start.
+
+    Returns:
+        The ProcessPoolExecutor, or None if AUTO_ANNOTATION_WORKERS is 1.
+    """
+    workers = settings.AUTO_ANNOTATION_WORKERS
+    if workers <= 1:
+        return None
+    # keyed by the number of processes, so the setting can be overridden in the
+    # benchmarks (see dev/bench_auto_annotate_batch.py)
+    return _get_model(
+        f"annotation_pool_{workers}",
+        lambda: ProcessPoolExecutor(
+            workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=get_annotator,
+        ),
+    )
+
+
+def submit_annotation(orig, cor, merging):
+    """Submits the extraction of the edits of a preprocessed pair of texts to the
+    annotation pool, see ``auto_annotator.annotator.Annotator.annotate_many``.
+
+    Returns:
+        Future of the list of edit objects.
+    """
+    return get_annotation_pool().submit(_annotate_processed, orig, cor, merging)
+
+
+def _annotate_processed(orig, cor, merging):
+    """Extracts the edits of a preprocessed pair of texts in a process of the
+    annotation pool."""
+    return get_annotator().annotate_processed(orig, cor, merging)
+
+
+def _get_words_vocab():
+    """Returns the vocabulary shared by the embedding and the taggers."""
+    from . import nlp_resources
+
+    return _get_model(
+        "words_vocab",
+        lambda: nlp_resources.load_words_vocab(settings.NLP_RESOURCES_DIR),
+    )
+
+
+def _use_resources():
+    """Returns whether the models are loaded from the resources directory."""
+    from . import nlp_resources
+
+    return _get_model(
+        "use_resources",
+        lambda: nlp_resources.resources_exist(settings.NLP_RESOURCES_DIR),
+    )
+
+
+def _get_model(name, factory):
+    """Returns a model from the registry, creating it on first use.
+
+    Args:
+        name: Name of the model in the registry.
+        factory: Function creating the model.
+
+    Returns:
+        The model.
+    """
+    model = _MODELS.get(name)
+    if model is None:
+        with _MODELS_LOCK:
+            model = _MODELS.get(name)
+            if model is None:
+                model = _MODELS[name] = factory()
+    return model
@@ -0,0 +1,205 @@
+"""Memory-mapped resources of the Natasha models.
+
+Natasha loads its models from tar archives: the Navec embedding arrays are read and
+post-processed in memory, and the same vocabulary of 250K words is decompressed and
+parsed three times, by the embedding, the morphology tagger and the syntax parser.
+
+``build_resources`` converts the embedding once (see the ``build_nlp_resources``
+management command):
+
+- the embedding arrays, including the norms and products Navec computes on load, are
+  saved as ``.npy`` files and opened with ``mmap_mode="r"``, so they are loaded
+  lazily from the page cache, and all processes share their physical pages;
+- the vocabulary is saved as a text file and parsed once per process, and the
+  embedding and the taggers share one lookup dictionary.
+
+The pymorphy2 and enchant dictionaries are not converted: pymorphy2 reads its
+DAWG files into arrays with its own loader, and enchant is a C library.
+"""
+
+import json
+import os
+import shutil
+from importlib.metadata import version
+from pathlib import Path
+
+import numpy as np
+from natasha import NewsEmbedding, NewsMorphTagger, NewsSyntaxParser
+from natasha.data import NEWS_MORPH, NEWS_SYNTAX
+from navec import Navec
+from navec.meta import Meta
+from navec.pq import PQ
+from navec.vocab import Vocab as NavecVocab
+from slovnet import Morph as SlovnetMorph, Syntax as SlovnetSyntax
+from slovnet.const import REL, SHAPE, TAG, WORD
+from slovnet.exec.encoders import SyntaxEncoder, TagEncoder
+from slovnet.exec.infer import MorphInfer, SyntaxDecoder, SyntaxInfer, TagDecoder
+from slovnet.exec.model import Morph as MorphModel, Syntax as SyntaxModel
+from slovnet.exec.pack import Pack
+from slovnet.vocab import Vocab
+
+_META = "meta.json"
+_WORDS = "words.txt"
+_PQ_ARRAYS = ["indexes", "codes", "norm", "ab"]
+# the default batch size of the slovnet models
+_BATCH_SIZE = 8
+# the packages whose internals the models are built from
+_PACKAGES = ["natasha", "navec", "slovnet"]
+
+
+def build_resources(path):
+    """Converts the Natasha embedding to memory-mappable files.
+
+    The files are written to a temporary directory first, so a running process never
+    reads a partially written directory.
+
+    Args:
+        path: Path of the resources directory.
+
+    Raises:
+        ValueError: If the vocabulary of a tagger differs from the embedding one.
+    """
+    path = Path(path)
+    embedding = NewsEmbedding()
+    for model_path in [NEWS_MORPH, NEWS_SYNTAX]:
+        with Pack(model_path) as pack:
+            if pack.load_vocab(WORD).items != embedding.vocab.words:
+                raise ValueError(f"{model_path} does not use the embedding vocabulary")
+
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    for name in _PQ_ARRAYS:
+        np.save(tmp_path / f"{name}.npy", getattr(embedding.pq, name))
+    np.save(tmp_path / "counts.npy", np.array(embedding.vocab.counts))
+    (tmp_path / _WORDS).write_text("\n".join(embedding.vocab.words), encoding="utf-8")
+    (tmp_path / _META).write_text(
+        json.dumps(
+            {
+                "id": embedding.meta.id,
+                **{package: version(package) for package in _PACKAGES},
+            }
+        )
+    )
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def resources_exist(path):
+    """Returns whether the resources directory was built for the installed Natasha,
+    Navec and Slovnet.
+
+    Args:
+        path: Path of the resources directory.
+    """
+    try:
+        meta = json.loads((Path(path) / _META).read_text())
+    except FileNotFoundError:
+        return False
+    return all(meta.get(package) == version(package) for package in _PACKAGES)
+
+
+def load_words_vocab(path):
+    """Loads the vocabulary shared by the embedding and the taggers.
+
+    Args:
+        path: Path of the resources directory.
+
+    Returns:
+        slovnet Vocab object.
+    """
+    return Vocab((Path(path) / _WORDS).read_text(encoding="utf-8").split("\n"))
+
+
+def load_embedding(path, words_vocab):
+    """Loads the Navec embedding with memory-mapped arrays.
+
+    Args:
+        path: Path of the resources directory.
+        words_vocab: Vocabulary returned by ``load_words_vocab``.
+
+    Returns:
+        Navec object, a replacement for NewsEmbedding.
+    """
+    path = Path(path)
+    meta = json.loads((path / _META).read_text())
+
+    # the precomputed arrays are loaded instead of running PQ.precompute
+    pq = PQ.__new__(PQ)
+    for name in _PQ_ARRAYS:
+        setattr(pq, name, np.load(path / f"{name}.npy", mmap_mode="r"))
+    pq.vectors, pq.qdim = pq.indexes.shape
+    _, pq.centroids, chunk = pq.codes.shape
+    pq.dim = pq.qdim * chunk
+    pq.qdims = np.arange(pq.qdim)
+
+    # the word ids are shared with the taggers
+    vocab = NavecVocab.__new__(NavecVocab)
+    vocab.words = words_vocab.items
+    vocab.counts = np.load(path / "counts.npy", mmap_mode="r")
+    vocab.word_ids = words_vocab.item_ids
+    vocab.unk_id = words_vocab.unk_id
+    vocab.pad_id = words_vocab.pad_id
+
+    return Navec(Meta(meta["id"]), vocab, pq)
+
+
+def load_morph_tagger(embedding, words_vocab):
+    """Loads NewsMorphTagger with a shared vocabulary.
+
+    This is ``slovnet.Morph.load`` without loading the words vocabulary.
+
+    Args:
+        embedding: Embedding returned by ``load_embedding``.
+        words_vocab: Vocabulary returned by ``load_words_vocab``.
+
+    Returns:
+        NewsMorphTagger object.
+    """
+    with Pack(NEWS_MORPH) as pack:
+        pack.load_meta().check_protocol()
+        model = pack.load_model(MorphModel)
+        arrays = dict(pack.load_arrays(model.weights))
+        shapes_vocab = pack.load_vocab(SHAPE)
+        tags_vocab = pack.load_vocab(TAG)
+
+    infer = MorphInfer(
+        model.inject_arrays(arrays),
+        TagEncoder(words_vocab, shapes_vocab, _BATCH_SIZE),
+        TagDecoder(tags_vocab),
+    )
+    tagger = NewsMorphTagger.__new__(NewsMorphTagger)
+    SlovnetMorph.__init__(tagger, infer, _BATCH_SIZE)
+    tagger.navec(embedding)
+    return tagger
+
+
+def load_syntax_parser(embedding, words_vocab):
+    """Loads NewsSyntaxParser with a shared vocabulary.
+
+    This is ``slovnet.Syntax.load`` without loading the words vocabulary.
+
+    Args:
+        embedding: Embedding returned by ``load_embedding``.
+        words_vocab: Vocabulary returned by ``load_words_vocab``.
+
+    Returns:
+        NewsSyntaxParser object.
+    """
+    with Pack(NEWS_SYNTAX) as pack:
+        pack.load_meta().check_protocol()
+        model = pack.load_model(SyntaxModel)
+        arrays = dict(pack.load_arrays(model.weights))
+        shapes_vocab = pack.load_vocab(SHAPE)
+        rels_vocab = pack.load_vocab(REL)
+
+    infer = SyntaxInfer(
+        model.inject_arrays(arrays),
+        SyntaxEncoder(words_vocab, shapes_vocab, _BATCH_SIZE),
+        SyntaxDecoder(rels_vocab),
+    )
+    parser = NewsSyntaxParser.__new__(NewsSyntaxParser)
+    SlovnetSyntax.__init__(parser, infer, _BATCH_SIZE)
+    parser.navec(embedding)
+    return parser
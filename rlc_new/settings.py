@@ -180,3 +180,89 @@ STATIC_ROOT = "/var/www/rlc_new/static"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 LOGIN_REDIRECT_URL = "/corpus/documents/"
 LOGOUT_REDIRECT_URL = "/"
+
+# Lexico-grammatical search
+# "sql" evaluates searches in PostgreSQL, "index" uses the in-memory token index
+LEXGRAM_SEARCH_ENGINE = os.environ.get("LEXGRAM_SEARCH_ENGINE", "sql")
+TOKEN_INDEX_PATH = os.environ.get(
+    "TOKEN_INDEX_PATH", BASE_DIR / "var" / "token_index.npz"
+)
+# Seconds between the checks of the token changes made by other processes, the
+# searches meanwhile read the loaded token index
+TOKEN_INDEX_REFRESH_INTERVAL = float(os.environ.get("TOKEN_INDEX_REFRESH_INTERVAL", 1))
+
+# Caches
+# Search results are cached per process, the least recently used entries are evicted
+SEARCH_CACHE_TIMEOUT = int(os.environ.get("SEARCH_CACHE_TIMEOUT", 600))
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 1000))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "search": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "search",
+        "TIMEOUT": SEARCH_CACHE_TIMEOUT,
+        "OPTIONS": {"MAX_ENTRIES": SEARCH_CACHE_MAX_ENTRIES},
+    },
+}
+
+# Document processing
+# If enabled, changed document bodies are processed by the process_documents command
+# (requires a running worker, see the worker service in docker-compose.yml)
+ASYNC_DOCUMENT_PROCESSING = (
+    os.environ.get("ASYNC_DOCUMENT_PROCESSING", "False").lower() == "true"
+)
+# Seconds after which a job still processing is considered abandoned by a crashed worker
+# and processed again, unless its worker is alive (holding the lock of the job)
+DOCUMENT_PROCESSING_TIMEOUT = int(os.environ.get("DOCUMENT_PROCESSING_TIMEOUT", 300))
+# Number of times a job is started before it is marked as failed
+DOCUMENT_PROCESSING_MAX_ATTEMPTS = int(
+    os.environ.get("DOCUMENT_PROCESSING_MAX_ATTEMPTS", 3)
+)
+# If enabled, only the changed sentences of an edited document are re-analyzed
+INCREMENTAL_DOCUMENT_PROCESSING = (
+    os.environ.get("INCREMENTAL_DOCUMENT_PROCESSING", "true").lower() == "true"
+)
+# "orm" saves sentences and tokens with bulk_create, "copy" uses binary COPY
+CORPUS_BULK_WRITER = os.environ.get("CORPUS_BULK_WRITER", "orm")
+# Memory-mapped NLP model resources, built with the build_nlp_resources command
+NLP_RESOURCES_DIR = os.environ.get("NLP_RESOURCES_DIR", BASE_DIR / "var" / "nlp")
+
+# Auto-annotation
+# Width of the band of the token alignment, e.g. 8; the full matrix is aligned if the
+# value is empty or if the banded alignment may differ from the full one. The band
+# speeds up long texts with few corrections and slows down the others.
+AUTO_ANNOTATION_ALIGNMENT_BAND = os.environ.get("AUTO_ANNOTATION_ALIGNMENT_BAND", "")
+AUTO_ANNOTATION_ALIGNMENT_BAND = (
+    int(AUTO_ANNOTATION_ALIGNMENT_BAND) if AUTO_ANNOTATION_ALIGNMENT_BAND else None
+)
+# Number of processes of the pool the batch auto-annotation endpoint aligns and
+# classifies the sentences in (see rlc_new.nlp.get_annotation_pool), 1 processes them
+# in the NLP executor
+AUTO_ANNOTATION_WORKERS = int(os.environ.get("AUTO_ANNOTATION_WORKERS", 1))
+# Parse the syntax of every auto-annotated text. By default the texts are parsed only
+# if an edit is classified by a rule reading the dependencies.
+AUTO_ANNOTATION_SYNTAX = (
+    os.environ.get("AUTO_ANNOTATION_SYNTAX", "false").lower() == "true"
+)
+# Version of the spelling dictionary, change it when the dictionary files are updated
+# to recompute the cached verdicts on the token forms (see corpus.utils.spelling_utils)
+SPELLING_DICTIONARY_VERSION = os.environ.get("SPELLING_DICTIONARY_VERSION", "1")
+
+# Statistics page
+# Minimum age in seconds of a stale statistics snapshot before the statistics page or
+# the document processing worker recomputes it (see corpus.utils.stats_utils)
+STATISTICS_REFRESH_INTERVAL = int(os.environ.get("STATISTICS_REFRESH_INTERVAL", 600))
+
+# ASGI
+# Number of threads the async views run the NLP models in (see rlc_new.nlp), 1 runs
+# one text at a time, as the models are not guaranteed to be thread-safe
+NLP_EXECUTOR_WORKERS = int(os.environ.get("NLP_EXECUTOR_WORKERS", 1))
+# Number of searches run at a time by a server process, the others
+# wait without holding a thread (see corpus.utils.search_utils.get_search_semaphore)
+SEARCH_CONCURRENCY = int(os.environ.get("SEARCH_CONCURRENCY", 2))
+# Number of search exports streamed at a time by a server process (see
+# corpus.utils.search_export.get_export_semaphore)
+SEARCH_EXPORT_CONCURRENCY = int(os.environ.get("SEARCH_EXPORT_CONCURRENCY", 1))
@@ -176,9 +176,69 @@ function submitCorrectedSentence(sentenceId) {
   });
 }
 
-function initRecogito(canAnnotate, isLoggedIn) {
+function escapeHTML(text) {
+  const element = document.createElement("div");
+  element.textContent = text ?? "";
+  return element.innerHTML;
+}
+
+function tokenTooltipRow(name, value) {
+  return (
+    `<div class='col-6'><strong>${escapeHTML(name)}:</strong></div>` +
+    `<div class='col-6'>${escapeHTML(value)}</div>`
+  );
+}
+
+function tokenTooltip(legend, lemma, pos, feats) {
+  // pos and feats are codes of the values in the legend, see get_token_data_legend
+  const featsRows = Array.from(feats)
+    .map((digit, i) => {
+      const code = parseInt(digit, 36);
+      const [feature, values] = legend.features[i];
+      return code ? tokenTooltipRow(feature, values[code - 1]) : "";
+    })
+    .join("");
+  return (
+    `<div class='row'>${tokenTooltipRow("Lemma", lemma)}</div>` +
+    `<div class='row'>${tokenTooltipRow("POS", legend.pos[pos] ?? pos)}</div>` +
+    `<div class='row'>${featsRows}</div>`
+  );
+}
+
+function renderSentenceTokens(legend) {
+  // Wrap the tokens of the sentences in spans with tooltips, using the packed
+  // [start, end, lemma, pos, feats] arrays from the data-tokens attribute
+  document.querySelectorAll(".sentence[data-tokens]").forEach((element) => {
+    // token offsets are in code points, not UTF-16 code units
+    const chars = Array.from(element.textContent);
+    const fragment = document.createDocumentFragment();
+    let position = 0;
+    for (const [start, end, lemma, pos, feats] of JSON.parse(element.dataset.tokens)) {
+      fragment.append(chars.slice(position, start).join(""));
+      const span = document.createElement("span");
+      span.textContent = chars.slice(start, end).join("");
+      span.dataset.bsTitle = tokenTooltip(legend, lemma, pos, feats);
+      fragment.append(span);
+      position = end;
+    }
+    fragment.append(chars.slice(position).join(""));
+    element.replaceChildren(fragment);
+    // a single delegated tooltip instance per sentence
+    new bootstrap.Tooltip(element, { selector: "span[data-bs-title]", html: true });
+  });
+}
+
+function fetchWorkspace(documentId) {
+  // The sentences of a document with their annotations, corrections and spelling
+  // errors, revalidated with the ETag of the previous response
+  return fetch(`/api/documents/${documentId}/workspace/`).then((response) =>
+    response.json(),
+  );
+}
+
+function initRecogito(canAnnotate, isLoggedIn, workspace) {
   if (!isLoggedIn) {
-    setupRecogito(canAnnotate);
+    setupRecogito(canAnnotate, workspace);
     return;
   }
   // Fetch user info from /api/get_user_info/ using AJAX
@@ -186,17 +246,24 @@ function initRecogito(canAnnotate, isLoggedIn) {
     url: "/api/get_user_info/",
     type: "GET",
     success: function (data) {
-      setupRecogito(canAnnotate, data);
+      setupRecogito(canAnnotate, workspace, data);
     },
     error: function (jqXHR, textStatus, errorThrown) {
-      setupRecogito(canAnnotate);
+      setupRecogito(canAnnotate, workspace);
     },
   });
 }
 
-function setupRecogito(canAnnotate, data = null) {
+function setupRecogito(canAnnotate, workspace, data = null) {
   // Get all the elements with the class 'sentence'
   const sentences = document.querySelectorAll(".sentence");
+  // The annotations of all sentences are loaded with the workspace of the document
+  const sentencesData = workspace.then(
+    (workspaceData) =>
+      new Map(
+        workspaceData.sentences.map((sentenceData) => [sentenceData.id, sentenceData]),
+      ),
+  );
 
   let widgets = [];
   if (canAnnotate) {
@@ -272,11 +339,17 @@ function setupRecogito(canAnnotate, data = null) {
       r.setAuthInfo(data);
     }
 
-    if (sentence.dataset.alt === "true") {
-      r.loadAnnotations(`/api/annotations/get/alt/${sentence.dataset.sentenceId}/`);
-    } else {
-      r.loadAnnotations(`/api/annotations/get/${sentence.dataset.sentenceId}/`);
-    }
+    sentencesData.then((dataById) => {
+      const sentenceData = dataById.get(Number(sentence.dataset.sentenceId));
+      if (!sentenceData) {
+        return;
+      }
+      if (sentence.dataset.alt === "true") {
+        r.setAnnotations(sentenceData.alt_annotations);
+      } else {
+        r.setAnnotations(sentenceData.annotations);
+      }
+    });
 
     r.on("createAnnotation", async (annotation, overrideId) => {
       // TODO проверять, что аннотации не залезают друг на друга
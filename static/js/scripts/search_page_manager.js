@@ -30,9 +30,10 @@ const performSearch = (endpoint, data, loadMore = false) => {
       <span role="status">${loadMoreButton.innerHTML}</span>`;
   }
 
-  let chunk_start = 0;
+  // opaque cursor of the last loaded sentence, null for the first page
+  let chunk_start = null;
   if (loadMore) {
-    chunk_start = parseInt(loadMoreButton.dataset.chunkStart);
+    chunk_start = loadMoreButton.dataset.chunkStart;
   }
 
   const payload = {
@@ -114,6 +115,9 @@ document.addEventListener("DOMContentLoaded", () => {
     if (event.target.id === "load-more-button") {
       handleLoadMore(event.target.dataset.searchType);
     }
+    if (event.target.classList.contains("export-button")) {
+      handleExport(event.target);
+    }
   });
 });
 
@@ -139,10 +143,41 @@ function handleSearchSubmit(event, searchType) {
   performSearch(`/corpus/${searchType}_search_results/`, queryData);
 }
 
+function getQueryData(searchType) {
+  return searchType === "exact"
+    ? { query: document.querySelector("#exact-search-input").value.trim() }
+    : { tokens: parseFormData(new FormData(document.querySelector("#lexgram-form"))) };
+}
+
 function handleLoadMore(searchType) {
-  const queryData =
-    searchType === "exact"
-      ? { query: document.querySelector("#exact-search-input").value.trim() }
-      : { tokens: parseFormData(new FormData(document.querySelector("#lexgram-form"))) };
-  performSearch(`/corpus/${searchType}_search_results/`, queryData, true);
+  performSearch(`/corpus/${searchType}_search_results/`, getQueryData(searchType), true);
+}
+
+// downloads all results of the search in the format of the export button; the query is
+// submitted in a form so that the browser saves the export while it is streamed
+function handleExport(button) {
+  const { searchType, exportFormat } = button.dataset;
+  const payload = {
+    ...getQueryData(searchType),
+    settings: parseFormData(new FormData(document.querySelector("#subcorpus-form"))),
+    format: exportFormat,
+  };
+
+  const form = document.createElement("form");
+  form.method = "POST";
+  form.action = `/corpus/${searchType}_search_export/`;
+  form.hidden = true;
+  for (const [name, value] of [
+    ["csrfmiddlewaretoken", getCookie("csrftoken")],
+    ["query", JSON.stringify(payload)],
+  ]) {
+    const input = document.createElement("input");
+    input.type = "hidden";
+    input.name = name;
+    input.value = value;
+    form.appendChild(input);
+  }
+  document.body.appendChild(form);
+  form.submit();
+  form.remove();
 }